@@ -1,19 +1,79 @@
 import logging
 
+from apps.main.bulk_utils import bulk_cancel_reservations, bulk_shift_reservations
+from apps.main.closure_utils import apply_closure
 from apps.main.models import (
     Closure,
+    Invoice,
+    InvoiceLine,
     Lane,
     LaneReservation,
     Locker,
     LockerReservation,
+    OutboxEvent,
     Pool,
 )
-from django.contrib import admin
-from django.db.models import Count, F
+from apps.main.pagination_utils import EstimatedCountPaginator
+from dateutil.relativedelta import relativedelta
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
 
 logger = logging.getLogger("apps.main")
 
 
+# How many conflicts are listed in the message after a bulk shift
+SHIFT_CONFLICTS_SHOWN = 20
+
+
+def get_shift_action(offset: timezone.timedelta, description: str):
+    """Returns an admin action that shifts the selected Reservations by the offset, with `bulk_shift_reservations()`"""
+
+    @admin.action(description=description)
+    def shift_reservations(modeladmin, request, queryset):
+        try:
+            results = bulk_shift_reservations(queryset, offset)
+        except ValidationError as e:
+            modeladmin.message_user(request, " ".join(e.messages), messages.ERROR)
+            return
+
+        modeladmin.message_user(request, f"Shifted {len(results['moved'])} Reservations by {offset}")
+        if results["conflicts"]:
+            conflicts = [f"{reservation_id} ({reason})" for reservation_id, reason in results["conflicts"].items()]
+            if len(conflicts) > SHIFT_CONFLICTS_SHOWN:
+                conflicts = conflicts[:SHIFT_CONFLICTS_SHOWN] + [f"and {len(conflicts) - SHIFT_CONFLICTS_SHOWN} more"]
+            modeladmin.message_user(
+                request,
+                f"{len(results['conflicts'])} Reservations were not shifted: {', '.join(conflicts)}",
+                messages.WARNING,
+            )
+
+    shift_reservations.__name__ = f"shift_reservations_{int(offset.total_seconds() // 60)}_minutes".replace(
+        "-", "minus_"
+    )
+    return shift_reservations
+
+
+class BulkReservationActionsMixin:
+    """Set-based admin actions for Lane and Locker Reservations (see `bulk_utils.py`), which never load each object"""
+
+    actions = [
+        "cancel_reservations",
+        get_shift_action(timezone.timedelta(minutes=30), "Shift selected Reservations 30 minutes later"),
+        get_shift_action(timezone.timedelta(hours=1), "Shift selected Reservations 1 hour later"),
+        get_shift_action(timezone.timedelta(minutes=-30), "Shift selected Reservations 30 minutes earlier"),
+        get_shift_action(timezone.timedelta(hours=-1), "Shift selected Reservations 1 hour earlier"),
+    ]
+
+    @admin.action(description="Cancel selected Reservations")
+    def cancel_reservations(self, request, queryset):
+        results = bulk_cancel_reservations(queryset)
+        self.message_user(request, f"Cancelled {len(results['cancelled'])} Reservations")
+
+
 @admin.register(Pool)
 class PoolAdmin(admin.ModelAdmin):
     pass
@@ -24,40 +84,160 @@ class LockerAdmin(admin.ModelAdmin):
     pass
 
 
+class PeriodListFilter(admin.SimpleListFilter):
+    """
+    Filters Reservations by the day or range of days their periods overlap, using the GiST index of the
+        Reservation exclusion constraints
+    """
+
+    title = "period"
+    parameter_name = "period"
+
+    # How many days ahead are listed individually (e.g.: "Tuesday 2026-10-20")
+    days_listed = 7
+
+    def lookups(self, request, model_admin):
+        today = timezone.localdate()
+        days = [(f"{today:%Y-%m-%d}", "Today"), (f"{today + timezone.timedelta(days=1):%Y-%m-%d}", "Tomorrow")]
+        for day_offset in range(2, self.days_listed):
+            day = today + timezone.timedelta(days=day_offset)
+            days.append((f"{day:%Y-%m-%d}", f"{day:%A %Y-%m-%d}"))
+        return days + [("next_7_days", "Next 7 days"), ("this_month", "This month"), ("past", "In the past")]
+
+    def get_period(self, value):
+        """Returns the period for a lookup value, or None if the value is not a lookup"""
+        today_start = timezone.make_aware(timezone.datetime.combine(timezone.localdate(), timezone.datetime.min.time()))
+        if value == "next_7_days":
+            return DateTimeTZRange(today_start, today_start + timezone.timedelta(days=7))
+        if value == "this_month":
+            month_start = today_start.replace(day=1)
+            return DateTimeTZRange(month_start, month_start + relativedelta(months=1))
+        if value == "past":
+            return DateTimeTZRange(None, timezone.now())
+        try:
+            day_start = timezone.make_aware(timezone.datetime.strptime(value, "%Y-%m-%d"))
+        except (TypeError, ValueError):
+            return None
+        return DateTimeTZRange(day_start, day_start + timezone.timedelta(days=1))
+
+    def queryset(self, request, queryset):
+        period = self.get_period(self.value())
+        if period is None:
+            return queryset
+        return queryset.filter(period__overlap=period)
+
+
+class ReservationChangeList(ChangeList):
+    """Counts the users of the Lane Reservations on the page, with one query, instead of annotating every row"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        if self.model is not LaneReservation:
+            return
+        user_counts = dict(
+            LaneReservation.users.through.objects.filter(
+                lanereservation_id__in=[lane_reservation.id for lane_reservation in self.result_list]
+            )
+            .values("lanereservation_id")
+            .annotate(user_count=Count("id"))
+            .values_list("lanereservation_id", "user_count")
+            .order_by()
+        )
+        for lane_reservation in self.result_list:
+            lane_reservation.user_count = user_counts.get(lane_reservation.id, 0)
+
+
+class ReservationAdmin(BulkReservationActionsMixin, admin.ModelAdmin):
+    """
+    Keeps the Reservation changelists fast on large tables: counts are estimated (see `EstimatedCountPaginator`),
+        the default ordering needs no joins, related objects are fetched with the page, and users and resources
+        are chosen by id instead of rendering a select with every option
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ["-id"]
+    list_filter = [PeriodListFilter]
+
+    def get_changelist(self, request, **kwargs):
+        return ReservationChangeList
+
+
 @admin.register(LockerReservation)
-class LockerReservationAdmin(admin.ModelAdmin):
-    pass
+class LockerReservationAdmin(ReservationAdmin):
+    list_display = ["__str__", "user", "cancelled"]
+    list_select_related = ["locker__pool", "user"]
+    autocomplete_fields = ["user"]
+    raw_id_fields = ["locker"]
 
 
 @admin.register(LaneReservation)
-class LaneReservationAdmin(admin.ModelAdmin):
+class LaneReservationAdmin(ReservationAdmin):
     list_display = [
         "__str__",
         "user_count",
         "max_swimmers_allowed",
         "additional_swimmers_allowed",
     ]
+    list_select_related = ["lane__pool"]
+    autocomplete_fields = ["users"]
+    raw_id_fields = ["lane"]
 
     def user_count(self, obj):
         return obj.user_count
 
     def max_swimmers_allowed(self, obj):
-        return obj.max_swimmers_allowed
+        return obj.lane.max_swimmers
 
     def additional_swimmers_allowed(self, obj):
-        return obj.max_swimmers_allowed - obj.user_count
-
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        queryset = queryset.annotate(user_count=Count("users")).annotate(max_swimmers_allowed=F("lane__max_swimmers"))
-        return queryset
+        return obj.lane.max_swimmers - obj.user_count
 
 
 @admin.register(Closure)
 class ClosureAdmin(admin.ModelAdmin):
-    pass
+    actions = ["apply_closures"]
+
+    @admin.action(description="Apply selected Closures (cancel overlapping Reservations and notify users)")
+    def apply_closures(self, request, queryset):
+        cancelled_count = 0
+        for closure in queryset.select_related("pool"):
+            results = apply_closure(closure)
+            cancelled_count += len(results["cancelled_lane_reservations"])
+            cancelled_count += len(results["cancelled_locker_reservations"])
+        self.message_user(request, f"Applied {queryset.count()} Closures, cancelling {cancelled_count} Reservations")
 
 
 @admin.register(Lane)
 class LaneAdmin(admin.ModelAdmin):
     pass
+
+
+class InvoiceLineInline(admin.TabularInline):
+    model = InvoiceLine
+    extra = 0
+    raw_id_fields = ["lane_reservation", "locker_reservation"]
+    readonly_fields = ["hours", "per_hour_cost", "share_count", "amount", "updated"]
+
+
+@admin.register(Invoice)
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ["user", "month", "total", "updated"]
+    list_filter = ["month"]
+    list_select_related = ["user"]
+    raw_id_fields = ["user"]
+    readonly_fields = ["total", "created", "updated"]
+    inlines = [InvoiceLineInline]
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ["topic", "created", "attempts", "processed"]
+    list_filter = ["topic", ("processed", admin.EmptyFieldListFilter)]
+    readonly_fields = ["topic", "payload", "created", "handled", "last_error", "processed"]
+    actions = ["retry_events"]
+
+    @admin.action(description="Retry selected events")
+    def retry_events(self, request, queryset):
+        """Makes failed events available to `drain_outbox()` again"""
+        retried = queryset.filter(processed=None).update(attempts=0, available=timezone.now())
+        self.message_user(request, f"{retried} events will be retried")
@@ -0,0 +1,329 @@
+import logging
+from bisect import bisect_left
+from typing import NamedTuple
+
+from apps.main.availability_utils import (
+    get_pool_closure_periods,
+    is_pool_closed,
+    overlaps_closure_periods,
+)
+from apps.main.models import Lane, LaneReservation, Locker, LockerReservation, Pool
+from apps.main.validators import (
+    DateTimeRangeLowerMinuteValidator,
+    DateTimeRangeMaxDurationValidator,
+    DateTimeRangeUpperMinuteValidator,
+    validate_zeroed_dt_sec_microsec,
+)
+from apps.users.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    DurationField,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+logger = logging.getLogger("with_ranges.main")
+
+
+# Stands in for the gap before or after a period when a Locker has no Reservation on that side, so that Lockers
+#   with neighboring Reservations are preferred over empty stretches of timeline
+UNBOUNDED_LOCKER_GAP = timezone.timedelta(days=3650)
+
+# How many candidate Lockers to try when a concurrent allocation commits a conflicting Reservation first
+LOCKER_ALLOCATION_ATTEMPTS = 3
+
+# The LockerReservation constraint violated when the user, rather than the Locker, already has a Reservation
+USER_LOCKER_OVERLAP_CONSTRAINT = "excl_overlap_user_locker_res"
+USER_LOCKER_OVERLAP_MESSAGE = "User already has a Locker reserved during this period"
+
+# The boundary checks of the LaneReservation `period` field. The field passes `(0, 30)` to the minute validators,
+#   which makes 30 their message rather than an allowed minute, so the allowed minutes are passed as a list here.
+LANE_REQUEST_PERIOD_VALIDATORS = [
+    DateTimeRangeLowerMinuteValidator([0, 30]),
+    DateTimeRangeUpperMinuteValidator([0, 30]),
+    validate_zeroed_dt_sec_microsec,
+]
+
+
+def get_best_fit_locker_queryset(pool: Pool, period: DateTimeTZRange) -> QuerySet:
+    """
+    Returns the Lockers in a Pool that are free for the entire period (according to their LockerBusyTime), ordered
+        from best to worst fit
+
+    The fit of a Locker is the free time left on either side of the period: the gap between the end of the
+        Locker's previous Reservation and the start of the period, plus the gap between the end of the period and
+        the start of the Locker's next Reservation. Filling the tightest gaps first leaves the long free stretches
+        intact, so long multi-day bookings still fit later.
+    """
+    active_reservations = LockerReservation.objects.filter(locker=OuterRef("pk"))
+    previous_end = Subquery(
+        active_reservations.filter(period__endswith__lte=period.lower)
+        .order_by("-period__endswith")
+        .values("period__endswith")[:1]
+    )
+    next_start = Subquery(
+        active_reservations.filter(period__startswith__gte=period.upper)
+        .order_by("period__startswith")
+        .values("period__startswith")[:1]
+    )
+    return (
+        Locker.objects.filter(pool=pool)
+        .exclude(busy_time__busy__overlap=period)
+        .annotate(
+            gap_before=Coalesce(
+                ExpressionWrapper(Value(period.lower) - previous_end, output_field=DurationField()),
+                Value(UNBOUNDED_LOCKER_GAP),
+            ),
+            gap_after=Coalesce(
+                ExpressionWrapper(next_start - Value(period.upper), output_field=DurationField()),
+                Value(UNBOUNDED_LOCKER_GAP),
+            ),
+        )
+        .annotate(slack=F("gap_before") + F("gap_after"))
+        .order_by("slack", "id")
+    )
+
+
+def validate_locker_reservation_period(period: DateTimeTZRange):
+    """
+    Raises a ValidationError unless the period is bounded, starts before it ends, and fits the maximum duration of
+        the LockerReservation `period` field
+    """
+    if period.lower is None or period.upper is None or not period.lower < period.upper:
+        raise ValidationError("Reservation period must have a start before its end")
+
+    for validator in LockerReservation._meta.get_field("period").validators:
+        if (
+            isinstance(validator, DateTimeRangeMaxDurationValidator)
+            and period.upper - period.lower > validator.limit_value
+        ):
+            raise ValidationError(f"Reservation period must be no longer than {validator.limit_value}")
+
+
+def has_overlapping_locker_reservation(user: User, period: DateTimeTZRange) -> bool:
+    """Returns whether the user already has an active LockerReservation overlapping the period"""
+    return LockerReservation.objects.filter(user=user, period__overlap=period).exists()
+
+
+def allocate_locker(pool: Pool, user: User, period: DateTimeTZRange):
+    """
+    Reserves the best-fitting free Locker in a Pool for a user and period, returning the new LockerReservation, or
+        None if no Locker in the Pool is free for the period
+
+    Raises a ValidationError if the period is invalid (see `validate_locker_reservation_period()`), if the Pool is
+        closed during the period, or if the user already has a Locker reserved during the period (see
+        `excl_overlap_user_locker_res`).
+
+    The chosen Locker row is locked with `SELECT ... FOR UPDATE SKIP LOCKED`, so concurrent allocations in the same
+        Pool each move on to the next best Locker instead of waiting on one another. If a concurrent allocation
+        commits a conflicting Reservation between our snapshot and our lock, the insert is rolled back to a
+        savepoint and the next candidate is tried, a bounded number of times. If the conflicting Reservation is
+        the user's own (`excl_overlap_user_locker_res`), the ValidationError is raised instead.
+    """
+    validate_locker_reservation_period(period)
+    if is_pool_closed(pool.id, period):
+        raise ValidationError(f"{pool} is closed during this period")
+    if has_overlapping_locker_reservation(user, period):
+        raise ValidationError(USER_LOCKER_OVERLAP_MESSAGE)
+
+    tried_locker_ids = []
+    with transaction.atomic():
+        for attempt in range(LOCKER_ALLOCATION_ATTEMPTS):
+            locker = (
+                get_best_fit_locker_queryset(pool, period)
+                .exclude(id__in=tried_locker_ids)
+                .select_for_update(skip_locked=True, of=("self",))
+                .first()
+            )
+            if locker is None:
+                return None
+
+            reservation = LockerReservation(user=user, locker=locker, period=period)
+            try:
+                with transaction.atomic():
+                    reservation.save()
+                return reservation
+            except IntegrityError as e:
+                # The user's own Reservation was committed concurrently, so no other Locker will do either
+                constraint_name = getattr(getattr(e.__cause__, "diag", None), "constraint_name", None)
+                if constraint_name == USER_LOCKER_OVERLAP_CONSTRAINT:
+                    raise ValidationError(USER_LOCKER_OVERLAP_MESSAGE)
+                logger.info(f"Locker {locker.id} was reserved concurrently, trying the next best fit")
+                tried_locker_ids.append(locker.id)
+
+    return None
+
+
+class LaneRequest(NamedTuple):
+    """One request within a batch of Lane requests, such as a club's practice session"""
+
+    period: DateTimeTZRange
+    swimmers: int
+    user_ids: tuple = ()
+
+
+def validate_lane_request(lane_request: LaneRequest):
+    """
+    Raises a ValidationError unless the LaneRequest's period is bounded, starts before it ends, starts and ends on
+        :00 or :30 with zeroed seconds and microseconds, and its swimmer count covers each of its users
+
+    `reserve_lane_requests()` creates its LaneReservations with `bulk_create()`, which skips model validation, so
+        each request is validated here instead.
+    """
+    period = lane_request.period
+    if period.lower is None or period.upper is None or not period.lower < period.upper:
+        raise ValidationError("Reservation period must have a start before its end")
+
+    for validator in LANE_REQUEST_PERIOD_VALIDATORS:
+        validator(period)
+
+    if lane_request.swimmers < max(1, len(lane_request.user_ids)):
+        raise ValidationError(
+            f"Swimmer count {lane_request.swimmers} must be at least 1 and at least the number of users "
+            f"({len(lane_request.user_ids)})"
+        )
+
+
+def pack_lane_requests(lane_requests: list, lanes: list, reserved_periods: dict) -> tuple:
+    """
+    Assigns a batch of LaneRequests to Lanes, using as few Lanes as possible
+
+    - `lanes` is a list of (lane_id, max_swimmers) pairs
+    - `reserved_periods` maps each lane_id to the periods of its existing Reservations, which never overlap
+
+    Returns a tuple of a dictionary mapping the index of each assigned request to its lane_id, and a list of the
+        indexes of requests that could not be assigned.
+
+    This is a sweep over the requests in order of their start, which is the greedy interval partitioning strategy
+        (optimal for identical Lanes without existing Reservations):
+
+    - Each request goes to a Lane already used by the batch if one is free and large enough, preferring the Lane
+        that became free most recently (the tightest fit).
+    - Otherwise it opens the smallest unused Lane that is large enough, keeping large Lanes for large groups.
+    - A Lane is free for a request when its last batch assignment has ended (assignments to a Lane are made in
+        order of their start), and a bisect of its existing Reservations finds no overlap.
+
+    Sorting dominates, so a batch of n requests is packed in O(n log n) time for a Pool's fixed number of Lanes.
+    """
+    reserved_lowers = {}
+    reserved_uppers = {}
+    for lane_id, periods in reserved_periods.items():
+        sorted_periods = sorted(periods, key=lambda period: period.lower)
+        reserved_lowers[lane_id] = [period.lower for period in sorted_periods]
+        reserved_uppers[lane_id] = [period.upper for period in sorted_periods]
+
+    def is_reserved(lane_id, period):
+        # Existing Reservations on a Lane don't overlap, so only the last one starting before this period ends can
+        #   overlap it
+        index = bisect_left(reserved_lowers.get(lane_id, []), period.upper)
+        return index > 0 and reserved_uppers[lane_id][index - 1] > period.lower
+
+    unused_lanes = sorted(lanes, key=lambda lane: (lane[1], lane[0]))
+    used_lanes = {}
+    assignments = {}
+    unassigned = []
+
+    order = sorted(range(len(lane_requests)), key=lambda i: (lane_requests[i].period.lower, -lane_requests[i].swimmers))
+    for index in order:
+        lane_request = lane_requests[index]
+        period = lane_request.period
+
+        best_lane = None
+        best_free_at = None
+        for lane_id, (max_swimmers, free_at) in used_lanes.items():
+            if max_swimmers < lane_request.swimmers or free_at > period.lower or is_reserved(lane_id, period):
+                continue
+            if best_free_at is None or free_at > best_free_at:
+                best_lane, best_free_at = (lane_id, max_swimmers), free_at
+
+        if best_lane is None:
+            for lane in unused_lanes:
+                if lane[1] >= lane_request.swimmers and not is_reserved(lane[0], period):
+                    best_lane = lane
+                    unused_lanes.remove(lane)
+                    break
+
+        if best_lane is None:
+            unassigned.append(index)
+            continue
+
+        lane_id, max_swimmers = best_lane
+        used_lanes[lane_id] = (max_swimmers, period.upper)
+        assignments[index] = lane_id
+
+    return assignments, sorted(unassigned)
+
+
+def reserve_lane_requests(pool: Pool, lane_requests: list) -> tuple:
+    """
+    Packs a batch of LaneRequests into the Pool's Lanes with `pack_lane_requests()`, and creates the resulting
+        LaneReservations (and their users) in one transaction. Requests overlapping one of the Pool's Closures are
+        not assigned.
+
+    The Pool's Lane rows are locked for the duration, so concurrent batches for the same Pool are packed one after
+        the other rather than failing on `excl_overlap_lane_res`.
+
+    Returns a tuple of the list of created LaneReservations, in request order (with None for unassigned
+        requests), and the list of indexes of the requests that could not be assigned.
+
+    Raises a ValidationError if any of the requests is invalid (see `validate_lane_request()`).
+    """
+    if not lane_requests:
+        return [], []
+
+    for lane_request in lane_requests:
+        validate_lane_request(lane_request)
+
+    with transaction.atomic():
+        lanes = list(
+            Lane.objects.select_for_update().filter(pool=pool).order_by("id").values_list("id", "max_swimmers")
+        )
+        batch_span = DateTimeTZRange(
+            min(lane_request.period.lower for lane_request in lane_requests),
+            max(lane_request.period.upper for lane_request in lane_requests),
+        )
+        reserved_lane_periods = LaneReservation.objects.filter(lane__pool=pool, period__overlap=batch_span)
+        reserved_periods = {}
+        for lane_id, period in reserved_lane_periods.values_list("lane_id", "period"):
+            reserved_periods.setdefault(lane_id, []).append(period)
+
+        # Requests during one of the Pool's Closures are left unassigned
+        closure_periods = get_pool_closure_periods(pool.id)
+        open_indexes = [
+            index
+            for index, lane_request in enumerate(lane_requests)
+            if not overlaps_closure_periods(closure_periods, lane_request.period)
+        ]
+        open_assignments, open_unassigned = pack_lane_requests(
+            [lane_requests[index] for index in open_indexes], lanes, reserved_periods
+        )
+        assignments = {open_indexes[index]: lane_id for index, lane_id in open_assignments.items()}
+        unassigned = sorted(set(range(len(lane_requests))) - set(assignments))
+
+        # The new Reservations have no `actual` period, so none is in the water and the occupancy counters (see
+        #   `LaneOccupancy`) are unchanged
+        lane_reservations = LaneReservation.objects.bulk_create(
+            [
+                LaneReservation(lane_id=lane_id, period=lane_requests[index].period)
+                for index, lane_id in sorted(assignments.items())
+            ]
+        )
+        LaneReservationUser = LaneReservation.users.through
+        LaneReservationUser.objects.bulk_create(
+            [
+                LaneReservationUser(lanereservation_id=lane_reservation.id, user_id=user_id)
+                for index, lane_reservation in zip(sorted(assignments), lane_reservations)
+                for user_id in lane_requests[index].user_ids
+            ]
+        )
+
+    created = dict(zip(sorted(assignments), lane_reservations))
+    return [created.get(index) for index in range(len(lane_requests))], unassigned
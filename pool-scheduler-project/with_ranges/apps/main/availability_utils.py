@@ -0,0 +1,76 @@
+from bisect import bisect_left
+
+from apps.main.models import Closure
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+# How long (in seconds) each Pool's merged closure periods are cached. Saving or deleting a Closure also clears
+#   the cached periods of its Pool (see `signals.py`), in the cache shared by every process (see `CACHES`).
+POOL_CLOSURE_PERIODS_CACHE_TIMEOUT = 60 * 60
+
+
+def get_closure_period(lower: timezone.datetime.date, upper: timezone.datetime.date) -> DateTimeTZRange:
+    """
+    Converts Closure dates to the DateTimeTZRange running from the first moment of the first day to the first
+        moment after the last day
+    """
+    return DateTimeTZRange(
+        timezone.make_aware(timezone.datetime.combine(lower, timezone.datetime.min.time())),
+        timezone.make_aware(timezone.datetime.combine(upper, timezone.datetime.min.time())),
+    )
+
+
+def get_pool_closure_periods_cache_key(pool_id: int) -> str:
+    return f"pool_closure_periods:{pool_id}"
+
+
+def compute_pool_closure_periods(pool_id: int) -> list:
+    """
+    Merges the dates of all of a Pool's Closures into a sorted list of disjoint DateTimeTZRanges, in SQL
+
+    Overlapping and adjacent Closures are combined by the `range_agg` aggregate (Postgres 14+) into a multirange,
+        which is unnested into its component ranges in ascending order.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT lower(merged.dates), upper(merged.dates)
+            FROM (
+                SELECT unnest(range_agg(closure.dates)) AS dates
+                FROM {Closure._meta.db_table} closure
+                WHERE closure.pool_id = %s
+            ) merged
+            ORDER BY lower(merged.dates)
+            """,
+            [pool_id],
+        )
+        return [get_closure_period(lower, upper) for lower, upper in cursor.fetchall()]
+
+
+def get_pool_closure_periods(pool_id: int) -> list:
+    """
+    Returns the merged closure periods of a Pool (see `compute_pool_closure_periods()`), cached per Pool
+    """
+    return cache.get_or_set(
+        get_pool_closure_periods_cache_key(pool_id),
+        lambda: compute_pool_closure_periods(pool_id),
+        POOL_CLOSURE_PERIODS_CACHE_TIMEOUT,
+    )
+
+
+def overlaps_closure_periods(closure_periods: list, period: DateTimeTZRange) -> bool:
+    """
+    Returns whether the period overlaps any of a sorted list of disjoint closure periods, using a binary search
+
+    Because the closure periods are disjoint and sorted, only the last one starting before the period ends can
+        overlap the period.
+    """
+    index = bisect_left(closure_periods, period.upper, key=lambda closure_period: closure_period.lower)
+    return index > 0 and closure_periods[index - 1].upper > period.lower
+
+
+def is_pool_closed(pool_id: int, period: DateTimeTZRange) -> bool:
+    """Returns whether the Pool is closed at any point during the period"""
+    return overlaps_closure_periods(get_pool_closure_periods(pool_id), period)
@@ -0,0 +1,59 @@
+from functools import reduce
+
+from django.db.models import CharField, Count, QuerySet, Value
+
+
+def get_reservation_batch_context(
+    reservations: QuerySet, batch_filters: dict, block_names: list, row_limit: int, resource_field: str
+) -> dict:
+    """
+    Given a Lane or Locker Reservation QuerySet, the blocks of `get_lane_reservation_batch_filters()` or
+        `get_locker_reservation_batch_filters()`, and a list of requested block names, returns a context dictionary
+        containing the count and first `row_limit` reservations (by start) for each requested block
+
+    `resource_field` is the name of the Reservation's foreign key to its Lane or Locker ("lane" or "locker"), which
+        also names the list of each block's reservations in the context (e.g.: `lane_reservations`).
+
+    Rather than querying the reservation table once per block, this takes three queries however many blocks are
+        requested:
+
+    - The counts, with one `COUNT(*) FILTER (WHERE ...)` per block
+    - The ids of each block's first rows, with a `UNION ALL` of one `LIMIT`-ed query per block, so no more than
+        `row_limit` rows per block are read, even for blocks matching most of the table (e.g.: all past
+        reservations)
+    - The reservations with those ids, along with their Lane or Locker and Pool
+    """
+    batch_filters = {name: title_and_filter for name, title_and_filter in batch_filters.items() if name in block_names}
+    context = {"batch_results": []}
+    if not batch_filters:
+        return context
+
+    counts = reservations.aggregate(
+        **{name: Count("id", filter=block_filter) for name, (title, block_filter) in batch_filters.items()}
+    )
+
+    block_ids = [
+        reservations.filter(block_filter)
+        .annotate(batch_block=Value(name, output_field=CharField()))
+        .order_by("period__startswith", "id")
+        .values_list("batch_block", "id")[:row_limit]
+        for name, (title, block_filter) in batch_filters.items()
+        if counts[name]
+    ]
+    rows = {name: [] for name in batch_filters}
+    if block_ids:
+        block_ids = list(reduce(lambda union, ids: union.union(ids, all=True), block_ids))
+        reservations_by_id = reservations.select_related(f"{resource_field}__pool").in_bulk(
+            {reservation_id for name, reservation_id in block_ids}
+        )
+        for name, reservation_id in block_ids:
+            rows[name].append(reservations_by_id[reservation_id])
+        # A `UNION ALL` doesn't promise to keep the order of its parts
+        for block_rows in rows.values():
+            block_rows.sort(key=lambda reservation: (reservation.period.lower, reservation.id))
+
+    for name, (title, block_filter) in batch_filters.items():
+        context["batch_results"].append(
+            {"name": name, "title": title, "count": counts[name], f"{resource_field}_reservations": rows[name]}
+        )
+    return context
@@ -0,0 +1,265 @@
+import logging
+
+from apps.main.change_feed_utils import get_settled_change_seq
+from apps.main.models import (
+    Invoice,
+    InvoiceLine,
+    InvoiceRun,
+    Lane,
+    LaneReservation,
+    Locker,
+    LockerReservation,
+)
+from dateutil.relativedelta import relativedelta
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger("with_ranges.main")
+
+
+# Namespaces the advisory lock taken by invoice runs, so runs for the same month never overlap
+INVOICE_RUN_LOCK_NAMESPACE = 31
+
+
+def get_billing_month(month_string: str = None) -> timezone.datetime.date:
+    """
+    Converts a string in the format "YYYY-MM" to the first day of that month. Without a string, returns the first
+        day of the previous month, which is the month billed at month-end.
+
+    If the string is not properly formatted, raises a ValueError.
+    """
+    if month_string:
+        return timezone.datetime.strptime(month_string, "%Y-%m").date()
+    return timezone.now().date().replace(day=1) - relativedelta(months=1)
+
+
+def run_invoices(month: timezone.datetime.date, full: bool = False) -> dict:
+    """
+    Creates or updates the Invoices of every user for the Lane and Locker Reservations starting in `month`
+
+    Runs are incremental: only the Reservations changed since the month's previous run are billed again, from the
+        change sequence that run stored (see `InvoiceRun`). Any change to a Reservation's period, usage,
+        cancellation, resource, or users (see migration 0007) moves its change sequence past the stored one. The
+        first run of a month, or one with `full`, bills every Reservation of the month instead. Changes to the
+        per-hour cost of a Lane or Locker don't change its Reservations, so they are only billed by a full run.
+
+    The changed Reservations are billed in a handful of set-based statements within one transaction:
+
+    1. The charge for each (Reservation, user) pair is computed into a temporary table. Each Reservation is billed
+        for its actual usage once the user has checked in and out, and for its booked period otherwise, with a
+        minimum of one hour. The cost of a Lane Reservation is split evenly between its users. Lane Reservations
+        without users have no one to bill, so they are counted (as `unassigned_lane_reservations`) and logged.
+    2. Missing Invoices are inserted for users with charges.
+    3. Invoice lines are upserted, and existing lines are only written when their charge has changed.
+    4. Lines for changed Reservations that no longer qualify (e.g.: cancelled, moved to another month, or no
+        longer shared with the user) are deleted.
+    5. Invoice totals are refreshed where they changed, and Invoices left without lines are deleted. These read the
+        month's invoice lines rather than its Reservations, so lines removed along with a deleted Reservation are
+        reflected too.
+
+    Re-running the same month is idempotent. Returns the number of rows written by each step.
+    """
+    month = month.replace(day=1)
+    params = {
+        "month": month,
+        "next_month": month + relativedelta(months=1),
+        "lock_key": month.year * 100 + month.month,
+        "lock_namespace": INVOICE_RUN_LOCK_NAMESPACE,
+    }
+    lane_reservation_users = LaneReservation.users.through._meta.db_table
+    lane_reservation_users_column = LaneReservation.users.field.m2m_column_name()
+    invoice_table = Invoice._meta.db_table
+    invoice_line_table = InvoiceLine._meta.db_table
+
+    # Bills the actual usage period when it is complete, and the booked period otherwise
+    charged_period_sql = """
+        CASE
+            WHEN isempty(reservation.actual) OR lower_inf(reservation.actual) OR upper_inf(reservation.actual)
+            THEN reservation.period
+            ELSE reservation.actual
+        END
+    """
+    charged_hours_sql = f"""
+        greatest(
+            round(extract(epoch FROM upper({charged_period_sql}) - lower({charged_period_sql}))::numeric / 3600, 2),
+            1
+        )
+    """
+
+    results = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%(lock_namespace)s, %(lock_key)s)", params)
+
+        # Taken before anything is read, so Reservations changed by transactions that haven't committed yet are
+        #   billed by the next run
+        next_change_seq = get_settled_change_seq()
+        invoice_run = InvoiceRun.objects.filter(month=month).first()
+        full = full or invoice_run is None
+        results["full"] = full
+        changed_sql = changed_lines_sql = ""
+        if not full:
+            params["change_seq"] = invoice_run.change_seq
+            changed_sql = "AND reservation.change_seq >= %(change_seq)s"
+            changed_lines_sql = f"""
+                AND (
+                    line.lane_reservation_id IN (
+                        SELECT reservation.id
+                        FROM {LaneReservation._meta.db_table} reservation
+                        WHERE reservation.change_seq >= %(change_seq)s
+                    )
+                    OR line.locker_reservation_id IN (
+                        SELECT reservation.id
+                        FROM {LockerReservation._meta.db_table} reservation
+                        WHERE reservation.change_seq >= %(change_seq)s
+                    )
+                )
+            """
+
+        # Only dropped on commit, so it is left behind by an earlier run within the same outer transaction
+        cursor.execute("DROP TABLE IF EXISTS billing_charge")
+        cursor.execute(
+            f"""
+            CREATE TEMPORARY TABLE billing_charge ON COMMIT DROP AS
+            SELECT
+                'lane'::text AS kind,
+                reservation.id AS reservation_id,
+                reservation_user.user_id,
+                lane.per_hour_cost,
+                count(*) OVER (PARTITION BY reservation.id) AS share_count,
+                {charged_hours_sql} AS hours
+            FROM {LaneReservation._meta.db_table} reservation
+            LEFT JOIN {lane_reservation_users} reservation_user
+                ON reservation_user.{lane_reservation_users_column} = reservation.id
+            JOIN {Lane._meta.db_table} lane ON lane.id = reservation.lane_id
+            WHERE reservation.cancelled IS NULL
+                AND lower(reservation.period) >= %(month)s::date::timestamptz
+                AND lower(reservation.period) < %(next_month)s::date::timestamptz
+                {changed_sql}
+            UNION ALL
+            SELECT
+                'locker'::text AS kind,
+                reservation.id AS reservation_id,
+                reservation.user_id,
+                locker.per_hour_cost,
+                1 AS share_count,
+                {charged_hours_sql} AS hours
+            FROM {LockerReservation._meta.db_table} reservation
+            JOIN {Locker._meta.db_table} locker ON locker.id = reservation.locker_id
+            WHERE reservation.cancelled IS NULL
+                AND lower(reservation.period) >= %(month)s::date::timestamptz
+                AND lower(reservation.period) < %(next_month)s::date::timestamptz
+                {changed_sql}
+            """,
+            params,
+        )
+        results["charges"] = cursor.rowcount
+        cursor.execute("ANALYZE billing_charge")
+
+        cursor.execute("SELECT count(*) FROM billing_charge WHERE user_id IS NULL")
+        results["unassigned_lane_reservations"] = cursor.fetchone()[0]
+        if results["unassigned_lane_reservations"]:
+            logger.warning(
+                f"{results['unassigned_lane_reservations']} Lane Reservations starting in {month:%Y-%m} have no "
+                "users to bill"
+            )
+
+        cursor.execute(
+            f"""
+            INSERT INTO {invoice_table} (user_id, month, total, created, updated)
+            SELECT DISTINCT charge.user_id, %(month)s::date, 0, now(), now()
+            FROM billing_charge charge
+            WHERE charge.user_id IS NOT NULL
+            ON CONFLICT (user_id, month) DO NOTHING
+            """,
+            params,
+        )
+        results["invoices_created"] = cursor.rowcount
+
+        results["lines_written"] = 0
+        for kind in ("lane", "locker"):
+            reservation_column = f"{kind}_reservation_id"
+            other_reservation_column = "locker_reservation_id" if kind == "lane" else "lane_reservation_id"
+            cursor.execute(
+                f"""
+                INSERT INTO {invoice_line_table} AS line (
+                    invoice_id, {reservation_column}, {other_reservation_column},
+                    hours, per_hour_cost, share_count, amount, updated
+                )
+                SELECT
+                    invoice.id,
+                    charge.reservation_id,
+                    NULL,
+                    charge.hours,
+                    charge.per_hour_cost,
+                    charge.share_count,
+                    round(charge.hours * charge.per_hour_cost / charge.share_count, 2),
+                    now()
+                FROM billing_charge charge
+                JOIN {invoice_table} invoice ON invoice.user_id = charge.user_id AND invoice.month = %(month)s::date
+                WHERE charge.kind = %(kind)s
+                ON CONFLICT (invoice_id, {reservation_column}) WHERE {reservation_column} IS NOT NULL
+                DO UPDATE SET
+                    hours = EXCLUDED.hours,
+                    per_hour_cost = EXCLUDED.per_hour_cost,
+                    share_count = EXCLUDED.share_count,
+                    amount = EXCLUDED.amount,
+                    updated = EXCLUDED.updated
+                WHERE (line.hours, line.per_hour_cost, line.share_count, line.amount)
+                    IS DISTINCT FROM (EXCLUDED.hours, EXCLUDED.per_hour_cost, EXCLUDED.share_count, EXCLUDED.amount)
+                """,
+                {**params, "kind": kind},
+            )
+            results["lines_written"] += cursor.rowcount
+
+        cursor.execute(
+            f"""
+            DELETE FROM {invoice_line_table} line
+            USING {invoice_table} invoice
+            WHERE line.invoice_id = invoice.id
+                AND invoice.month = %(month)s::date
+                {changed_lines_sql}
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM billing_charge charge
+                    WHERE charge.user_id = invoice.user_id
+                        AND (
+                            (charge.kind = 'lane' AND charge.reservation_id = line.lane_reservation_id)
+                            OR (charge.kind = 'locker' AND charge.reservation_id = line.locker_reservation_id)
+                        )
+                )
+            """,
+            params,
+        )
+        results["lines_deleted"] = cursor.rowcount
+
+        cursor.execute(
+            f"""
+            UPDATE {invoice_table} invoice
+            SET total = invoice_total.total, updated = now()
+            FROM (
+                SELECT line.invoice_id, sum(line.amount) AS total
+                FROM {invoice_line_table} line
+                JOIN {invoice_table} month_invoice ON month_invoice.id = line.invoice_id
+                WHERE month_invoice.month = %(month)s::date
+                GROUP BY line.invoice_id
+            ) invoice_total
+            WHERE invoice.id = invoice_total.invoice_id AND invoice.total IS DISTINCT FROM invoice_total.total
+            """,
+            params,
+        )
+        results["invoices_updated"] = cursor.rowcount
+
+        cursor.execute(
+            f"""
+            DELETE FROM {invoice_table} invoice
+            WHERE invoice.month = %(month)s::date
+                AND NOT EXISTS (SELECT 1 FROM {invoice_line_table} line WHERE line.invoice_id = invoice.id)
+            """,
+            params,
+        )
+        results["invoices_deleted"] = cursor.rowcount
+
+        InvoiceRun.objects.update_or_create(month=month, defaults={"change_seq": next_change_seq})
+
+    logger.info(f"Invoice run for {month:%Y-%m}: {results}")
+    return results
@@ -0,0 +1,266 @@
+from apps.main.availability_utils import (
+    get_closure_period,
+    get_pool_closure_periods,
+    overlaps_closure_periods,
+)
+from apps.main.models import Lane, LaneBusyTime, Locker, LockerBusyTime, Pool
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+# Reservation periods start and end on :00 or :30 (see `DateTimeRangeLowerMinuteValidator(0, 30)`), so each day
+#   of a Lane or Locker's schedule fits in a 48-bit mask, where bit i is set when the i-th half hour is busy
+DAY_SLOT_LENGTH = timezone.timedelta(minutes=30)
+DAY_SLOT_COUNT = 48
+FULL_DAY_MASK = (1 << DAY_SLOT_COUNT) - 1
+
+# How long (in seconds) computed day masks are cached for each Pool and range of dates
+DAY_MASKS_CACHE_TIMEOUT = 60
+
+# The most days that one free period search may cover
+FREE_PERIOD_SEARCH_MAX_DAYS = 31
+
+
+def get_slot_index(value: timezone.datetime.time) -> int:
+    """Returns the index of the half-hour slot of the day that contains the time"""
+    return value.hour * 2 + value.minute // 30
+
+
+def get_slot_mask(start_slot: int, end_slot: int) -> int:
+    """Returns the mask with the bits of slots `start_slot` (inclusive) through `end_slot` (exclusive) set"""
+    start_slot = max(start_slot, 0)
+    end_slot = min(end_slot, DAY_SLOT_COUNT)
+    if start_slot >= end_slot:
+        return 0
+    return ((1 << (end_slot - start_slot)) - 1) << start_slot
+
+
+def get_time_mask(start: timezone.datetime.time, end: timezone.datetime.time = None) -> int:
+    """
+    Returns the mask of the slots from the `start` time until the `end` time (or until the end of the day). A
+        partially covered slot is included.
+    """
+    end_slot = DAY_SLOT_COUNT if end is None else get_slot_index(end) + (1 if end.minute % 30 or end.second else 0)
+    return get_slot_mask(get_slot_index(start), end_slot)
+
+
+def get_free_mask(*busy_masks: int) -> int:
+    """Returns the mask of the slots that are free in all of the busy masks"""
+    busy = 0
+    for busy_mask in busy_masks:
+        busy |= busy_mask
+    return ~busy & FULL_DAY_MASK
+
+
+def get_run_starts(free_mask: int, slot_count: int) -> int:
+    """
+    Returns the mask of the slots that start a run of at least `slot_count` consecutive free slots
+
+    Each shifted copy of the free mask rules out the starts whose run is interrupted at that offset, so this takes
+        `slot_count` bitwise operations no matter how many slots or masks there are.
+    """
+    if slot_count < 1:
+        return 0
+    run_starts = free_mask
+    for offset in range(1, slot_count):
+        run_starts &= free_mask >> offset
+    return run_starts
+
+
+def get_slot_indexes(mask: int) -> list:
+    """Returns the indexes of the set bits of a mask, in ascending order"""
+    indexes = []
+    while mask:
+        lowest_bit = mask & -mask
+        indexes.append(lowest_bit.bit_length() - 1)
+        mask ^= lowest_bit
+    return indexes
+
+
+def get_slot_period(day: timezone.datetime.date, start_slot: int, slot_count: int) -> DateTimeTZRange:
+    """Returns the period of `slot_count` slots on the day, starting with slot `start_slot`"""
+    day_start = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time()))
+    start = day_start + start_slot * DAY_SLOT_LENGTH
+    return DateTimeTZRange(start, start + slot_count * DAY_SLOT_LENGTH)
+
+
+def get_business_hours_mask(business_hours) -> int:
+    """
+    Returns the mask of the slots within a Pool's business hours (e.g.: `NumericRange(9, 17)` for 9am-5pm). An
+        unbounded end runs to the start or end of the day.
+    """
+    start_hour = 0 if business_hours.lower is None else business_hours.lower
+    end_hour = 24 if business_hours.upper is None else business_hours.upper
+    return get_slot_mask(start_hour * 2, end_hour * 2)
+
+
+def get_pool_open_masks(pool: Pool, first_date, last_date) -> dict:
+    """
+    Returns a dictionary mapping each date from `first_date` through `last_date` to the mask of the slots during
+        which the Pool is open: its business hours, or none at all on the days that overlap any of its Closures
+        (see `get_pool_closure_periods()`)
+    """
+    business_hours_mask = get_business_hours_mask(pool.business_hours)
+    closure_periods = get_pool_closure_periods(pool.id)
+    open_masks = {}
+    day = first_date
+    while day <= last_date:
+        day_period = get_closure_period(day, day + timezone.timedelta(days=1))
+        open_masks[day] = 0 if overlaps_closure_periods(closure_periods, day_period) else business_hours_mask
+        day += timezone.timedelta(days=1)
+    return open_masks
+
+
+def compute_day_masks(busy_time_model, resource_model, pool_id: int, first_date, last_date) -> dict:
+    """
+    Computes the busy mask of each day from `first_date` through `last_date` for every Lane or Locker (depending
+        on the models given) of a Pool, with a single query over their busy time (see `LaneBusyTime`)
+
+    The busy time of each day is intersected with the day, and the slots covered by each resulting range are
+        OR-ed into a bigint, so each mask is built in Postgres.
+
+    Returns a dictionary mapping each resource id to a dictionary mapping each date to its busy mask.
+    """
+    resource_table = resource_model._meta.db_table
+    resource_column = busy_time_model._meta.pk.column
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT
+                resource.id,
+                day::date,
+                coalesce(bit_or((1::bigint << slot_index)), 0)
+            FROM {resource_table} resource
+            CROSS JOIN generate_series(%(first_date)s::date, %(last_date)s::date, interval '1 day') AS day
+            LEFT JOIN {busy_time_model._meta.db_table} busy_time ON busy_time.{resource_column} = resource.id
+            LEFT JOIN LATERAL unnest(
+                busy_time.busy * tstzmultirange(tstzrange(day::timestamptz, day::timestamptz + interval '1 day'))
+            ) AS busy_range ON TRUE
+            LEFT JOIN LATERAL generate_series(
+                floor(extract(epoch FROM lower(busy_range) - day::timestamptz) / 1800)::integer,
+                ceil(extract(epoch FROM upper(busy_range) - day::timestamptz) / 1800)::integer - 1
+            ) AS slot_index ON TRUE
+            WHERE resource.pool_id = %(pool_id)s
+            GROUP BY resource.id, day
+            ORDER BY resource.id, day
+            """,
+            {"pool_id": pool_id, "first_date": first_date, "last_date": last_date},
+        )
+        day_masks = {}
+        for resource_id, day, busy_mask in cursor.fetchall():
+            day_masks.setdefault(resource_id, {})[day] = busy_mask
+        return day_masks
+
+
+def get_lane_day_masks(pool: Pool, first_date, last_date) -> dict:
+    """
+    Returns the busy masks of each of a Pool's Lanes from `first_date` through `last_date` (see
+        `compute_day_masks()`), cached briefly per Pool and range of dates
+    """
+    return cache.get_or_set(
+        f"lane_day_masks:{pool.id}:{first_date:%Y-%m-%d}:{last_date:%Y-%m-%d}",
+        lambda: compute_day_masks(LaneBusyTime, Lane, pool.id, first_date, last_date),
+        DAY_MASKS_CACHE_TIMEOUT,
+    )
+
+
+def get_locker_day_masks(pool: Pool, first_date, last_date) -> dict:
+    """
+    Returns the busy masks of each of a Pool's Lockers from `first_date` through `last_date` (see
+        `compute_day_masks()`), cached briefly per Pool and range of dates
+    """
+    return cache.get_or_set(
+        f"locker_day_masks:{pool.id}:{first_date:%Y-%m-%d}:{last_date:%Y-%m-%d}",
+        lambda: compute_day_masks(LockerBusyTime, Locker, pool.id, first_date, last_date),
+        DAY_MASKS_CACHE_TIMEOUT,
+    )
+
+
+def find_common_free_periods(
+    day_masks: dict, resource_ids: list, slot_count: int, window_mask=FULL_DAY_MASK, open_masks: dict = None
+) -> list:
+    """
+    Returns every period of `slot_count` slots within the window of each day during which all of the resources
+        (e.g.: Lanes A, B and C) are free, in order
+
+    `day_masks` is the output of `get_lane_day_masks()` or `get_locker_day_masks()`. A resource without masks
+        (e.g.: a Lane added since the masks were cached) has no Reservations, so it is free all day. With
+        `open_masks` (see `get_pool_open_masks()`), only the days and slots during which the Pool is open are
+        searched.
+    """
+    if open_masks is None:
+        open_masks = dict.fromkeys({day for masks in day_masks.values() for day in masks}, FULL_DAY_MASK)
+    periods = []
+    for day, open_mask in sorted(open_masks.items()):
+        free_mask = get_free_mask(*(day_masks.get(resource_id, {}).get(day, 0) for resource_id in resource_ids))
+        for start_slot in get_slot_indexes(get_run_starts(free_mask & window_mask & open_mask, slot_count)):
+            periods.append(get_slot_period(day, start_slot, slot_count))
+    return periods
+
+
+def find_resources_free_every_day(day_masks: dict, window_mask: int, open_masks: dict = None) -> list:
+    """
+    Returns the ids of the resources that are free during the window (e.g.: 6-8am) on every day of `day_masks`
+
+    With `open_masks` (see `get_pool_open_masks()`), only the part of the window during which the Pool is open is
+        checked, and it must not be empty, so no resource is free every day when the Pool is closed on one of the
+        days, or when the window falls outside of its business hours.
+    """
+    if open_masks is None:
+        open_masks = dict.fromkeys({day for masks in day_masks.values() for day in masks}, FULL_DAY_MASK)
+    return sorted(
+        resource_id
+        for resource_id, masks in day_masks.items()
+        if all(
+            window_mask & open_mask and masks.get(day, 0) & window_mask & open_mask == 0
+            for day, open_mask in open_masks.items()
+        )
+    )
+
+
+def search_pool_free_periods(
+    pool: Pool,
+    kind: str,
+    resource_ids: list,
+    first_date,
+    last_date,
+    slot_count: int,
+    window_mask: int = FULL_DAY_MASK,
+) -> dict:
+    """
+    Finds every period of `slot_count` slots within the window of each day from `first_date` through `last_date`
+        during which all of the given Lanes or Lockers (depending on `kind`) of a Pool are free (e.g.: a club
+        needing Lanes A, B and C together), and which of the Pool's Lanes or Lockers are free during the window on
+        every day. The resources default to all of the Pool's Lanes or Lockers. Only the slots within the Pool's
+        business hours, on days that none of its Closures overlap, are free (see `get_pool_open_masks()`).
+
+    If the kind, dates, or slot count are invalid, or a resource is not in the Pool, raises a ValueError.
+    """
+    if kind not in ("lane", "locker"):
+        raise ValueError(f"Invalid type: {kind}")
+    if not first_date <= last_date or (last_date - first_date).days >= FREE_PERIOD_SEARCH_MAX_DAYS:
+        raise ValueError(f"Searches must cover between 1 and {FREE_PERIOD_SEARCH_MAX_DAYS} days")
+    if not 0 < slot_count <= DAY_SLOT_COUNT:
+        raise ValueError(f"Periods must be between 1 and {DAY_SLOT_COUNT} slots long")
+
+    resource_model, get_day_masks = (Lane, get_lane_day_masks) if kind == "lane" else (Locker, get_locker_day_masks)
+    pool_resource_ids = set(resource_model.objects.filter(pool=pool).values_list("id", flat=True))
+    if not set(resource_ids) <= pool_resource_ids:
+        raise ValueError(f"Not every {kind} is in {pool}")
+    resource_ids = sorted(resource_ids or pool_resource_ids)
+
+    day_masks = get_day_masks(pool, first_date, last_date)
+    # Resources without masks have no Reservations (see `find_common_free_periods()`)
+    day_masks = {resource_id: day_masks.get(resource_id, {}) for resource_id in pool_resource_ids}
+    open_masks = get_pool_open_masks(pool, first_date, last_date)
+    return {
+        "pool": pool.id,
+        "type": kind,
+        kind: resource_ids,
+        "periods": [
+            {"start": period.lower.isoformat(), "end": period.upper.isoformat()}
+            for period in find_common_free_periods(day_masks, resource_ids, slot_count, window_mask, open_masks)
+        ],
+        "free_every_day": find_resources_free_every_day(day_masks, window_mask, open_masks),
+    }
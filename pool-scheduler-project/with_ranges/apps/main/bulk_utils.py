@@ -0,0 +1,200 @@
+import logging
+
+from apps.main.models import Closure, Lane, LaneReservation, Locker, LockerReservation
+from apps.main.occupancy_utils import (
+    get_in_water_returning_sql,
+    remove_cancelled_swimmers,
+)
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+logger = logging.getLogger("with_ranges.main")
+
+
+# Reservation periods start and end on :00 or :30 (see `DateTimeRangeLowerMinuteValidator(0, 30)`), so periods can
+#   only be shifted by whole multiples of half an hour
+SHIFT_GRANULARITY = timezone.timedelta(minutes=30)
+
+# For each Reservation model: its resource model, the columns that two active Reservations must not share while
+#   overlapping, and the exclusion constraints enforcing that
+BULK_RESERVATION_MODELS = {
+    LaneReservation: (Lane, ("lane_id",), ("excl_overlap_lane_res",)),
+    LockerReservation: (
+        Locker,
+        ("locker_id", "user_id"),
+        ("excl_overlap_locker_res", "excl_overlap_user_locker_res"),
+    ),
+}
+
+
+def get_selected_ids_sql(queryset: QuerySet) -> tuple:
+    """Returns the SQL and params of a subquery selecting the ids of a queryset's Reservations"""
+    return queryset.order_by().values("pk").query.sql_with_params()
+
+
+def validate_shift_offset(offset: timezone.timedelta):
+    """If the offset is zero or not a whole multiple of `SHIFT_GRANULARITY`, raises a ValidationError"""
+    if not offset or offset % SHIFT_GRANULARITY:
+        raise ValidationError(f"Reservations can only be shifted by a non-zero multiple of {SHIFT_GRANULARITY}")
+
+
+def bulk_cancel_reservations(queryset: QuerySet) -> dict:
+    """
+    Cancels the active Reservations of a LaneReservation or LockerReservation queryset (e.g.: every Reservation of
+        a user, or of Lane 3 next Tuesday) with a single UPDATE statement, instead of loading and saving each one
+
+    Swimmers of cancelled Lane Reservations that were in the water are taken off the occupancy counters, as
+        `LaneReservation.cancel_reservation()` does. Returns the ids of the cancelled Reservations.
+    """
+    reservation_model = queryset.model
+    ids_sql, params = get_selected_ids_sql(queryset)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {reservation_model._meta.db_table} reservation
+            SET cancelled = now()
+            WHERE reservation.id IN ({ids_sql}) AND reservation.cancelled IS NULL
+            RETURNING reservation.id, {get_in_water_returning_sql(reservation_model)}
+            """,
+            params,
+        )
+        rows = cursor.fetchall()
+        remove_cancelled_swimmers(row[1:] for row in rows)
+
+    cancelled_ids = sorted(row[0] for row in rows)
+    logger.info(f"Bulk cancelled {len(cancelled_ids)} {reservation_model._meta.verbose_name_plural}")
+    return {"cancelled": cancelled_ids}
+
+
+def get_shift_conflicts(cursor, reservation_model, reservation_ids: list, offset: timezone.timedelta) -> dict:
+    """
+    Finds which of the Reservations can't be shifted by the offset, with the reason for each: because they are
+        already checked in, because their shifted period would overlap a Closure of their Pool, or because it would
+        overlap another active Reservation of the same Lane or Locker (or, for Locker Reservations, of the same user)
+
+    The Reservations being shifted together are compared by their shifted periods, so shifting a whole day's
+        bookings doesn't conflict with itself. Leaving out a conflicting Reservation can make others conflict with
+        it, so the overlap check is repeated (one query each time) until no new conflicts are found.
+
+    Returns a dictionary mapping the id of each conflicting Reservation to the reason.
+    """
+    resource_model, overlap_columns, constraint_names = BULK_RESERVATION_MODELS[reservation_model]
+    reservation_table = reservation_model._meta.db_table
+    resource_column = overlap_columns[0]
+    shifted_sql = "tstzrange(lower({0}.period) + %(offset)s, upper({0}.period) + %(offset)s, '[)')"
+    params = {"ids": reservation_ids, "offset": offset, "span": abs(offset)}
+
+    cursor.execute(
+        f"""
+        SELECT reservation.id, CASE WHEN lower(reservation.actual) IS NOT NULL THEN 'Already checked in'
+            ELSE 'Would overlap a Closure' END
+        FROM {reservation_table} reservation
+        JOIN {resource_model._meta.db_table} resource ON resource.id = reservation.{resource_column}
+        WHERE reservation.id = ANY(%(ids)s)
+            AND (
+                lower(reservation.actual) IS NOT NULL
+                OR EXISTS (
+                    SELECT 1
+                    FROM {Closure._meta.db_table} closure
+                    WHERE closure.pool_id = resource.pool_id
+                        AND {shifted_sql.format("reservation")} && tstzrange(
+                            lower(closure.dates)::timestamptz, upper(closure.dates)::timestamptz, '[)'
+                        )
+                )
+            )
+        """,
+        params,
+    )
+    conflicts = dict(cursor.fetchall())
+
+    shared_resource_sql = " OR ".join(f"other.{column} = moving.{column}" for column in overlap_columns)
+    moving_ids = [reservation_id for reservation_id in reservation_ids if reservation_id not in conflicts]
+    while moving_ids:
+        cursor.execute(
+            f"""
+            SELECT moving.id, min(other.id)
+            FROM {reservation_table} moving
+            JOIN {reservation_table} other
+                ON other.id <> moving.id
+                AND other.cancelled IS NULL
+                AND ({shared_resource_sql})
+                -- Narrows the candidates with the exclusion constraint's index
+                AND other.period && tstzrange(
+                    lower(moving.period) - %(span)s, upper(moving.period) + %(span)s, '[)'
+                )
+                AND CASE
+                    WHEN other.id = ANY(%(moving_ids)s) THEN {shifted_sql.format("other")}
+                    ELSE other.period
+                END && {shifted_sql.format("moving")}
+            WHERE moving.id = ANY(%(moving_ids)s)
+            GROUP BY moving.id
+            """,
+            {**params, "moving_ids": moving_ids},
+        )
+        overlaps = cursor.fetchall()
+        if not overlaps:
+            break
+        for reservation_id, other_id in overlaps:
+            conflicts[reservation_id] = f"Would overlap {reservation_model._meta.verbose_name} {other_id}"
+        moving_ids = [reservation_id for reservation_id in moving_ids if reservation_id not in conflicts]
+    return conflicts
+
+
+def bulk_shift_reservations(queryset: QuerySet, offset: timezone.timedelta) -> dict:
+    """
+    Shifts the periods of the active Reservations of a LaneReservation or LockerReservation queryset by the offset
+        (e.g.: all of a Pool's bookings on a date, one hour later), with a single UPDATE statement
+
+    Reservations that can't be shifted (see `get_shift_conflicts()`) are left as they are and reported instead of
+        failing the whole operation. The exclusion constraints are deferred while the others are shifted, then
+        checked before returning, in case a conflicting Reservation was booked concurrently. The LaneSlots of
+        shifted Lane Reservations are moved along with them by the triggers of migration 0011.
+
+    If the offset is invalid, or a concurrent change conflicts, raises a ValidationError. Returns the ids of the
+        shifted Reservations, and a dictionary mapping the id of each one that was not shifted to the reason.
+    """
+    validate_shift_offset(offset)
+    reservation_model = queryset.model
+    resource_model, overlap_columns, constraint_names = BULK_RESERVATION_MODELS[reservation_model]
+    reservation_table = reservation_model._meta.db_table
+    ids_sql, params = get_selected_ids_sql(queryset)
+
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT reservation.id
+                FROM {reservation_table} reservation
+                WHERE reservation.id IN ({ids_sql}) AND reservation.cancelled IS NULL
+                ORDER BY reservation.id
+                FOR UPDATE
+                """,
+                params,
+            )
+            reservation_ids = [row[0] for row in cursor.fetchall()]
+            conflicts = get_shift_conflicts(cursor, reservation_model, reservation_ids, offset)
+            moved_ids = [reservation_id for reservation_id in reservation_ids if reservation_id not in conflicts]
+
+            if moved_ids:
+                cursor.execute(f"SET CONSTRAINTS {', '.join(constraint_names)} DEFERRED")
+                cursor.execute(
+                    f"""
+                    UPDATE {reservation_table}
+                    SET period = tstzrange(lower(period) + %(offset)s, upper(period) + %(offset)s, '[)')
+                    WHERE id = ANY(%(ids)s)
+                    """,
+                    {"ids": moved_ids, "offset": offset},
+                )
+                cursor.execute(f"SET CONSTRAINTS {', '.join(constraint_names)} IMMEDIATE")
+    except IntegrityError as e:
+        logger.info(f"Could not shift {reservation_model._meta.verbose_name_plural}: {e}")
+        raise ValidationError("Reservations were booked concurrently, so none were shifted. Please try again.")
+
+    logger.info(
+        f"Bulk shifted {len(moved_ids)} {reservation_model._meta.verbose_name_plural} by {offset}, "
+        f"{len(conflicts)} conflicts"
+    )
+    return {"moved": moved_ids, "conflicts": conflicts}
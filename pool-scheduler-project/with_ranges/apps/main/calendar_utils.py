@@ -0,0 +1,317 @@
+import struct
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import QuerySet
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+# The formats in which calendar data can be provided to `calendar.html`
+CALENDAR_FORMAT_DICTS = "dicts"
+CALENDAR_FORMAT_JSON = "json"
+CALENDAR_FORMAT_COLUMNS = "columns"
+CALENDAR_FORMAT_BINARY = "binary"
+
+EMPTY_CALENDAR_JSON = b'{"groups" : [], "items" : []}'
+
+# Identifies (and versions) the binary encodings produced by `encode_calendar_columns()` and
+#   `encode_calendar_buckets()`
+CALENDAR_COLUMNS_MAGIC = b"CAL1"
+CALENDAR_BUCKETS_MAGIC = b"CALB"
+
+# The `struct` format of each binary calendar column: ids are bigint primary keys, and epoch seconds are signed
+CALENDAR_COLUMN_FORMATS = {
+    "ids": "Q",
+    "groups": "Q",
+    "group_ids": "Q",
+    "starts": "q",
+    "ends": "q",
+    "occupied": "Q",
+}
+
+# Calendar windows up to this span show individual reservations, while wider windows show occupancy buckets
+CALENDAR_ITEMS_MAX_SPAN = timezone.timedelta(days=7)
+
+# Calendar windows up to this span use hourly occupancy buckets, while wider windows use daily buckets
+CALENDAR_HOURLY_BUCKETS_MAX_SPAN = timezone.timedelta(days=31)
+
+CALENDAR_BUCKET_SIZES = {
+    "hour": timezone.timedelta(hours=1),
+    "day": timezone.timedelta(days=1),
+}
+
+
+def get_calendar_json(calendar_groups_queryset: QuerySet, calendar_reservations_queryset: QuerySet) -> bytes:
+    """
+    Given a `.values()` QuerySet of calendar groups and a `.values()` QuerySet of calendar reservations, has Postgres
+        build the complete calendar JSON document in a single query, and returns it as UTF-8 encoded bytes
+
+    The resulting document has the form `{"groups" : [...], "items" : [...]}`, where each group and item is an
+        object whose keys are the names of the values in each QuerySet. No Python-side row objects are created, so
+        the bytes can be sent straight to the response, or placed directly into a template.
+
+    Any `<` characters are escaped as `\\u003c`, so the document can be safely embedded within a `<script>` tag.
+    """
+    try:
+        groups_sql, groups_params = calendar_groups_queryset.query.sql_with_params()
+        reservations_sql, reservations_params = calendar_reservations_queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return EMPTY_CALENDAR_JSON
+
+    sql = f"""
+        SELECT convert_to(
+            replace(
+                json_build_object(
+                    'groups', (
+                        SELECT coalesce(json_agg(calendar_group), '[]'::json) FROM ({groups_sql}) calendar_group
+                    ),
+                    'items', (SELECT coalesce(json_agg(item), '[]'::json) FROM ({reservations_sql}) item)
+                )::text,
+                '<',
+                '\\u003c'
+            ),
+            'UTF8'
+        )
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*groups_params, *reservations_params))
+        return bytes(cursor.fetchone()[0])
+
+
+def get_calendar_columns(calendar_groups_queryset: QuerySet, calendar_reservations_queryset: QuerySet) -> dict:
+    """
+    Given a `.values()` QuerySet of calendar groups (providing `id` and `content`) and a `.values()` QuerySet of
+        calendar reservations (providing `id`, `group`, and the `start` and `end` datetimes), returns the calendar
+        data in a compact columnar form, fetched as arrays in a single query
+
+    The result is a dictionary of parallel lists:
+
+    - `group_ids` and `group_labels` for the calendar groups
+    - `ids`, `groups`, `starts`, and `ends` for the reservations, with `starts` and `ends` in epoch seconds
+
+    The item labels are left for the client to render.
+    """
+    calendar_columns = {
+        "group_ids": [],
+        "group_labels": [],
+        "ids": [],
+        "groups": [],
+        "starts": [],
+        "ends": [],
+    }
+    try:
+        groups_sql, groups_params = calendar_groups_queryset.query.sql_with_params()
+        reservations_sql, reservations_params = calendar_reservations_queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return calendar_columns
+
+    sql = f"""
+        SELECT
+            coalesce(calendar_groups.ids, '{{}}'),
+            coalesce(calendar_groups.labels, '{{}}'),
+            coalesce(items.ids, '{{}}'),
+            coalesce(items.groups, '{{}}'),
+            coalesce(items.starts, '{{}}'),
+            coalesce(items.ends, '{{}}')
+        FROM
+            (
+                SELECT array_agg(calendar_group.id) AS ids, array_agg(calendar_group.content) AS labels
+                FROM ({groups_sql}) calendar_group
+            ) calendar_groups,
+            (
+                SELECT
+                    array_agg(item.id) AS ids,
+                    array_agg(item."group") AS groups,
+                    array_agg(extract(epoch FROM item."start")::bigint) AS starts,
+                    array_agg(extract(epoch FROM item."end")::bigint) AS ends
+                FROM ({reservations_sql}) item
+            ) items
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*groups_params, *reservations_params))
+        for key, column in zip(calendar_columns, cursor.fetchone()):
+            calendar_columns[key] = column
+    return calendar_columns
+
+
+def encode_calendar_columns(calendar_columns: dict) -> bytes:
+    """
+    Packs the result of `get_calendar_columns()` into a compact binary form, which `calendar.html` can decode
+
+    All integers are little-endian, laid out as:
+
+    - the `CAL1` magic bytes, and the number of items and of groups as unsigned 32-bit values
+    - the `ids`, `groups`, `starts`, and `ends` columns, each with one 64-bit value per item (see
+        `CALENDAR_COLUMN_FORMATS`)
+    - the `group_ids` column, with one unsigned 64-bit value per group
+    - for each group, the byte length of its label (unsigned 32-bit), followed by the UTF-8 encoded label
+    """
+    item_count = len(calendar_columns["ids"])
+    group_count = len(calendar_columns["group_ids"])
+
+    chunks = [struct.pack("<4sII", CALENDAR_COLUMNS_MAGIC, item_count, group_count)]
+    for key in ("ids", "groups", "starts", "ends"):
+        chunks.append(struct.pack(f"<{item_count}{CALENDAR_COLUMN_FORMATS[key]}", *calendar_columns[key]))
+    chunks.append(struct.pack(f"<{group_count}{CALENDAR_COLUMN_FORMATS['group_ids']}", *calendar_columns["group_ids"]))
+    for label in calendar_columns["group_labels"]:
+        encoded_label = label.encode()
+        chunks.append(struct.pack("<I", len(encoded_label)))
+        chunks.append(encoded_label)
+    return b"".join(chunks)
+
+
+def get_calendar_window(start: str, end: str) -> DateTimeTZRange:
+    """
+    Given the lower and upper values of a calendar window as strings of epoch seconds (e.g.: from request
+        parameters), returns the window as a DateTimeTZRange
+
+    Raises a ValueError if either value is not an integer, or if the window is empty.
+    """
+    lower = timezone.datetime.fromtimestamp(int(start), tz=timezone.utc)
+    upper = timezone.datetime.fromtimestamp(int(end), tz=timezone.utc)
+    if not lower < upper:
+        raise ValueError(f"Calendar window start ({start}) must be smaller than end ({end})")
+    return DateTimeTZRange(lower, upper)
+
+
+def get_calendar_window_context(window: DateTimeTZRange) -> dict:
+    """
+    Returns a context dictionary with the lower and upper values of a calendar window in epoch seconds, which
+        `calendar.html` uses for the initial visible range and the initial data request
+    """
+    lower, upper = window.lower, window.upper
+    if timezone.is_naive(lower):
+        lower = timezone.make_aware(lower)
+    if timezone.is_naive(upper):
+        upper = timezone.make_aware(upper)
+
+    context = {}
+    context["calendar_window_start"] = int(lower.timestamp())
+    context["calendar_window_end"] = int(upper.timestamp())
+    return context
+
+
+def get_calendar_bucket_unit(
+    window: DateTimeTZRange, hourly_buckets_max_span: timezone.timedelta = CALENDAR_HOURLY_BUCKETS_MAX_SPAN
+):
+    """
+    Given a calendar window, returns the unit of the occupancy buckets to show ("hour" or "day"), or None if the
+        window is narrow enough to show individual reservations
+    """
+    span = window.upper - window.lower
+    if span <= CALENDAR_ITEMS_MAX_SPAN:
+        return None
+    if span <= hourly_buckets_max_span:
+        return "hour"
+    return "day"
+
+
+def get_calendar_buckets(
+    calendar_groups_queryset: QuerySet,
+    calendar_periods_queryset: QuerySet,
+    window: DateTimeTZRange,
+    bucket_unit: str,
+) -> dict:
+    """
+    Given a `.values()` QuerySet of calendar groups (providing `id` and `content`) and a `.values()` QuerySet of
+        reservation periods (providing `group` and `period`), returns the occupancy of each group in each hourly or
+        daily bucket of the window, computed in a single query
+
+    Rather than sending every reservation, each reservation's period is clipped to the window, split across the
+        buckets it spans with `generate_series`, and intersected with each bucket's range. The booked seconds are
+        then summed per group and bucket. Buckets without any bookings are omitted.
+
+    The result is a dictionary of parallel lists, in the same spirit as `get_calendar_columns()`:
+
+    - `bucket_size`, the length of each bucket in seconds
+    - `group_ids` and `group_labels` for the calendar groups
+    - `groups`, `starts` (in epoch seconds), and `occupied` (booked seconds) for the buckets
+    """
+    bucket_size = CALENDAR_BUCKET_SIZES[bucket_unit]
+    calendar_buckets = {
+        "bucket_size": int(bucket_size.total_seconds()),
+        "group_ids": [],
+        "group_labels": [],
+        "groups": [],
+        "starts": [],
+        "occupied": [],
+    }
+    try:
+        groups_sql, groups_params = calendar_groups_queryset.query.sql_with_params()
+        periods_sql, periods_params = calendar_periods_queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return calendar_buckets
+
+    sql = f"""
+        SELECT
+            coalesce(calendar_groups.ids, '{{}}'),
+            coalesce(calendar_groups.labels, '{{}}'),
+            coalesce(buckets.groups, '{{}}'),
+            coalesce(buckets.starts, '{{}}'),
+            coalesce(buckets.occupied, '{{}}')
+        FROM
+            (
+                SELECT array_agg(calendar_group.id) AS ids, array_agg(calendar_group.content) AS labels
+                FROM ({groups_sql}) calendar_group
+            ) calendar_groups,
+            (
+                SELECT
+                    array_agg(bucket."group" ORDER BY bucket."group", bucket.start) AS groups,
+                    array_agg(extract(epoch FROM bucket.start)::bigint ORDER BY bucket."group", bucket.start) AS starts,
+                    array_agg(bucket.occupied ORDER BY bucket."group", bucket.start) AS occupied
+                FROM (
+                    SELECT
+                        item."group",
+                        bucket_start AS start,
+                        sum(extract(epoch FROM upper(slice.overlap) - lower(slice.overlap)))::bigint AS occupied
+                    FROM
+                        (
+                            SELECT reservation."group", reservation.period * %s::tstzrange AS windowed
+                            FROM ({periods_sql}) reservation
+                        ) item
+                        CROSS JOIN LATERAL generate_series(
+                            date_trunc(%s, lower(item.windowed)),
+                            upper(item.windowed) - interval '1 microsecond',
+                            %s::interval
+                        ) AS bucket_start
+                        CROSS JOIN LATERAL (
+                            SELECT item.windowed * tstzrange(bucket_start, bucket_start + %s::interval) AS overlap
+                        ) slice
+                    WHERE NOT isempty(item.windowed)
+                    GROUP BY item."group", bucket_start
+                ) bucket
+            ) buckets
+    """
+    params = (*groups_params, window, *periods_params, bucket_unit, bucket_size, bucket_size)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for key, column in zip(list(calendar_buckets)[1:], cursor.fetchone()):
+            calendar_buckets[key] = column
+    return calendar_buckets
+
+
+def encode_calendar_buckets(calendar_buckets: dict) -> bytes:
+    """
+    Packs the result of `get_calendar_buckets()` into a compact binary form, which `calendar.html` can decode
+
+    All integers are little-endian, laid out as:
+
+    - the `CALB` magic bytes, and the number of buckets, the number of groups, and the bucket size in seconds as
+        unsigned 32-bit values
+    - the `groups`, `starts`, and `occupied` columns, each with one 64-bit value per bucket (see
+        `CALENDAR_COLUMN_FORMATS`)
+    - the `group_ids` column, with one unsigned 64-bit value per group
+    - for each group, the byte length of its label (unsigned 32-bit), followed by the UTF-8 encoded label
+    """
+    bucket_count = len(calendar_buckets["starts"])
+    group_count = len(calendar_buckets["group_ids"])
+
+    chunks = [struct.pack("<4sIII", CALENDAR_BUCKETS_MAGIC, bucket_count, group_count, calendar_buckets["bucket_size"])]
+    for key in ("groups", "starts", "occupied"):
+        chunks.append(struct.pack(f"<{bucket_count}{CALENDAR_COLUMN_FORMATS[key]}", *calendar_buckets[key]))
+    chunks.append(struct.pack(f"<{group_count}{CALENDAR_COLUMN_FORMATS['group_ids']}", *calendar_buckets["group_ids"]))
+    for label in calendar_buckets["group_labels"]:
+        encoded_label = label.encode()
+        chunks.append(struct.pack("<I", len(encoded_label)))
+        chunks.append(encoded_label)
+    return b"".join(chunks)
@@ -0,0 +1,156 @@
+from apps.main.models import Closure, DeletedRecord, LaneReservation, LockerReservation
+from django.db import connection
+from django.db.models import F, Q
+
+# How many changes are returned per page by default, and at most
+CHANGE_FEED_PAGE_SIZE = 500
+CHANGE_FEED_MAX_PAGE_SIZE = 5000
+
+# The kinds of records in the change feed. Reservations include cancelled ones, which the default managers hide.
+CHANGE_FEED_QUERYSETS = {
+    "lane_reservation": lambda: LaneReservation.all_objects.annotate(pool=F("lane__pool_id")).values(
+        "id", "change_seq", "pool", "lane_id", "period", "actual", "cancelled"
+    ),
+    "locker_reservation": lambda: LockerReservation.all_objects.annotate(pool=F("locker__pool_id")).values(
+        "id", "change_seq", "pool", "locker_id", "user_id", "period", "actual", "cancelled"
+    ),
+    "closure": lambda: Closure.objects.values("id", "change_seq", "pool_id", "dates", "reason"),
+}
+
+
+def parse_change_cursor(cursor: str) -> tuple:
+    """
+    Converts a change cursor (e.g.: "48213-907") into a `(change_seq, id)` tuple. An empty cursor starts from the
+        beginning.
+
+    If the cursor is not properly formatted, raises a ValueError.
+    """
+    if not cursor:
+        return 0, 0
+    change_seq, record_id = cursor.split("-")
+    return int(change_seq), int(record_id)
+
+
+def format_change_cursor(change_seq: int, record_id: int) -> str:
+    return f"{change_seq}-{record_id}"
+
+
+def get_settled_change_seq() -> int:
+    """
+    Returns the change sequence below which no more rows can be written: the id of the oldest transaction still
+        running (or the next one, if none are). Every change with a lower sequence is already committed and visible.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def get_range_bounds(value) -> tuple:
+    """Returns the ISO 8601 lower and upper bounds of a range, with None for missing bounds"""
+    if value is None or isinstance(value, (tuple, list)):
+        return None, None
+    return (
+        None if value.lower is None else value.lower.isoformat(),
+        None if value.upper is None else value.upper.isoformat(),
+    )
+
+
+def serialize_change(kind: str, row: dict) -> dict:
+    """Converts a row from `CHANGE_FEED_QUERYSETS` into a JSON-serializable dictionary"""
+    if kind == "closure":
+        start, end = get_range_bounds(row["dates"])
+        return {"id": row["id"], "pool": row["pool_id"], "start": start, "end": end, "reason": row["reason"]}
+
+    start, end = get_range_bounds(row["period"])
+    actual_start, actual_end = get_range_bounds(row["actual"])
+    change = {"id": row["id"], "pool": row["pool"]}
+    if kind == "lane_reservation":
+        change["lane"] = row["lane_id"]
+        change["users"] = row["users"]
+    else:
+        change["locker"] = row["locker_id"]
+        change["user"] = row["user_id"]
+    change.update(
+        {
+            "start": start,
+            "end": end,
+            "actual_start": actual_start,
+            "actual_end": actual_end,
+            "cancelled": row["cancelled"] and row["cancelled"].isoformat(),
+        }
+    )
+    return change
+
+
+def get_after_filter(cursor: tuple, id_field: str = "id") -> Q:
+    """Returns the filter for the rows whose `(change_seq, id)` comes after the cursor"""
+    change_seq, record_id = cursor
+    return Q(change_seq__gt=change_seq) | Q(change_seq=change_seq, **{f"{id_field}__gt": record_id})
+
+
+def fetch_changes(kind: str, cursor: tuple, limit: int, settled_change_seq: int, settled: bool) -> list:
+    """
+    Returns up to `limit` of the changes after the cursor that are settled (with a change sequence below
+        `settled_change_seq`) or unsettled, as `(change_seq, id, change)` tuples sorted by sequence and id, where
+        `change` is None for a deleted record
+    """
+    settled_filter = Q(change_seq__lt=settled_change_seq) if settled else Q(change_seq__gte=settled_change_seq)
+
+    rows = list(
+        CHANGE_FEED_QUERYSETS[kind]()
+        .filter(get_after_filter(cursor), settled_filter)
+        .order_by("change_seq", "id")[:limit]
+    )
+    if kind == "lane_reservation" and rows:
+        user_ids = {row["id"]: [] for row in rows}
+        for lane_reservation_id, user_id in (
+            LaneReservation.users.through.objects.filter(lanereservation_id__in=user_ids)
+            .order_by("user_id")
+            .values_list("lanereservation_id", "user_id")
+        ):
+            user_ids[lane_reservation_id].append(user_id)
+        for row in rows:
+            row["users"] = user_ids[row["id"]]
+
+    deletions = (
+        DeletedRecord.objects.filter(get_after_filter(cursor, "record_id"), settled_filter, kind=kind)
+        .order_by("change_seq", "record_id")
+        .values_list("change_seq", "record_id")[:limit]
+    )
+    changes = [(row["change_seq"], row["id"], serialize_change(kind, row)) for row in rows]
+    changes.extend((change_seq, record_id, None) for change_seq, record_id in deletions)
+    return sorted(changes, key=lambda change: change[:2])[:limit]
+
+
+def get_changes(kind: str, cursor: str = "", limit: int = CHANGE_FEED_PAGE_SIZE) -> dict:
+    """
+    Returns a page of the records of a kind (see `CHANGE_FEED_QUERYSETS`) created, changed, or deleted after the
+        cursor, with the cursor to request the next page from
+
+    Each row's change sequence is the id of the last transaction that changed it (see migration 0007). Transaction
+        ids are assigned before their transactions commit, so a running transaction may still commit changes with a
+        lower sequence than changes already visible. Pages therefore advance the cursor past settled changes only
+        (see `get_settled_change_seq()`). Once those run out, the last page also includes the unsettled changes,
+        without advancing the cursor past them, so they may be sent again but are never missed.
+
+    If the cursor is not properly formatted, raises a ValueError.
+    """
+    cursor = parse_change_cursor(cursor)
+    settled_change_seq = get_settled_change_seq()
+
+    changes = fetch_changes(kind, cursor, limit + 1, settled_change_seq, settled=True)
+    has_more = len(changes) > limit
+    if has_more:
+        changes = changes[:limit]
+        next_cursor = changes[-1][:2]
+    else:
+        changes += fetch_changes(kind, cursor, limit - len(changes), settled_change_seq, settled=False)
+        next_cursor = max(cursor, (settled_change_seq, 0))
+
+    return {
+        "type": kind,
+        "changes": [change for change_seq, record_id, change in changes if change is not None],
+        "deleted": [record_id for change_seq, record_id, change in changes if change is None],
+        "cursor": format_change_cursor(*next_cursor),
+        "has_more": has_more,
+    }
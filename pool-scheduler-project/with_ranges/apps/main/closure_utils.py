@@ -0,0 +1,211 @@
+import logging
+
+from apps.main.allocation_utils import (
+    LaneRequest,
+    allocate_locker,
+    reserve_lane_requests,
+)
+from apps.main.models import (
+    Closure,
+    Lane,
+    LaneReservation,
+    Locker,
+    LockerReservation,
+    Pool,
+)
+from apps.main.occupancy_utils import (
+    get_in_water_returning_sql,
+    remove_cancelled_swimmers,
+)
+from apps.users.models import User
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+logger = logging.getLogger("with_ranges.main")
+
+
+def cancel_closure_reservations(closure: Closure, reservation_model, resource_model) -> list:
+    """
+    Cancels every active Reservation of `reservation_model` (LaneReservation or LockerReservation) whose period
+        overlaps the Closure's dates, on any `resource_model` (Lane or Locker) of the Closure's Pool
+
+    The affected Reservations are found with a single range-overlap join between the Closure's dates and the
+        Reservation periods, and cancelled by the same UPDATE statement. Swimmers of cancelled Lane Reservations
+        that were in the water are taken off the occupancy counters (see `remove_cancelled_swimmers()`). Returns the
+        ids of the cancelled Reservations.
+    """
+    resource_column = reservation_model._meta.get_field(resource_model._meta.model_name).column
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {reservation_model._meta.db_table} reservation
+            SET cancelled = now()
+            FROM {Closure._meta.db_table} closure
+            JOIN {resource_model._meta.db_table} resource ON resource.pool_id = closure.pool_id
+            WHERE closure.id = %s
+                AND reservation.{resource_column} = resource.id
+                AND reservation.cancelled IS NULL
+                AND reservation.period && tstzrange(
+                    lower(closure.dates)::timestamptz, upper(closure.dates)::timestamptz, '[)'
+                )
+            RETURNING reservation.id, {get_in_water_returning_sql(reservation_model)}
+            """,
+            [closure.id],
+        )
+        rows = cursor.fetchall()
+        remove_cancelled_swimmers(row[1:] for row in rows)
+    return [row[0] for row in rows]
+
+
+def rebook_lane_reservations(lane_reservation_ids: list, rebook_pool: Pool) -> dict:
+    """
+    Re-accommodates cancelled LaneReservations (with the same period and users) in the Lanes of `rebook_pool`, by
+        packing them all at once with `reserve_lane_requests()`. Reservations that overlap a Closure of
+        `rebook_pool`, or that don't fit, are not rebooked.
+
+    Returns a dictionary mapping the id of each rebooked LaneReservation to the id of its replacement.
+    """
+    lane_reservation_users = LaneReservation.users.through.objects.filter(lanereservation_id__in=lane_reservation_ids)
+    user_ids = {}
+    for lane_reservation_id, user_id in lane_reservation_users.values_list("lanereservation_id", "user_id"):
+        user_ids.setdefault(lane_reservation_id, []).append(user_id)
+
+    cancelled_lane_reservations = LaneReservation.all_objects.filter(id__in=lane_reservation_ids).order_by("id")
+    cancelled_ids = []
+    lane_requests = []
+    for lane_reservation_id, period in cancelled_lane_reservations.values_list("id", "period"):
+        reservation_user_ids = tuple(user_ids.get(lane_reservation_id, ()))
+        cancelled_ids.append(lane_reservation_id)
+        lane_requests.append(LaneRequest(period, max(len(reservation_user_ids), 1), reservation_user_ids))
+
+    lane_reservations, unassigned = reserve_lane_requests(rebook_pool, lane_requests)
+    return {
+        cancelled_id: lane_reservation.id
+        for cancelled_id, lane_reservation in zip(cancelled_ids, lane_reservations)
+        if lane_reservation is not None
+    }
+
+
+def rebook_locker_reservations(locker_reservation_ids: list, rebook_pool: Pool) -> dict:
+    """
+    Re-accommodates cancelled LockerReservations (with the same period and user) in the best-fitting free Lockers
+        of `rebook_pool`, using `allocate_locker()`. Reservations that overlap a Closure of `rebook_pool`, or for
+        which no Locker is free or whose period is no longer valid, are not rebooked.
+
+    Returns a dictionary mapping the id of each rebooked LockerReservation to the id of its replacement.
+    """
+    rebooked = {}
+    cancelled_locker_reservations = LockerReservation.all_objects.filter(id__in=locker_reservation_ids).order_by(
+        "period__startswith"
+    )
+    for locker_reservation in cancelled_locker_reservations.select_related("user"):
+        try:
+            replacement = allocate_locker(rebook_pool, locker_reservation.user, locker_reservation.period)
+        except ValidationError as e:
+            logger.info(f"Could not rebook Locker Reservation {locker_reservation.id}: {e.messages}")
+            continue
+        if replacement is not None:
+            rebooked[locker_reservation.id] = replacement.id
+    return rebooked
+
+
+def apply_closure(closure: Closure, rebook_pool: Pool = None) -> dict:
+    """
+    Applies a Closure to the Reservations it affects, in one transaction:
+
+    1. Cancels all active Lane and Locker Reservations at the Closure's Pool that overlap its dates, with one
+        UPDATE statement each (see `cancel_closure_reservations()`).
+    2. If `rebook_pool` is given, re-accommodates the cancelled Reservations there.
+    3. Once the transaction commits, queues a Celery task to notify the affected users in batches.
+
+    Applying the same Closure again is harmless, as already-cancelled Reservations are skipped.
+
+    Returns a dictionary with the ids of the cancelled Lane and Locker Reservations, and the mappings of rebooked
+        Reservation ids to the ids of their replacements.
+    """
+    from apps.main.tasks import notify_closure_affected_users_task
+
+    results = {"rebooked_lane_reservations": {}, "rebooked_locker_reservations": {}}
+    with transaction.atomic():
+        results["cancelled_lane_reservations"] = cancel_closure_reservations(closure, LaneReservation, Lane)
+        results["cancelled_locker_reservations"] = cancel_closure_reservations(closure, LockerReservation, Locker)
+
+        if rebook_pool is not None and rebook_pool.id != closure.pool_id:
+            results["rebooked_lane_reservations"] = rebook_lane_reservations(
+                results["cancelled_lane_reservations"], rebook_pool
+            )
+            results["rebooked_locker_reservations"] = rebook_locker_reservations(
+                results["cancelled_locker_reservations"], rebook_pool
+            )
+
+        if results["cancelled_lane_reservations"] or results["cancelled_locker_reservations"]:
+            transaction.on_commit(
+                lambda: notify_closure_affected_users_task.delay(
+                    closure.id,
+                    results["cancelled_lane_reservations"],
+                    results["cancelled_locker_reservations"],
+                    list(results["rebooked_lane_reservations"]),
+                    list(results["rebooked_locker_reservations"]),
+                )
+            )
+
+    logger.info(
+        f"Applied {closure}: cancelled {len(results['cancelled_lane_reservations'])} Lane and "
+        f"{len(results['cancelled_locker_reservations'])} Locker Reservations, rebooked "
+        f"{len(results['rebooked_lane_reservations'])} and {len(results['rebooked_locker_reservations'])}"
+    )
+    return results
+
+
+def get_closure_notification_messages(
+    closure: Closure,
+    lane_reservation_ids: list,
+    locker_reservation_ids: list,
+    rebooked_lane_reservation_ids: list,
+    rebooked_locker_reservation_ids: list,
+) -> list:
+    """
+    Returns one email message tuple (for `send_mass_mail()`) per user affected by a Closure, counting the user's
+        cancelled and rebooked Reservations with a single query
+    """
+    rebooked_ids = {
+        "lane": set(rebooked_lane_reservation_ids),
+        "locker": set(rebooked_locker_reservation_ids),
+    }
+    # Each count is annotated separately, as Django replaces a count filtered by an empty list with 0, which would
+    #   zero a sum of counts when e.g. no Locker Reservations were rebooked
+    users = (
+        User.objects.filter(
+            Q(lane_reservations__in=lane_reservation_ids) | Q(locker_reservations__in=locker_reservation_ids)
+        )
+        .annotate(
+            cancelled_lane_count=Count(
+                "lane_reservations", filter=Q(lane_reservations__in=lane_reservation_ids), distinct=True
+            ),
+            cancelled_locker_count=Count(
+                "locker_reservations", filter=Q(locker_reservations__in=locker_reservation_ids), distinct=True
+            ),
+            rebooked_lane_count=Count(
+                "lane_reservations", filter=Q(lane_reservations__in=rebooked_ids["lane"]), distinct=True
+            ),
+            rebooked_locker_count=Count(
+                "locker_reservations", filter=Q(locker_reservations__in=rebooked_ids["locker"]), distinct=True
+            ),
+        )
+        .order_by("id")
+    )
+
+    messages = []
+    for user in users:
+        cancelled_count = user.cancelled_lane_count + user.cancelled_locker_count
+        rebooked_count = user.rebooked_lane_count + user.rebooked_locker_count
+        message = (
+            f"{closure.pool} is closed from {closure.dates.lower:%Y-%m-%d} until {closure.dates.upper:%Y-%m-%d} "
+            f"({closure.reason}), so {cancelled_count} of your reservations there have been cancelled."
+        )
+        if rebooked_count:
+            message += f" {rebooked_count} of them have been rebooked at another pool for the same times."
+        messages.append((f"Closure at {closure.pool}", message, settings.DEFAULT_FROM_EMAIL, [user.email]))
+    return messages
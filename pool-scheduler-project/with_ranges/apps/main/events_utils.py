@@ -0,0 +1,198 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+logger = logging.getLogger("with_ranges.main")
+
+
+# The channel that database triggers send reservation and closure change events on (see migration 0006)
+EVENTS_CHANNEL = "with_ranges_events"
+
+# How many undelivered events each subscriber may have queued before it is told to reload instead
+EVENT_QUEUE_SIZE = 1000
+
+# How often (in seconds) a comment is sent to idle event streams, so proxies and browsers keep them open
+EVENT_KEEPALIVE_INTERVAL = 15
+
+# How long (in seconds) browsers wait before reconnecting to a dropped event stream
+EVENT_RETRY_INTERVAL = 5
+
+# How long (in seconds) browsers should wait before reopening an event stream that was refused because the process
+#   already streams to `EVENT_STREAM_MAX_CONNECTIONS` subscribers (see calendar.html)
+EVENT_STREAM_REFUSED_RETRY_AFTER = 30
+
+# How long (in seconds) the listener waits before reconnecting to the database after an error
+EVENT_LISTENER_RECONNECT_INTERVAL = 5
+
+# The event sent to a subscriber whose queue overflowed, telling the client to reload its data
+RESET_EVENT = {"type": "reset", "action": "reload"}
+
+# The event filters a subscriber may use, and the event field each filter is compared with
+EVENT_FILTER_FIELDS = {"type": "type", "pool": "pool", "lane": "resource", "locker": "resource"}
+
+
+class EventSubscription:
+    """A subscriber's queue of events, with the filters an event must match to be queued (e.g.: `{"pool": 3}`)"""
+
+    def __init__(self, filters: dict):
+        self.filters = filters
+        self.queue = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+
+    def matches(self, event: dict) -> bool:
+        if "lane" in self.filters and event.get("type") != "lane_reservation":
+            return False
+        if "locker" in self.filters and event.get("type") != "locker_reservation":
+            return False
+        return all(event.get(EVENT_FILTER_FIELDS[name]) == value for name, value in self.filters.items())
+
+    def put(self, event: dict):
+        """Queues the event, or replaces the whole backlog of a subscriber that isn't keeping up with a reset"""
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait(RESET_EVENT)
+
+
+class EventBroker:
+    """
+    An in-memory, per-process broker that fans the events of one database channel out to every subscriber in the
+        process (e.g.: the wall-mounted schedule displays connected to this worker)
+
+    Each process opens a single listening database connection, on a daemon thread started by the first
+        subscription, so events committed by any process reach the subscribers of every process without any
+        additional service.
+
+    Each subscriber's stream holds one of the process's request threads for as long as it stays open, so at most
+        `max_subscriptions` (`EVENT_STREAM_MAX_CONNECTIONS` by default) may subscribe at once, and the other threads
+        are left to serve ordinary requests.
+    """
+
+    def __init__(self, channel: str = EVENTS_CHANNEL, max_subscriptions: int = None):
+        self.channel = channel
+        self.max_subscriptions = (
+            settings.EVENT_STREAM_MAX_CONNECTIONS if max_subscriptions is None else max_subscriptions
+        )
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+        self.listener = None
+
+    def subscribe(self, filters: dict = None):
+        """Returns a new subscription, or None if there are already `max_subscriptions` subscriptions"""
+        subscription = EventSubscription(filters or {})
+        with self.lock:
+            if len(self.subscriptions) >= self.max_subscriptions:
+                return None
+            self.subscriptions.add(subscription)
+            if self.listener is None:
+                self.listener = threading.Thread(target=self.listen, name="event-listener", daemon=True)
+                self.listener.start()
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event: dict):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                subscription.put(event)
+
+    def listen(self):
+        """Publishes the notifications received on the channel, reconnecting to the database after any error"""
+        while True:
+            database_connection = None
+            try:
+                database_connection = connections["default"].get_new_connection(
+                    connections["default"].get_connection_params()
+                )
+                database_connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with database_connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+
+                while True:
+                    if select.select([database_connection], [], [], EVENT_KEEPALIVE_INTERVAL) == ([], [], []):
+                        continue
+                    database_connection.poll()
+                    while database_connection.notifies:
+                        notification = database_connection.notifies.pop(0)
+                        try:
+                            self.publish(json.loads(notification.payload))
+                        except ValueError:
+                            logger.warning(f"Ignoring malformed event: {notification.payload}")
+            except Exception as e:
+                logger.warning(f"Event listener lost its database connection: {e}")
+                # Events may have been missed, so clients should reload
+                self.publish(RESET_EVENT)
+                time.sleep(EVENT_LISTENER_RECONNECT_INTERVAL)
+            finally:
+                if database_connection is not None:
+                    database_connection.close()
+
+
+_event_broker = None
+_event_broker_lock = threading.Lock()
+
+
+def get_event_broker() -> EventBroker:
+    """Returns this process's event broker"""
+    global _event_broker
+    with _event_broker_lock:
+        if _event_broker is None:
+            _event_broker = EventBroker()
+        return _event_broker
+
+
+def get_event_filters(query_dict) -> dict:
+    """
+    Converts the `type`, `pool`, `lane`, and `locker` query parameters of an event stream request into filters
+
+    If an id is not an integer, raises a ValueError.
+    """
+    filters = {}
+    for name in EVENT_FILTER_FIELDS:
+        value = query_dict.get(name)
+        if value:
+            filters[name] = value if name == "type" else int(value)
+    return filters
+
+
+def format_server_sent_event(event: dict) -> str:
+    """Formats an event as a Server-Sent Event, named by its type"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+class EventStream:
+    """
+    The Server-Sent Events of a subscription, with a keepalive comment whenever the stream is idle
+
+    The subscription is cancelled once the response is closed (e.g.: when the client disconnects), even if the
+        stream was never iterated, so it can't keep holding one of the broker's subscriptions.
+    """
+
+    def __init__(self, broker: EventBroker, subscription: EventSubscription):
+        self.broker = broker
+        self.subscription = subscription
+
+    def __iter__(self):
+        yield f"retry: {EVENT_RETRY_INTERVAL * 1000}\n\n"
+        while True:
+            try:
+                event = self.subscription.queue.get(timeout=EVENT_KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield format_server_sent_event(event)
+
+    def close(self):
+        self.broker.unsubscribe(self.subscription)
@@ -0,0 +1,36 @@
+from django.db import models
+from django.db.models import lookups
+from django.utils.translation import gettext_lazy as _
+
+
+class DateTimeMultiRangeField(models.Field):
+    """
+    A Postgres 14+ `tstzmultirange` column: a set of disjoint datetime ranges
+
+    Django has no multirange support, so values are read back as Postgres' text representation (e.g.:
+        `{["2022-10-01 09:00:00+00","2022-10-01 10:00:00+00")}`). The field is meant to be queried with its lookups
+        (e.g.: `busy__overlap=period` or `busy__contains=period`), which accept DateTimeTZRange values.
+    """
+
+    description = _("Multirange of datetimes with time zones")
+
+    def db_type(self, connection):
+        return "tstzmultirange"
+
+
+@DateTimeMultiRangeField.register_lookup
+class MultiRangeOverlap(lookups.PostgresOperatorLookup):
+    lookup_name = "overlap"
+    postgres_operator = "&&"
+
+    def get_db_prep_lookup(self, value, connection):
+        return ("%s::tstzrange", [value])
+
+
+@DateTimeMultiRangeField.register_lookup
+class MultiRangeContains(lookups.PostgresOperatorLookup):
+    lookup_name = "contains"
+    postgres_operator = "@>"
+
+    def get_db_prep_lookup(self, value, connection):
+        return ("%s::tstzrange", [value])
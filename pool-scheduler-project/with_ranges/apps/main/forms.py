@@ -158,3 +158,19 @@ class DateForm(forms.Form):
             raise ValidationError(e)
 
         return data
+
+
+class LockerAllocationForm(forms.Form):
+
+    pool = forms.ModelChoiceField(queryset=Pool.objects.all())
+    period = DateTimeRangeField(
+        label="Reservation Period",
+    )
+
+
+class LaneSlotClaimForm(forms.Form):
+
+    pool = forms.ModelChoiceField(queryset=Pool.objects.all())
+    period = DateTimeRangeField(
+        label="Reservation Period",
+    )
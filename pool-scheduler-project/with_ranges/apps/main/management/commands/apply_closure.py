@@ -0,0 +1,30 @@
+from apps.main.closure_utils import apply_closure
+from apps.main.models import Closure, Pool
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Cancels the Reservations overlapping a Closure, optionally rebooking them at another Pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("closure_id", type=int)
+        parser.add_argument(
+            "--rebook-pool",
+            type=int,
+            dest="rebook_pool_id",
+            help="The id of a Pool where the cancelled Reservations should be rebooked",
+        )
+
+    def handle(self, *args, **kwargs):
+        try:
+            closure = Closure.objects.select_related("pool").get(id=kwargs["closure_id"])
+            rebook_pool = Pool.objects.get(id=kwargs["rebook_pool_id"]) if kwargs["rebook_pool_id"] else None
+        except (Closure.DoesNotExist, Pool.DoesNotExist) as e:
+            raise CommandError(e)
+
+        self.stdout.write(f"**** Applying Closure: {closure} ****")
+        results = apply_closure(closure, rebook_pool)
+        self.stdout.write(f"Cancelled Lane Reservations: {len(results['cancelled_lane_reservations'])}")
+        self.stdout.write(f"Cancelled Locker Reservations: {len(results['cancelled_locker_reservations'])}")
+        self.stdout.write(f"Rebooked Lane Reservations: {len(results['rebooked_lane_reservations'])}")
+        self.stdout.write(f"Rebooked Locker Reservations: {len(results['rebooked_locker_reservations'])}")
@@ -0,0 +1,34 @@
+import time
+
+from apps.main.shared_snapshot_utils import (
+    build_shared_snapshot,
+    get_shared_snapshot_path,
+)
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Builds the shared Reservation snapshot file, once or repeatedly as a refresher process"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            help="Keep rebuilding the snapshot every this many seconds, instead of building it once",
+        )
+
+    def handle(self, *args, **kwargs):
+        interval = kwargs["interval"]
+        if interval is not None and interval < 1:
+            raise CommandError("Interval must be at least 1 second")
+
+        self.stdout.write(f"**** Building the shared Reservation snapshot at {get_shared_snapshot_path()} ****")
+        while True:
+            counts = build_shared_snapshot()
+            self.stdout.write(
+                f"Built {counts['lane_starts']} Lane and {counts['locker_starts']} Locker Reservations, "
+                f"{counts['closure_starts']} closure periods"
+            )
+            if interval is None:
+                return
+            time.sleep(interval)
@@ -0,0 +1,33 @@
+from apps.main.models import Pool
+from apps.main.slot_utils import LANE_SLOT_DAYS_AHEAD, generate_lane_slots
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Generates the 30-minute Lane Slots of each Pool's business hours from today through the coming days"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=LANE_SLOT_DAYS_AHEAD,
+            help=f"How many days ahead of today to generate slots for (default: {LANE_SLOT_DAYS_AHEAD})",
+        )
+        parser.add_argument("--pool", type=int, dest="pool_id", help="Only generate slots for the Pool with this id")
+
+    def handle(self, *args, **kwargs):
+        if kwargs["days"] < 0:
+            raise CommandError("Days must not be negative")
+        pools = Pool.objects.all()
+        if kwargs["pool_id"]:
+            pools = pools.filter(id=kwargs["pool_id"])
+            if not pools.exists():
+                raise CommandError(f"Pool {kwargs['pool_id']} does not exist")
+
+        first_date = timezone.now().date()
+        last_date = first_date + timezone.timedelta(days=kwargs["days"])
+        self.stdout.write(f"**** Generating Lane Slots from {first_date} through {last_date} ****")
+        for pool in pools:
+            results = generate_lane_slots(pool, first_date, last_date)
+            self.stdout.write(f"{pool}: created {results['created']}, deleted {results['deleted']}")
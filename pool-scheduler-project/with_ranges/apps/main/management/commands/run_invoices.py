@@ -0,0 +1,29 @@
+from apps.main.billing_utils import get_billing_month, run_invoices
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Creates or updates the Invoices for all users for one month of Lane and Locker Reservations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "month",
+            nargs="?",
+            help="The month to bill, in the format YYYY-MM (default: the previous month)",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Bill every Reservation of the month, not only those changed since its previous run",
+        )
+
+    def handle(self, *args, **kwargs):
+        try:
+            month = get_billing_month(kwargs["month"])
+        except ValueError:
+            raise CommandError(f"Month must be in the format YYYY-MM, not '{kwargs['month']}'")
+
+        self.stdout.write(f"**** Running Invoices for {month:%Y-%m} ****")
+        results = run_invoices(month, full=kwargs["full"])
+        for step, count in results.items():
+            self.stdout.write(f"{step.replace('_', ' ').capitalize()}: {count}")
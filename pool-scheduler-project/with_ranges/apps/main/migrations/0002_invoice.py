@@ -0,0 +1,180 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:39
+
+import auto_prefetch
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("main", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Invoice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "month",
+                    models.DateField(
+                        help_text="The first day of the month being billed",
+                        verbose_name="Billing Month",
+                    ),
+                ),
+                (
+                    "total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name="Total"),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created"),
+                ),
+                (
+                    "updated",
+                    models.DateTimeField(auto_now=True, verbose_name="Updated"),
+                ),
+                (
+                    "user",
+                    auto_prefetch.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="invoices",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Invoice",
+                "verbose_name_plural": "Invoices",
+                "ordering": ["-month", "user"],
+            },
+            managers=[
+                ("objects", django.db.models.manager.Manager()),
+                ("prefetch_manager", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="InvoiceLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "hours",
+                    models.DecimalField(decimal_places=2, max_digits=8, verbose_name="Billed Hours"),
+                ),
+                (
+                    "per_hour_cost",
+                    models.DecimalField(decimal_places=2, max_digits=5, verbose_name="Per-Hour Cost"),
+                ),
+                (
+                    "share_count",
+                    models.PositiveSmallIntegerField(
+                        default=1,
+                        help_text="The number of users splitting the cost of the Reservation",
+                        verbose_name="Share Count",
+                    ),
+                ),
+                (
+                    "amount",
+                    models.DecimalField(decimal_places=2, max_digits=10, verbose_name="Amount"),
+                ),
+                (
+                    "updated",
+                    models.DateTimeField(auto_now=True, verbose_name="Updated"),
+                ),
+                (
+                    "invoice",
+                    auto_prefetch.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="main.invoice",
+                    ),
+                ),
+                (
+                    "lane_reservation",
+                    auto_prefetch.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="invoice_lines",
+                        to="main.lanereservation",
+                    ),
+                ),
+                (
+                    "locker_reservation",
+                    auto_prefetch.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="invoice_lines",
+                        to="main.lockerreservation",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Invoice Line",
+                "verbose_name_plural": "Invoice Lines",
+                "ordering": ["invoice", "id"],
+            },
+            managers=[
+                ("objects", django.db.models.manager.Manager()),
+                ("prefetch_manager", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="invoiceline",
+            constraint=models.CheckConstraint(
+                check=models.Q(
+                    models.Q(
+                        ("lane_reservation__isnull", False),
+                        ("locker_reservation__isnull", True),
+                    ),
+                    models.Q(
+                        ("lane_reservation__isnull", True),
+                        ("locker_reservation__isnull", False),
+                    ),
+                    _connector="OR",
+                ),
+                name="invoice_line_single_reservation",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="invoiceline",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("lane_reservation__isnull", False)),
+                fields=("invoice", "lane_reservation"),
+                name="unique_invoice_lane_reservation",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="invoiceline",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("locker_reservation__isnull", False)),
+                fields=("invoice", "locker_reservation"),
+                name="unique_invoice_locker_reservation",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="invoice",
+            constraint=models.UniqueConstraint(fields=("user", "month"), name="unique_user_month_invoice"),
+        ),
+    ]
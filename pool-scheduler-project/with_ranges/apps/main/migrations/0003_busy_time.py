@@ -0,0 +1,158 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:46
+
+import apps.main.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def get_busy_time_trigger_sql(reservation_table, resource_column, busy_time_table):
+    """
+    Returns the SQL creating the statement-level triggers that keep a busy time table in step with its Reservation
+        table, and backfilling the busy time from the existing Reservations
+
+    Active Reservations of the same Lane or Locker never overlap (see the exclusion constraints), so the busy time
+        can be maintained incrementally: the periods of Reservations that stop being active are subtracted from the
+        multirange, and the periods of Reservations that become active are added to it. Updates that don't change
+        the period, resource, or cancellation of a Reservation (e.g.: checking in) leave the busy time untouched.
+    """
+    function = f"{reservation_table}_busy_time"
+    return f"""
+        CREATE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                UPDATE {busy_time_table} busy_time
+                SET busy = busy_time.busy - removed.busy
+                FROM (
+                    SELECT {resource_column}, range_agg(period) AS busy
+                    FROM old_rows
+                    WHERE cancelled IS NULL
+                    GROUP BY {resource_column}
+                ) removed
+                WHERE busy_time.{resource_column} = removed.{resource_column};
+
+            ELSIF TG_OP = 'UPDATE' THEN
+                UPDATE {busy_time_table} busy_time
+                SET busy = busy_time.busy - removed.busy
+                FROM (
+                    SELECT old_row.{resource_column}, range_agg(old_row.period) AS busy
+                    FROM old_rows old_row
+                    JOIN new_rows new_row ON new_row.id = old_row.id
+                    WHERE old_row.cancelled IS NULL
+                        AND (old_row.period, old_row.{resource_column}, new_row.cancelled IS NULL)
+                            IS DISTINCT FROM (new_row.period, new_row.{resource_column}, true)
+                    GROUP BY old_row.{resource_column}
+                ) removed
+                WHERE busy_time.{resource_column} = removed.{resource_column};
+
+                INSERT INTO {busy_time_table} ({resource_column}, busy)
+                SELECT new_row.{resource_column}, range_agg(new_row.period)
+                FROM new_rows new_row
+                JOIN old_rows old_row ON old_row.id = new_row.id
+                WHERE new_row.cancelled IS NULL
+                    AND (new_row.period, new_row.{resource_column}, old_row.cancelled IS NULL)
+                        IS DISTINCT FROM (old_row.period, old_row.{resource_column}, true)
+                GROUP BY new_row.{resource_column}
+                ON CONFLICT ({resource_column}) DO UPDATE SET busy = {busy_time_table}.busy + EXCLUDED.busy;
+
+            ELSE
+                INSERT INTO {busy_time_table} ({resource_column}, busy)
+                SELECT {resource_column}, range_agg(period)
+                FROM new_rows
+                WHERE cancelled IS NULL
+                GROUP BY {resource_column}
+                ON CONFLICT ({resource_column}) DO UPDATE SET busy = {busy_time_table}.busy + EXCLUDED.busy;
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+
+        CREATE TRIGGER {function}_insert AFTER INSERT ON {reservation_table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+        CREATE TRIGGER {function}_update AFTER UPDATE ON {reservation_table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+        CREATE TRIGGER {function}_delete AFTER DELETE ON {reservation_table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+
+        INSERT INTO {busy_time_table} ({resource_column}, busy)
+        SELECT {resource_column}, range_agg(period)
+        FROM {reservation_table}
+        WHERE cancelled IS NULL
+        GROUP BY {resource_column};
+    """
+
+
+def get_busy_time_trigger_reverse_sql(reservation_table):
+    function = f"{reservation_table}_busy_time"
+    return f"""
+        DROP TRIGGER {function}_insert ON {reservation_table};
+        DROP TRIGGER {function}_update ON {reservation_table};
+        DROP TRIGGER {function}_delete ON {reservation_table};
+        DROP FUNCTION {function}();
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0002_invoice"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LaneBusyTime",
+            fields=[
+                (
+                    "lane",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="busy_time",
+                        serialize=False,
+                        to="main.lane",
+                    ),
+                ),
+                (
+                    "busy",
+                    apps.main.fields.DateTimeMultiRangeField(default="{}", verbose_name="Busy Time"),
+                ),
+            ],
+            options={
+                "verbose_name": "Lane Busy Time",
+                "verbose_name_plural": "Lane Busy Times",
+            },
+        ),
+        migrations.CreateModel(
+            name="LockerBusyTime",
+            fields=[
+                (
+                    "locker",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="busy_time",
+                        serialize=False,
+                        to="main.locker",
+                    ),
+                ),
+                (
+                    "busy",
+                    apps.main.fields.DateTimeMultiRangeField(default="{}", verbose_name="Busy Time"),
+                ),
+            ],
+            options={
+                "verbose_name": "Locker Busy Time",
+                "verbose_name_plural": "Locker Busy Times",
+            },
+        ),
+        migrations.RunSQL(
+            sql=get_busy_time_trigger_sql("main_lanereservation", "lane_id", "main_lanebusytime"),
+            reverse_sql=get_busy_time_trigger_reverse_sql("main_lanereservation"),
+        ),
+        migrations.RunSQL(
+            sql=get_busy_time_trigger_sql("main_lockerreservation", "locker_id", "main_lockerbusytime"),
+            reverse_sql=get_busy_time_trigger_reverse_sql("main_lockerreservation"),
+        ),
+    ]
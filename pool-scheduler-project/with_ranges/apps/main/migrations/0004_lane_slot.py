@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:49
+
+import auto_prefetch
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0003_busy_time"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LaneSlot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start", models.DateTimeField(verbose_name="Slot Start")),
+                (
+                    "lane",
+                    auto_prefetch.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="slots",
+                        to="main.lane",
+                    ),
+                ),
+                (
+                    "lane_reservation",
+                    auto_prefetch.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="slots",
+                        to="main.lanereservation",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Lane Slot",
+                "verbose_name_plural": "Lane Slots",
+                "ordering": ["lane", "start"],
+            },
+            managers=[
+                ("objects", django.db.models.manager.Manager()),
+                ("prefetch_manager", django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="laneslot",
+            constraint=models.UniqueConstraint(fields=("lane", "start"), name="unique_lane_slot"),
+        ),
+    ]
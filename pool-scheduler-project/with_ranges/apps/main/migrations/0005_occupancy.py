@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Counts the swimmers already in the water (see `recompute_occupancy()`)
+BACKFILL_OCCUPANCY_SQL = """
+    INSERT INTO main_laneoccupancy (lane_id, swimmers, updated)
+    SELECT lane.id, coalesce(sum(in_water.swimmers), 0), now()
+    FROM main_lane lane
+    LEFT JOIN (
+        SELECT reservation.lane_id, greatest(count(reservation_user.id), 1) AS swimmers
+        FROM main_lanereservation reservation
+        LEFT JOIN main_lanereservation_users reservation_user ON reservation_user.lanereservation_id = reservation.id
+        WHERE reservation.cancelled IS NULL
+            AND lower(reservation.actual) IS NOT NULL
+            AND upper(reservation.actual) IS NULL
+        GROUP BY reservation.id
+    ) in_water ON in_water.lane_id = lane.id
+    GROUP BY lane.id;
+
+    INSERT INTO main_pooloccupancy (pool_id, swimmers, updated)
+    SELECT pool.id, coalesce(sum(lane_occupancy.swimmers), 0), now()
+    FROM main_pool pool
+    LEFT JOIN main_lane lane ON lane.pool_id = pool.id
+    LEFT JOIN main_laneoccupancy lane_occupancy ON lane_occupancy.lane_id = lane.id
+    GROUP BY pool.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0004_lane_slot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LaneOccupancy",
+            fields=[
+                (
+                    "lane",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="occupancy",
+                        serialize=False,
+                        to="main.lane",
+                    ),
+                ),
+                (
+                    "swimmers",
+                    models.PositiveIntegerField(default=0, verbose_name="Swimmers in the Water"),
+                ),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Lane Occupancy",
+                "verbose_name_plural": "Lane Occupancies",
+            },
+        ),
+        migrations.CreateModel(
+            name="PoolOccupancy",
+            fields=[
+                (
+                    "pool",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="occupancy",
+                        serialize=False,
+                        to="main.pool",
+                    ),
+                ),
+                (
+                    "swimmers",
+                    models.PositiveIntegerField(default=0, verbose_name="Swimmers in the Water"),
+                ),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Pool Occupancy",
+                "verbose_name_plural": "Pool Occupancies",
+            },
+        ),
+        migrations.RunSQL(BACKFILL_OCCUPANCY_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,127 @@
+from django.db import migrations
+
+# The channel that reservation and closure change events are sent on (see `events_utils.py`)
+EVENTS_CHANNEL = "with_ranges_events"
+
+
+def get_reservation_notify_trigger_sql(reservation_table, resource_column, resource_table, event_type):
+    """
+    Returns the SQL creating the row-level trigger that sends an event with `pg_notify()` whenever a Reservation is
+        created, updated (e.g.: cancelled, checked in or out), or deleted
+
+    Notifications are only delivered once the transaction commits (and never if it rolls back), so events always
+        describe committed changes, including those made by bulk or raw SQL statements.
+    """
+    function = f"{reservation_table}_notify"
+    return f"""
+        CREATE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            reservation {reservation_table};
+            action text;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                reservation := OLD;
+                action := 'deleted';
+            ELSE
+                reservation := NEW;
+                IF TG_OP = 'INSERT' THEN
+                    action := 'created';
+                ELSIF NEW.cancelled IS NOT NULL AND OLD.cancelled IS NULL THEN
+                    action := 'cancelled';
+                ELSIF upper(NEW.actual) IS NOT NULL AND upper(OLD.actual) IS NULL THEN
+                    action := 'checked_out';
+                ELSIF lower(NEW.actual) IS DISTINCT FROM lower(OLD.actual) AND lower(NEW.actual) IS NOT NULL THEN
+                    action := 'checked_in';
+                ELSE
+                    action := 'updated';
+                END IF;
+            END IF;
+
+            PERFORM pg_notify('{EVENTS_CHANNEL}', json_build_object(
+                'type', '{event_type}',
+                'action', action,
+                'id', reservation.id,
+                'pool', (SELECT resource.pool_id FROM {resource_table} resource
+                    WHERE resource.id = reservation.{resource_column}),
+                'resource', reservation.{resource_column},
+                'start', extract(epoch FROM lower(reservation.period))::bigint,
+                'end', extract(epoch FROM upper(reservation.period))::bigint,
+                'active', TG_OP <> 'DELETE' AND reservation.cancelled IS NULL,
+                'in_water', TG_OP <> 'DELETE' AND reservation.cancelled IS NULL
+                    AND lower(reservation.actual) IS NOT NULL AND upper(reservation.actual) IS NULL
+            )::text);
+            RETURN NULL;
+        END;
+        $$;
+
+        CREATE TRIGGER {function} AFTER INSERT OR UPDATE OR DELETE ON {reservation_table}
+            FOR EACH ROW EXECUTE FUNCTION {function}();
+    """
+
+
+def get_notify_trigger_reverse_sql(table):
+    return f"""
+        DROP TRIGGER {table}_notify ON {table};
+        DROP FUNCTION {table}_notify();
+    """
+
+
+CLOSURE_NOTIFY_TRIGGER_SQL = f"""
+    CREATE FUNCTION main_closure_notify() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        closure main_closure;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            closure := OLD;
+        ELSE
+            closure := NEW;
+        END IF;
+
+        PERFORM pg_notify('{EVENTS_CHANNEL}', json_build_object(
+            'type', 'closure',
+            'action', CASE TG_OP WHEN 'INSERT' THEN 'created' WHEN 'UPDATE' THEN 'updated' ELSE 'deleted' END,
+            'id', closure.id,
+            'pool', closure.pool_id,
+            'start', lower(closure.dates),
+            'end', upper(closure.dates),
+            'active', TG_OP <> 'DELETE'
+        )::text);
+        IF TG_OP = 'UPDATE' AND OLD.pool_id <> NEW.pool_id THEN
+            PERFORM pg_notify('{EVENTS_CHANNEL}', json_build_object(
+                'type', 'closure',
+                'action', 'deleted',
+                'id', OLD.id,
+                'pool', OLD.pool_id,
+                'start', lower(OLD.dates),
+                'end', upper(OLD.dates),
+                'active', false
+            )::text);
+        END IF;
+        RETURN NULL;
+    END;
+    $$;
+
+    CREATE TRIGGER main_closure_notify AFTER INSERT OR UPDATE OR DELETE ON main_closure
+        FOR EACH ROW EXECUTE FUNCTION main_closure_notify();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0005_occupancy"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            get_reservation_notify_trigger_sql("main_lanereservation", "lane_id", "main_lane", "lane_reservation"),
+            get_notify_trigger_reverse_sql("main_lanereservation"),
+        ),
+        migrations.RunSQL(
+            get_reservation_notify_trigger_sql(
+                "main_lockerreservation", "locker_id", "main_locker", "locker_reservation"
+            ),
+            get_notify_trigger_reverse_sql("main_lockerreservation"),
+        ),
+        migrations.RunSQL(CLOSURE_NOTIFY_TRIGGER_SQL, get_notify_trigger_reverse_sql("main_closure")),
+    ]
@@ -0,0 +1,149 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:01
+
+from django.db import migrations, models
+
+# Rows written before this migration keep a change sequence of 0, so a client without a cursor still receives them
+CHANGE_SEQ_FUNCTIONS_SQL = """
+    CREATE FUNCTION main_set_change_seq() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.change_seq := pg_current_xact_id()::text::bigint;
+        RETURN NEW;
+    END;
+    $$;
+
+    CREATE FUNCTION main_record_deletion() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO main_deletedrecord (kind, record_id, change_seq, deleted)
+        VALUES (TG_ARGV[0], OLD.id, pg_current_xact_id()::text::bigint, now());
+        RETURN NULL;
+    END;
+    $$;
+
+    -- Adding or removing a Lane Reservation's users changes the Reservation, though not its row
+    CREATE FUNCTION main_lanereservation_users_change_seq() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        reservation_id bigint;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            reservation_id := OLD.lanereservation_id;
+        ELSE
+            reservation_id := NEW.lanereservation_id;
+        END IF;
+        UPDATE main_lanereservation SET change_seq = pg_current_xact_id()::text::bigint
+        WHERE id = reservation_id AND change_seq <> pg_current_xact_id()::text::bigint;
+        RETURN NULL;
+    END;
+    $$;
+
+    CREATE TRIGGER main_lanereservation_users_change_seq AFTER INSERT OR DELETE ON main_lanereservation_users
+        FOR EACH ROW EXECUTE FUNCTION main_lanereservation_users_change_seq();
+"""
+
+CHANGE_SEQ_FUNCTIONS_REVERSE_SQL = """
+    DROP TRIGGER main_lanereservation_users_change_seq ON main_lanereservation_users;
+    DROP FUNCTION main_lanereservation_users_change_seq();
+    DROP FUNCTION main_record_deletion();
+    DROP FUNCTION main_set_change_seq();
+"""
+
+
+def get_change_seq_triggers_sql(table, kind):
+    """
+    Returns the SQL creating the triggers that stamp each inserted or updated row with the id of the transaction
+        changing it, and record each deleted row as a DeletedRecord
+    """
+    return f"""
+        CREATE TRIGGER {table}_change_seq BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION main_set_change_seq();
+        CREATE TRIGGER {table}_record_deletion AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION main_record_deletion('{kind}');
+    """
+
+
+def get_change_seq_triggers_reverse_sql(table):
+    return f"""
+        DROP TRIGGER {table}_record_deletion ON {table};
+        DROP TRIGGER {table}_change_seq ON {table};
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0006_event_notify"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeletedRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=20, verbose_name="Kind")),
+                ("record_id", models.BigIntegerField(verbose_name="Record ID")),
+                ("change_seq", models.BigIntegerField(verbose_name="Change Sequence")),
+                (
+                    "deleted",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Deleted"),
+                ),
+            ],
+            options={
+                "verbose_name": "Deleted Record",
+                "verbose_name_plural": "Deleted Records",
+            },
+        ),
+        migrations.AddField(
+            model_name="closure",
+            name="change_seq",
+            field=models.BigIntegerField(default=0, editable=False, verbose_name="Change Sequence"),
+        ),
+        migrations.AddField(
+            model_name="lanereservation",
+            name="change_seq",
+            field=models.BigIntegerField(default=0, editable=False, verbose_name="Change Sequence"),
+        ),
+        migrations.AddField(
+            model_name="lockerreservation",
+            name="change_seq",
+            field=models.BigIntegerField(default=0, editable=False, verbose_name="Change Sequence"),
+        ),
+        migrations.AddIndex(
+            model_name="closure",
+            index=models.Index(fields=["change_seq", "id"], name="closure_change_seq_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lanereservation",
+            index=models.Index(fields=["change_seq", "id"], name="lane_res_change_seq_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lockerreservation",
+            index=models.Index(fields=["change_seq", "id"], name="locker_res_change_seq_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="deletedrecord",
+            index=models.Index(
+                fields=["kind", "change_seq", "record_id"],
+                name="deleted_record_change_seq_idx",
+            ),
+        ),
+        migrations.RunSQL(CHANGE_SEQ_FUNCTIONS_SQL, CHANGE_SEQ_FUNCTIONS_REVERSE_SQL),
+        migrations.RunSQL(
+            get_change_seq_triggers_sql("main_lanereservation", "lane_reservation"),
+            get_change_seq_triggers_reverse_sql("main_lanereservation"),
+        ),
+        migrations.RunSQL(
+            get_change_seq_triggers_sql("main_lockerreservation", "locker_reservation"),
+            get_change_seq_triggers_reverse_sql("main_lockerreservation"),
+        ),
+        migrations.RunSQL(
+            get_change_seq_triggers_sql("main_closure", "closure"),
+            get_change_seq_triggers_reverse_sql("main_closure"),
+        ),
+    ]
@@ -0,0 +1,162 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:04
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def get_reservation_outbox_trigger_sql(reservation_table, resource_column, resource_table, kind):
+    """
+    Returns the SQL creating the row-level trigger that writes an OutboxEvent whenever a Reservation is booked,
+        rescheduled, cancelled, checked in, or checked out, in the same transaction as the change
+    """
+    function = f"{reservation_table}_outbox"
+    return f"""
+        CREATE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            action text;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                action := 'created';
+            ELSIF NEW.cancelled IS NOT NULL AND OLD.cancelled IS NULL THEN
+                action := 'cancelled';
+            ELSIF upper(NEW.actual) IS NOT NULL AND upper(OLD.actual) IS NULL THEN
+                action := 'checked_out';
+            ELSIF lower(NEW.actual) IS DISTINCT FROM lower(OLD.actual) AND lower(NEW.actual) IS NOT NULL THEN
+                action := 'checked_in';
+            ELSIF NEW.period IS DISTINCT FROM OLD.period OR NEW.{resource_column} IS DISTINCT FROM OLD.{resource_column}
+            THEN
+                action := 'rescheduled';
+            ELSE
+                RETURN NULL;
+            END IF;
+
+            INSERT INTO main_outboxevent (topic, payload, created, available, attempts, handled, last_error)
+            VALUES (
+                '{kind}.' || action,
+                jsonb_build_object(
+                    'id', NEW.id,
+                    'pool', (SELECT resource.pool_id FROM {resource_table} resource
+                        WHERE resource.id = NEW.{resource_column}),
+                    'resource', NEW.{resource_column},
+                    'start', lower(NEW.period),
+                    'end', upper(NEW.period),
+                    'previous_start', CASE WHEN TG_OP = 'UPDATE' AND NEW.period IS DISTINCT FROM OLD.period
+                        THEN lower(OLD.period) END,
+                    'previous_end', CASE WHEN TG_OP = 'UPDATE' AND NEW.period IS DISTINCT FROM OLD.period
+                        THEN upper(OLD.period) END
+                ),
+                now(),
+                now(),
+                0,
+                '[]',
+                ''
+            );
+            RETURN NULL;
+        END;
+        $$;
+
+        CREATE TRIGGER {function} AFTER INSERT OR UPDATE ON {reservation_table}
+            FOR EACH ROW EXECUTE FUNCTION {function}();
+    """
+
+
+def get_outbox_trigger_reverse_sql(table):
+    return f"""
+        DROP TRIGGER {table}_outbox ON {table};
+        DROP FUNCTION {table}_outbox();
+    """
+
+
+CLOSURE_OUTBOX_TRIGGER_SQL = """
+    CREATE FUNCTION main_closure_outbox() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO main_outboxevent (topic, payload, created, available, attempts, handled, last_error)
+        VALUES (
+            'closure.created',
+            jsonb_build_object('id', NEW.id, 'pool', NEW.pool_id, 'start', lower(NEW.dates), 'end', upper(NEW.dates)),
+            now(),
+            now(),
+            0,
+            '[]',
+            ''
+        );
+        RETURN NULL;
+    END;
+    $$;
+
+    CREATE TRIGGER main_closure_outbox AFTER INSERT ON main_closure
+        FOR EACH ROW EXECUTE FUNCTION main_closure_outbox();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0007_change_feed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("topic", models.CharField(max_length=50, verbose_name="Topic")),
+                ("payload", models.JSONField(default=dict, verbose_name="Payload")),
+                (
+                    "created",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created"),
+                ),
+                (
+                    "available",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="When to next attempt it",
+                        verbose_name="Available",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(default=0, verbose_name="Failed Attempts"),
+                ),
+                (
+                    "handled",
+                    models.JSONField(blank=True, default=list, verbose_name="Completed Handlers"),
+                ),
+                ("last_error", models.TextField(blank=True, verbose_name="Last Error")),
+                (
+                    "processed",
+                    models.DateTimeField(blank=True, null=True, verbose_name="Processed"),
+                ),
+            ],
+            options={
+                "verbose_name": "Outbox Event",
+                "verbose_name_plural": "Outbox Events",
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("processed", None)),
+                        fields=["available", "id"],
+                        name="outbox_event_pending_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(
+            get_reservation_outbox_trigger_sql("main_lanereservation", "lane_id", "main_lane", "lane_reservation"),
+            get_outbox_trigger_reverse_sql("main_lanereservation"),
+        ),
+        migrations.RunSQL(
+            get_reservation_outbox_trigger_sql(
+                "main_lockerreservation", "locker_id", "main_locker", "locker_reservation"
+            ),
+            get_outbox_trigger_reverse_sql("main_lockerreservation"),
+        ),
+        migrations.RunSQL(CLOSURE_OUTBOX_TRIGGER_SQL, get_outbox_trigger_reverse_sql("main_closure")),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:06
+
+import django.contrib.postgres.constraints
+from django.db import migrations, models
+import django.db.models.constraints
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0008_outbox"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="lanereservation",
+            name="excl_overlap_lane_res",
+        ),
+        migrations.RemoveConstraint(
+            model_name="lockerreservation",
+            name="excl_overlap_locker_res",
+        ),
+        migrations.RemoveConstraint(
+            model_name="lockerreservation",
+            name="excl_overlap_user_locker_res",
+        ),
+        migrations.AddConstraint(
+            model_name="lanereservation",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("cancelled", None)),
+                deferrable=django.db.models.constraints.Deferrable["IMMEDIATE"],
+                expressions=[("period", "&&"), ("lane", "=")],
+                name="excl_overlap_lane_res",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="lockerreservation",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("cancelled", None)),
+                deferrable=django.db.models.constraints.Deferrable["IMMEDIATE"],
+                expressions=[("period", "&&"), ("locker", "=")],
+                name="excl_overlap_locker_res",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="lockerreservation",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(("cancelled", None)),
+                deferrable=django.db.models.constraints.Deferrable["IMMEDIATE"],
+                expressions=[("period", "&&"), ("user", "=")],
+                name="excl_overlap_user_locker_res",
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0009_deferrable_reservation_constraints"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="closure",
+            options={
+                "ordering": ["pool_id", "dates"],
+                "verbose_name": "Closure",
+                "verbose_name_plural": "Closures",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="invoiceline",
+            options={
+                "ordering": ["invoice_id", "id"],
+                "verbose_name": "Invoice Line",
+                "verbose_name_plural": "Invoice Lines",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="lane",
+            options={
+                "ordering": ["pool_id", "id"],
+                "verbose_name": "Lane",
+                "verbose_name_plural": "Lanes",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="lanereservation",
+            options={
+                "ordering": ["period", "id"],
+                "verbose_name": "Lane Reservation",
+                "verbose_name_plural": "Lane Reservations",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="laneslot",
+            options={
+                "ordering": ["lane_id", "start"],
+                "verbose_name": "Lane Slot",
+                "verbose_name_plural": "Lane Slots",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="locker",
+            options={
+                "ordering": ["pool_id", "id"],
+                "verbose_name": "Locker",
+                "verbose_name_plural": "Lockers",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="lockerreservation",
+            options={
+                "ordering": ["period", "id"],
+                "verbose_name": "Locker Reservation",
+                "verbose_name_plural": "Locker Reservations",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="closure",
+            index=models.Index(fields=["pool", "dates"], name="closure_pool_dates_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lanereservation",
+            index=models.Index(fields=["period", "id"], name="lane_res_period_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lockerreservation",
+            index=models.Index(fields=["period", "id"], name="locker_res_period_idx"),
+        ),
+    ]
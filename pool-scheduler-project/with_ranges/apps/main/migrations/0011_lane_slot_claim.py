@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:45
+
+from django.db import migrations
+
+# The length of each LaneSlot (see `LANE_SLOT_LENGTH` in slot_utils.py)
+LANE_SLOT_LENGTH_SQL = "interval '30 minutes'"
+
+
+def get_lane_slot_claim_trigger_sql(reservation_table, slot_table):
+    """
+    Returns the SQL creating the statement-level triggers that keep the LaneSlots claimed by the LaneReservations
+        covering them, however the Reservations are written (e.g.: forms, the admin, `bulk_create()`, or the bulk
+        shifts of `bulk_utils.py`), and claiming the slots of the existing Reservations
+
+    Slots of a Reservation that moves to another period or Lane are released first, then the slots covered by each
+        active Reservation that was inserted, moved, or un-cancelled are claimed by it. Slots of cancelled or deleted
+        Reservations are already free (see `LaneSlotQuerySet.free()` and the `SET NULL` foreign key).
+    """
+    function = f"{slot_table}_claim"
+    claim_sql = f"""
+        UPDATE {slot_table} slot
+        SET lane_reservation_id = reservation.id
+        FROM {{reservations}} reservation
+        WHERE slot.lane_id = reservation.lane_id
+            AND reservation.cancelled IS NULL
+            AND reservation.period && tstzrange(slot.start, slot.start + {LANE_SLOT_LENGTH_SQL})
+            AND slot.lane_reservation_id IS DISTINCT FROM reservation.id
+    """
+    return f"""
+        CREATE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' THEN
+                UPDATE {slot_table} slot
+                SET lane_reservation_id = NULL
+                FROM new_rows new_row
+                JOIN old_rows old_row ON old_row.id = new_row.id
+                WHERE slot.lane_reservation_id = new_row.id
+                    AND (new_row.period, new_row.lane_id) IS DISTINCT FROM (old_row.period, old_row.lane_id)
+                    AND NOT (
+                        slot.lane_id = new_row.lane_id
+                        AND new_row.period && tstzrange(slot.start, slot.start + {LANE_SLOT_LENGTH_SQL})
+                    );
+
+                {claim_sql.format(reservations=f'''(
+                    SELECT new_row.*
+                    FROM new_rows new_row
+                    JOIN old_rows old_row ON old_row.id = new_row.id
+                    WHERE (new_row.period, new_row.lane_id, new_row.cancelled IS NULL)
+                        IS DISTINCT FROM (old_row.period, old_row.lane_id, old_row.cancelled IS NULL)
+                )''')};
+            ELSE
+                {claim_sql.format(reservations="new_rows")};
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+
+        CREATE TRIGGER {function}_insert AFTER INSERT ON {reservation_table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+        CREATE TRIGGER {function}_update AFTER UPDATE ON {reservation_table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+
+        {claim_sql.format(reservations=reservation_table)};
+    """
+
+
+def get_lane_slot_claim_trigger_reverse_sql(reservation_table, slot_table):
+    function = f"{slot_table}_claim"
+    return f"""
+        DROP TRIGGER {function}_insert ON {reservation_table};
+        DROP TRIGGER {function}_update ON {reservation_table};
+        DROP FUNCTION {function}();
+    """
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0010_join_free_ordering"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=get_lane_slot_claim_trigger_sql("main_lanereservation", "main_laneslot"),
+            reverse_sql=get_lane_slot_claim_trigger_reverse_sql("main_lanereservation", "main_laneslot"),
+        ),
+    ]
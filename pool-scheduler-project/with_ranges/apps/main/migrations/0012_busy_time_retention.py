@@ -0,0 +1,96 @@
+# Generated by Django 4.2.30 on 2026-10-19 13:55
+
+from django.db import migrations
+
+# How long the busy time keeps the periods of past Reservations. Nothing can be booked in the past, so older
+#   periods only make the multiranges, and every trigger and lookup over them, grow without bound.
+BUSY_TIME_RETENTION_SQL = "interval '7 days'"
+
+
+def get_busy_time_function_sql(reservation_table, resource_column, busy_time_table, retention_sql=None):
+    """
+    Returns the SQL replacing the trigger function of migration 0003 that keeps a busy time table in step with its
+        Reservation table
+
+    With `retention_sql`, every busy time row written by the trigger also drops the ranges that ended before the
+        retention horizon, along with the past parts of ranges that straddle it, and the existing rows are pruned
+        once. Without it, the function of migration 0003 is restored.
+    """
+    function = f"{reservation_table}_busy_time"
+    horizon_sql = f"tstzmultirange(tstzrange(NULL, now() - {retention_sql}))"
+    prune_sql = f" - {horizon_sql}" if retention_sql else ""
+    sql = f"""
+        CREATE OR REPLACE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                UPDATE {busy_time_table} busy_time
+                SET busy = busy_time.busy - removed.busy{prune_sql}
+                FROM (
+                    SELECT {resource_column}, range_agg(period) AS busy
+                    FROM old_rows
+                    WHERE cancelled IS NULL
+                    GROUP BY {resource_column}
+                ) removed
+                WHERE busy_time.{resource_column} = removed.{resource_column};
+
+            ELSIF TG_OP = 'UPDATE' THEN
+                UPDATE {busy_time_table} busy_time
+                SET busy = busy_time.busy - removed.busy{prune_sql}
+                FROM (
+                    SELECT old_row.{resource_column}, range_agg(old_row.period) AS busy
+                    FROM old_rows old_row
+                    JOIN new_rows new_row ON new_row.id = old_row.id
+                    WHERE old_row.cancelled IS NULL
+                        AND (old_row.period, old_row.{resource_column}, new_row.cancelled IS NULL)
+                            IS DISTINCT FROM (new_row.period, new_row.{resource_column}, true)
+                    GROUP BY old_row.{resource_column}
+                ) removed
+                WHERE busy_time.{resource_column} = removed.{resource_column};
+
+                INSERT INTO {busy_time_table} ({resource_column}, busy)
+                SELECT new_row.{resource_column}, range_agg(new_row.period){prune_sql}
+                FROM new_rows new_row
+                JOIN old_rows old_row ON old_row.id = new_row.id
+                WHERE new_row.cancelled IS NULL
+                    AND (new_row.period, new_row.{resource_column}, old_row.cancelled IS NULL)
+                        IS DISTINCT FROM (old_row.period, old_row.{resource_column}, true)
+                GROUP BY new_row.{resource_column}
+                ON CONFLICT ({resource_column}) DO UPDATE SET busy = {busy_time_table}.busy + EXCLUDED.busy{prune_sql};
+
+            ELSE
+                INSERT INTO {busy_time_table} ({resource_column}, busy)
+                SELECT {resource_column}, range_agg(period){prune_sql}
+                FROM new_rows
+                WHERE cancelled IS NULL
+                GROUP BY {resource_column}
+                ON CONFLICT ({resource_column}) DO UPDATE SET busy = {busy_time_table}.busy + EXCLUDED.busy{prune_sql};
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+    """
+    if retention_sql:
+        sql += f"UPDATE {busy_time_table} SET busy = busy - {horizon_sql} WHERE busy && {horizon_sql};"
+    return sql
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0011_lane_slot_claim"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=get_busy_time_function_sql(
+                "main_lanereservation", "lane_id", "main_lanebusytime", BUSY_TIME_RETENTION_SQL
+            ),
+            reverse_sql=get_busy_time_function_sql("main_lanereservation", "lane_id", "main_lanebusytime"),
+        ),
+        migrations.RunSQL(
+            sql=get_busy_time_function_sql(
+                "main_lockerreservation", "locker_id", "main_lockerbusytime", BUSY_TIME_RETENTION_SQL
+            ),
+            reverse_sql=get_busy_time_function_sql("main_lockerreservation", "locker_id", "main_lockerbusytime"),
+        ),
+    ]
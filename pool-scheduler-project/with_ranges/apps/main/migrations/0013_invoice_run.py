@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0012_busy_time_retention"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InvoiceRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "month",
+                    models.DateField(
+                        help_text="The first day of the month being billed",
+                        unique=True,
+                        verbose_name="Billing Month",
+                    ),
+                ),
+                ("change_seq", models.BigIntegerField(verbose_name="Change Sequence")),
+                (
+                    "updated",
+                    models.DateTimeField(auto_now=True, verbose_name="Updated"),
+                ),
+            ],
+            options={
+                "verbose_name": "Invoice Run",
+                "verbose_name_plural": "Invoice Runs",
+            },
+        ),
+    ]
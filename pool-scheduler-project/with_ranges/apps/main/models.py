@@ -1,4 +1,5 @@
 import auto_prefetch
+from apps.main.fields import DateTimeMultiRangeField
 from apps.main.validators import (
     DateTimeRangeLowerMinuteValidator,
     DateTimeRangeMaxDurationValidator,
@@ -15,9 +16,10 @@ from django.contrib.postgres.fields import (
     RangeBoundary,
     RangeOperators,
 )
-from django.db import models
-from django.db.models import Q
-from django.db.models.functions import Lower, Upper
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Deferrable, F, Q
+from django.db.models.functions import Greatest, Lower, Upper
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from psycopg2.extras import DateRange, DateTimeRange, DateTimeTZRange, NumericRange
@@ -66,6 +68,10 @@ class ClosureQuerySet(auto_prefetch.QuerySet):
     def manager_and_queryset_method(self):
         return
 
+    def order_by_pool_name(self):
+        """Order by the name of the Pool, which joins the Pool table, rather than by the default `pool_id`"""
+        return self.order_by("pool__name", "dates")
+
 
 class Closure(auto_prefetch.Model):
     """A way of recording dates that a pool is closed"""
@@ -98,6 +104,8 @@ class Closure(auto_prefetch.Model):
     pool = auto_prefetch.ForeignKey(Pool, on_delete=models.CASCADE, related_name="closures")
     dates = DateRangeField(_("Pool Closure Dates"))
     reason = models.TextField(_("Closure Reason"))
+    # The 64-bit id of the last transaction that changed the row, set by a database trigger (see migration 0007)
+    change_seq = models.BigIntegerField(_("Change Sequence"), default=0, editable=False)
 
     CombinedClosureManager = ClosureManager.from_queryset(ClosureQuerySet)
     objects = CombinedClosureManager()
@@ -105,7 +113,12 @@ class Closure(auto_prefetch.Model):
     class Meta:
         verbose_name = _("Closure")
         verbose_name_plural = _("Closures")
-        ordering = ["pool__name"]
+        # Local columns only, so default ordering never joins the Pool table (see `order_by_pool_name()`)
+        ordering = ["pool_id", "dates"]
+        indexes = [
+            models.Index(fields=["change_seq", "id"], name="closure_change_seq_idx"),
+            models.Index(fields=["pool", "dates"], name="closure_pool_dates_idx"),
+        ]
 
     def __str__(self):
         return f"{self.pool} ({self.dates.lower:%Y-%m-%d} - {self.dates.upper:%Y-%m-%d})"
@@ -120,6 +133,10 @@ class LaneQuerySet(auto_prefetch.QuerySet):
     def manager_and_queryset_method(self):
         return
 
+    def order_by_pool_name(self):
+        """Order by the name of the Pool, which joins the Pool table, rather than by the default `pool_id`"""
+        return self.order_by("pool__name", "name")
+
 
 class Lane(models.Model):
     """Each pool may have multiple lanes, each of which can be reserved by multiple people"""
@@ -137,7 +154,7 @@ class Lane(models.Model):
     class Meta:
         verbose_name = _("Lane")
         verbose_name_plural = _("Lanes")
-        ordering = ["pool__name"]
+        ordering = ["pool_id", "id"]
 
     def __str__(self):
         return f"{self.pool}: {self.name}"
@@ -152,6 +169,10 @@ class LockerQuerySet(auto_prefetch.QuerySet):
     def manager_and_queryset_method(self):
         return
 
+    def order_by_pool_name(self):
+        """Order by the name of the Pool, which joins the Pool table, rather than by the default `pool_id`"""
+        return self.order_by("pool__name", "number")
+
 
 class Locker(auto_prefetch.Model):
     """Each pool may have multiple lockers, each of which can be reserved by only one person at a time"""
@@ -167,7 +188,7 @@ class Locker(auto_prefetch.Model):
     class Meta:
         verbose_name = _("Locker")
         verbose_name_plural = _("Lockers")
-        ordering = ["pool__name"]
+        ordering = ["pool_id", "id"]
 
     def __str__(self):
         return f"{self.pool}: Locker {self.number}"
@@ -186,6 +207,10 @@ class LaneReservationQuerySet(auto_prefetch.QuerySet):
     def for_pool(self, pool):
         return self.filter(lane__pool=pool)
 
+    def order_by_pool_name(self):
+        """Order by the name of the Pool, which joins the Lane and Pool tables, rather than by the default `period`"""
+        return self.order_by("lane__pool__name", "period")
+
 
 class LaneReservation(auto_prefetch.Model):
     """A lane reservations defines a set of users, a period of time, and a pool lane"""
@@ -203,15 +228,23 @@ class LaneReservation(auto_prefetch.Model):
     )
     actual = DateTimeRangeField(_("Actual Usage Period"), default=(None, None))
     cancelled = models.DateTimeField(_("Reservation is Cancelled"), null=True)
+    # The 64-bit id of the last transaction that changed the row, set by a database trigger (see migration 0007)
+    change_seq = models.BigIntegerField(_("Change Sequence"), default=0, editable=False)
 
     CombinedLaneReservationManager = LaneReservationManager.from_queryset(LaneReservationQuerySet)
     objects = CombinedLaneReservationManager()
-    all_objects = auto_prefetch.Manager()
+    # Includes cancelled Reservations, with the same QuerySet methods (e.g.: `for_pool()`)
+    all_objects = auto_prefetch.Manager.from_queryset(LaneReservationQuerySet)()
 
     class Meta:
         verbose_name = _("Lane Reservation")
         verbose_name_plural = _("Lane Reservations")
-        ordering = ["lane__pool__name", "period"]
+        # Local columns only, so default ordering never joins the Lane and Pool tables (see `order_by_pool_name()`)
+        ordering = ["period", "id"]
+        indexes = [
+            models.Index(fields=["change_seq", "id"], name="lane_res_change_seq_idx"),
+            models.Index(fields=["period", "id"], name="lane_res_period_idx"),
+        ]
         constraints = [
             # No Lane should have overlapping reservations
             ExclusionConstraint(
@@ -222,6 +255,8 @@ class LaneReservation(auto_prefetch.Model):
                 ],
                 # Ignore overlaps where the reservation is cancelled
                 condition=Q(cancelled=None),
+                # Checked per statement, and deferrable to the end of the transaction (see `bulk_utils.py`)
+                deferrable=Deferrable.IMMEDIATE,
             ),
             # ToDo: No User should be included in more than one reservation at a time
             # ToDo:Reservations should have less than max number of swimmers
@@ -230,33 +265,81 @@ class LaneReservation(auto_prefetch.Model):
     def __str__(self):
         return f"{self.lane} ({self.period.lower:%Y-%m-%d %H:%M} - {self.period.upper:%Y-%m-%d %H:%M})"
 
+    def is_in_water(self):
+        """Whether the Reservation is active and its users have checked in, but not yet out"""
+        # `actual` is still the default tuple until the Reservation is saved and reloaded
+        actual = self.actual if isinstance(self.actual, DateTimeTZRange) else DateTimeTZRange(*self.actual)
+        return self.cancelled is None and actual.lower is not None and actual.upper is None
+
+    def get_swimmer_count(self):
+        """The number of swimmers counted in the water for this Reservation: its users, or at least one"""
+        return max(self.users.count(), 1)
+
+    def get_locked_current(self):
+        """Lock this Reservation's row for the rest of the transaction, and return its current state"""
+        return LaneReservation.all_objects.select_for_update().get(id=self.id)
+
+    def add_user(self, user):
+        """
+        Add a user (swimmer) to the Reservation, counting them as in the water if the others already are
+
+        If the Reservation is cancelled or its Lane already has its maximum number of swimmers, raises a
+            ValidationError.
+        """
+        with transaction.atomic():
+            current = self.get_locked_current()
+            if current.cancelled is not None:
+                raise ValidationError("Swimmers can't be added to a cancelled Reservation")
+            if current.users.filter(id=user.id).exists():
+                return False
+            user_count = current.users.count()
+            if user_count >= self.lane.max_swimmers:
+                raise ValidationError(f"{self.lane} allows at most {self.lane.max_swimmers} swimmers")
+            self.users.add(user)
+            # A Reservation without users is already counted as one swimmer
+            if current.is_in_water() and user_count:
+                LaneOccupancy.adjust(self.lane, 1)
+        return True
+
     def cancel_reservation(self):
-        self.cancelled = timezone.now()
-        self.save(
-            update_fields=[
-                "cancelled",
-            ]
-        )
+        with transaction.atomic():
+            was_in_water = self.get_locked_current().is_in_water()
+            self.cancelled = timezone.now()
+            self.save(
+                update_fields=[
+                    "cancelled",
+                ]
+            )
+            if was_in_water:
+                LaneOccupancy.adjust(self.lane, -self.get_swimmer_count())
         return True
 
     def check_in(self):
-        """Set the lower value of `actual` to now"""
-        self.actual = DateTimeTZRange(timezone.now(), None)
-        self.save(
-            update_fields=[
-                "actual",
-            ]
-        )
+        """Set the lower value of `actual` to now, and count the Reservation's swimmers as in the water"""
+        with transaction.atomic():
+            was_in_water = self.get_locked_current().is_in_water()
+            self.actual = DateTimeTZRange(timezone.now(), None)
+            self.save(
+                update_fields=[
+                    "actual",
+                ]
+            )
+            if not was_in_water and self.is_in_water():
+                LaneOccupancy.adjust(self.lane, self.get_swimmer_count())
         return True
 
     def check_out(self):
-        """Set the upper value of `actual` to now"""
-        self.actual = DateTimeTZRange(self.actual.lower, timezone.now())
-        self.save(
-            update_fields=[
-                "actual",
-            ]
-        )
+        """Set the upper value of `actual` to now, and count the Reservation's swimmers as out of the water"""
+        with transaction.atomic():
+            was_in_water = self.get_locked_current().is_in_water()
+            self.actual = DateTimeTZRange(self.actual.lower, timezone.now())
+            self.save(
+                update_fields=[
+                    "actual",
+                ]
+            )
+            if was_in_water:
+                LaneOccupancy.adjust(self.lane, -self.get_swimmer_count())
         return True
 
 
@@ -273,6 +356,10 @@ class LockerReservationQuerySet(auto_prefetch.QuerySet):
     def for_pool(self, pool):
         return self.filter(locker__pool=pool)
 
+    def order_by_pool_name(self):
+        """Order by the name of the Pool, which joins the Locker and Pool tables, rather than by the default `period`"""
+        return self.order_by("locker__pool__name", "period")
+
 
 class LockerReservation(auto_prefetch.Model):
     """A locker reservation defines a user, a period of time, and a pool locker"""
@@ -290,15 +377,23 @@ class LockerReservation(auto_prefetch.Model):
     )
     actual = DateTimeRangeField(_("Actual Usage Period"), default=(None, None))
     cancelled = models.DateTimeField(_("Reservation is Cancelled"), null=True)
+    # The 64-bit id of the last transaction that changed the row, set by a database trigger (see migration 0007)
+    change_seq = models.BigIntegerField(_("Change Sequence"), default=0, editable=False)
 
     CombinedLockerReservationManager = LockerReservationManager.from_queryset(LockerReservationQuerySet)
     objects = CombinedLockerReservationManager()
-    all_objects = auto_prefetch.Manager()
+    # Includes cancelled Reservations, with the same QuerySet methods (e.g.: `for_pool()`)
+    all_objects = auto_prefetch.Manager.from_queryset(LockerReservationQuerySet)()
 
     class Meta:
         verbose_name = _("Locker Reservation")
         verbose_name_plural = _("Locker Reservations")
-        ordering = ["locker__pool__name", "period"]
+        # Local columns only, so default ordering never joins the Locker and Pool tables (see `order_by_pool_name()`)
+        ordering = ["period", "id"]
+        indexes = [
+            models.Index(fields=["change_seq", "id"], name="locker_res_change_seq_idx"),
+            models.Index(fields=["period", "id"], name="locker_res_period_idx"),
+        ]
         constraints = [
             # No Locker should have overlapping reservations
             ExclusionConstraint(
@@ -309,6 +404,8 @@ class LockerReservation(auto_prefetch.Model):
                 ],
                 # Ignore overlaps where the reservation is cancelled
                 condition=Q(cancelled=None),
+                # Checked per statement, and deferrable to the end of the transaction (see `bulk_utils.py`)
+                deferrable=Deferrable.IMMEDIATE,
             ),
             # No User should have more than one reservation at a time
             ExclusionConstraint(
@@ -319,6 +416,8 @@ class LockerReservation(auto_prefetch.Model):
                 ],
                 # Ignore overlaps where the reservation is cancelled
                 condition=Q(cancelled=None),
+                # Checked per statement, and deferrable to the end of the transaction (see `bulk_utils.py`)
+                deferrable=Deferrable.IMMEDIATE,
             ),
         ]
 
@@ -353,3 +452,317 @@ class LockerReservation(auto_prefetch.Model):
             ]
         )
         return True
+
+
+class LaneBusyTime(models.Model):
+    """
+    The busy time of a Lane: the union of the periods of its active (not cancelled) Reservations
+
+    Rows are maintained by database triggers on the LaneReservation table (see migration 0003), so answering "is
+        this Lane free during this period?" reads a single row instead of aggregating over Reservations. Periods
+        that ended more than a week ago are pruned as rows are written (see migration 0012).
+    """
+
+    lane = models.OneToOneField(Lane, on_delete=models.CASCADE, primary_key=True, related_name="busy_time")
+    busy = DateTimeMultiRangeField(_("Busy Time"), default="{}")
+
+    class Meta:
+        verbose_name = _("Lane Busy Time")
+        verbose_name_plural = _("Lane Busy Times")
+
+    def __str__(self):
+        return f"{self.lane}: {self.busy}"
+
+
+class LockerBusyTime(models.Model):
+    """
+    The busy time of a Locker: the union of the periods of its active (not cancelled) Reservations
+
+    Rows are maintained by database triggers on the LockerReservation table (see migration 0003), so answering "is
+        this Locker free during this period?" reads a single row instead of aggregating over Reservations. Periods
+        that ended more than a week ago are pruned as rows are written (see migration 0012).
+    """
+
+    locker = models.OneToOneField(Locker, on_delete=models.CASCADE, primary_key=True, related_name="busy_time")
+    busy = DateTimeMultiRangeField(_("Busy Time"), default="{}")
+
+    class Meta:
+        verbose_name = _("Locker Busy Time")
+        verbose_name_plural = _("Locker Busy Times")
+
+    def __str__(self):
+        return f"{self.locker}: {self.busy}"
+
+
+class DeletedRecord(models.Model):
+    """
+    A deleted Lane Reservation, Locker Reservation, or Closure, so the change feed can tell clients to drop it
+
+    Rows are written by database triggers (see migration 0007). Cancelled Reservations are not deleted, so they
+        appear in the change feed as changed rows instead.
+    """
+
+    kind = models.CharField(_("Kind"), max_length=20)
+    record_id = models.BigIntegerField(_("Record ID"))
+    change_seq = models.BigIntegerField(_("Change Sequence"))
+    deleted = models.DateTimeField(_("Deleted"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Deleted Record")
+        verbose_name_plural = _("Deleted Records")
+        indexes = [models.Index(fields=["kind", "change_seq", "record_id"], name="deleted_record_change_seq_idx")]
+
+    def __str__(self):
+        return f"{self.kind} {self.record_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    A domain event (e.g.: "lane_reservation.cancelled"), written in the same transaction as the change it describes,
+        for `drain_outbox()` to dispatch to its handlers afterwards
+
+    Rows are written by database triggers (see migration 0008), so every booking, cancellation, check-in, check-out,
+        and Closure is recorded, including those made by bulk SQL statements. An event is only ever seen once its
+        change has committed, and is kept until its handlers succeed.
+    """
+
+    topic = models.CharField(_("Topic"), max_length=50)
+    payload = models.JSONField(_("Payload"), default=dict)
+    created = models.DateTimeField(_("Created"), auto_now_add=True)
+    available = models.DateTimeField(_("Available"), default=timezone.now, help_text=_("When to next attempt it"))
+    attempts = models.PositiveSmallIntegerField(_("Failed Attempts"), default=0)
+    handled = models.JSONField(_("Completed Handlers"), default=list, blank=True)
+    last_error = models.TextField(_("Last Error"), blank=True)
+    processed = models.DateTimeField(_("Processed"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Outbox Event")
+        verbose_name_plural = _("Outbox Events")
+        indexes = [
+            # Keeps polling for pending events cheap as processed events accumulate
+            models.Index(fields=["available", "id"], name="outbox_event_pending_idx", condition=Q(processed=None)),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} ({self.created:%Y-%m-%d %H:%M:%S})"
+
+
+class PoolOccupancy(models.Model):
+    """
+    The number of swimmers currently in the water at a Pool, across all of its Lanes
+
+    Maintained incrementally by `LaneOccupancy.adjust()`, so the live occupancy of a Pool is a single row read.
+    """
+
+    pool = models.OneToOneField(Pool, on_delete=models.CASCADE, primary_key=True, related_name="occupancy")
+    swimmers = models.PositiveIntegerField(_("Swimmers in the Water"), default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Pool Occupancy")
+        verbose_name_plural = _("Pool Occupancies")
+
+    def __str__(self):
+        return f"{self.pool}: {self.swimmers} swimmers"
+
+
+class LaneOccupancy(models.Model):
+    """
+    The number of swimmers currently in the water in a Lane: the users of its active Reservations that have
+        checked in (`actual` has a lower value) but not yet out (`actual` has no upper value)
+
+    Maintained incrementally by `LaneReservation.check_in()`, `check_out()` and `cancel_reservation()`, within
+        the same transaction as the change to the Reservation.
+    """
+
+    lane = models.OneToOneField(Lane, on_delete=models.CASCADE, primary_key=True, related_name="occupancy")
+    swimmers = models.PositiveIntegerField(_("Swimmers in the Water"), default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Lane Occupancy")
+        verbose_name_plural = _("Lane Occupancies")
+
+    def __str__(self):
+        return f"{self.lane}: {self.swimmers} of {self.lane.max_swimmers} swimmers"
+
+    @classmethod
+    def adjust(cls, lane, swimmers):
+        """
+        Atomically adds `swimmers` (which may be negative) to the counters of the Lane and its Pool
+
+        The counters are updated in place with `swimmers = swimmers + n`, so concurrent check-ins never lose an
+            update, and the Lane's row is always locked before its Pool's to avoid deadlocks.
+        """
+        now = timezone.now()
+        cls.objects.get_or_create(lane_id=lane.id)
+        cls.objects.filter(lane_id=lane.id).update(swimmers=Greatest(F("swimmers") + swimmers, 0), updated=now)
+        PoolOccupancy.objects.get_or_create(pool_id=lane.pool_id)
+        PoolOccupancy.objects.filter(pool_id=lane.pool_id).update(
+            swimmers=Greatest(F("swimmers") + swimmers, 0), updated=now
+        )
+
+
+class LaneSlotManager(auto_prefetch.Manager):
+    def manager_only_method(self):
+        return
+
+
+class LaneSlotQuerySet(auto_prefetch.QuerySet):
+    def free(self):
+        """Return only slots that are not claimed by an active LaneReservation"""
+        return self.filter(Q(lane_reservation__isnull=True) | Q(lane_reservation__cancelled__isnull=False))
+
+
+class LaneSlot(auto_prefetch.Model):
+    """
+    A 30-minute slot of a Lane during its Pool's business hours, which may be claimed by one LaneReservation
+
+    Slots are generated ahead of time (see `slot_utils.py`) for open days only, and a slot whose LaneReservation is
+        cancelled or deleted is free again. However a LaneReservation is written, a database trigger claims the
+        slots it covers (see migration 0011).
+    """
+
+    lane = auto_prefetch.ForeignKey(Lane, on_delete=models.CASCADE, related_name="slots")
+    start = models.DateTimeField(_("Slot Start"))
+    lane_reservation = auto_prefetch.ForeignKey(
+        LaneReservation,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="slots",
+    )
+
+    CombinedLaneSlotManager = LaneSlotManager.from_queryset(LaneSlotQuerySet)
+    objects = CombinedLaneSlotManager()
+
+    class Meta:
+        verbose_name = _("Lane Slot")
+        verbose_name_plural = _("Lane Slots")
+        # By `lane_id` rather than `lane`, which would sort by the Lane's default ordering, joining its table
+        ordering = ["lane_id", "start"]
+        constraints = [
+            models.UniqueConstraint(fields=["lane", "start"], name="unique_lane_slot"),
+        ]
+
+    def __str__(self):
+        return f"{self.lane} ({self.start:%Y-%m-%d %H:%M})"
+
+
+class InvoiceManager(auto_prefetch.Manager):
+    def manager_only_method(self):
+        return
+
+
+class InvoiceQuerySet(auto_prefetch.QuerySet):
+    def for_month(self, month):
+        return self.filter(month=month.replace(day=1))
+
+
+class Invoice(auto_prefetch.Model):
+    """The charges for a user's Lane and Locker Reservations starting within one calendar month"""
+
+    user = auto_prefetch.ForeignKey(User, on_delete=models.CASCADE, related_name="invoices")
+    month = models.DateField(_("Billing Month"), help_text=_("The first day of the month being billed"))
+    total = models.DecimalField(_("Total"), max_digits=10, decimal_places=2, default=0)
+    created = models.DateTimeField(_("Created"), auto_now_add=True)
+    updated = models.DateTimeField(_("Updated"), auto_now=True)
+
+    CombinedInvoiceManager = InvoiceManager.from_queryset(InvoiceQuerySet)
+    objects = CombinedInvoiceManager()
+
+    class Meta:
+        verbose_name = _("Invoice")
+        verbose_name_plural = _("Invoices")
+        ordering = ["-month", "user"]
+        constraints = [
+            # Each User receives at most one Invoice per month, which invoice runs update in place
+            models.UniqueConstraint(fields=["user", "month"], name="unique_user_month_invoice"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} ({self.month:%Y-%m}): {self.total}"
+
+
+class InvoiceLineManager(auto_prefetch.Manager):
+    def manager_only_method(self):
+        return
+
+
+class InvoiceLineQuerySet(auto_prefetch.QuerySet):
+    def manager_and_queryset_method(self):
+        return
+
+
+class InvoiceLine(auto_prefetch.Model):
+    """The charge to one Invoice's user for a single Lane or Locker Reservation"""
+
+    invoice = auto_prefetch.ForeignKey(Invoice, on_delete=models.CASCADE, related_name="lines")
+    lane_reservation = auto_prefetch.ForeignKey(
+        LaneReservation, on_delete=models.CASCADE, related_name="invoice_lines", null=True, blank=True
+    )
+    locker_reservation = auto_prefetch.ForeignKey(
+        LockerReservation, on_delete=models.CASCADE, related_name="invoice_lines", null=True, blank=True
+    )
+    hours = models.DecimalField(_("Billed Hours"), max_digits=8, decimal_places=2)
+    per_hour_cost = models.DecimalField(_("Per-Hour Cost"), max_digits=5, decimal_places=2)
+    share_count = models.PositiveSmallIntegerField(
+        _("Share Count"),
+        default=1,
+        help_text=_("The number of users splitting the cost of the Reservation"),
+    )
+    amount = models.DecimalField(_("Amount"), max_digits=10, decimal_places=2)
+    updated = models.DateTimeField(_("Updated"), auto_now=True)
+
+    CombinedInvoiceLineManager = InvoiceLineManager.from_queryset(InvoiceLineQuerySet)
+    objects = CombinedInvoiceLineManager()
+
+    class Meta:
+        verbose_name = _("Invoice Line")
+        verbose_name_plural = _("Invoice Lines")
+        # By `invoice_id` rather than `invoice`, which would sort by the Invoice's default ordering, joining its table
+        ordering = ["invoice_id", "id"]
+        constraints = [
+            # Each line charges for exactly one Lane Reservation or Locker Reservation
+            models.CheckConstraint(
+                name="invoice_line_single_reservation",
+                check=(
+                    Q(lane_reservation__isnull=False, locker_reservation__isnull=True)
+                    | Q(lane_reservation__isnull=True, locker_reservation__isnull=False)
+                ),
+            ),
+            # A Reservation is charged at most once per Invoice, which lets invoice runs upsert their lines
+            models.UniqueConstraint(
+                fields=["invoice", "lane_reservation"],
+                condition=Q(lane_reservation__isnull=False),
+                name="unique_invoice_lane_reservation",
+            ),
+            models.UniqueConstraint(
+                fields=["invoice", "locker_reservation"],
+                condition=Q(locker_reservation__isnull=False),
+                name="unique_invoice_locker_reservation",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.invoice}: {self.amount}"
+
+
+class InvoiceRun(models.Model):
+    """
+    The change sequence from which the next invoice run of a month bills Reservations again (see `run_invoices()`)
+
+    Rows are written by invoice runs. Every Reservation changed at or after the change sequence (see migration
+        0007) may not be reflected in the month's Invoices yet.
+    """
+
+    month = models.DateField(_("Billing Month"), unique=True, help_text=_("The first day of the month being billed"))
+    change_seq = models.BigIntegerField(_("Change Sequence"))
+    updated = models.DateTimeField(_("Updated"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("Invoice Run")
+        verbose_name_plural = _("Invoice Runs")
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}: {self.change_seq}"
@@ -0,0 +1,244 @@
+from collections import Counter
+
+from apps.main.availability_utils import (
+    get_closure_period,
+    get_pool_closure_periods,
+    overlaps_closure_periods,
+)
+from apps.main.models import Lane, LaneOccupancy, LaneReservation, Pool, PoolOccupancy
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+# How long (in seconds) a computed heatmap is cached for each Pool and week
+POOL_OCCUPANCY_HEATMAP_CACHE_TIMEOUT = 60 * 5
+
+
+def get_week_start(day: timezone.datetime.date) -> timezone.datetime.date:
+    """
+    Returns the Sunday starting the week that contains `day`, matching the default of `get_this_week_range()`
+    """
+    return day - timezone.timedelta(days=(day.weekday() + 1) % 7)
+
+
+def get_pool_occupancy_heatmap_cache_key(pool_id: int, week_start: timezone.datetime.date) -> str:
+    return f"pool_occupancy_heatmap:{pool_id}:{week_start:%Y-%m-%d}"
+
+
+def get_pool_occupancy_heatmap(pool: Pool, week_start: timezone.datetime.date) -> dict:
+    """
+    Returns the occupancy heatmap for a Pool during the week starting on `week_start`, cached per Pool and week
+
+    See `compute_pool_occupancy_heatmap()` for the contents of the heatmap.
+    """
+    return cache.get_or_set(
+        get_pool_occupancy_heatmap_cache_key(pool.id, week_start),
+        lambda: compute_pool_occupancy_heatmap(pool, week_start),
+        POOL_OCCUPANCY_HEATMAP_CACHE_TIMEOUT,
+    )
+
+
+def compute_pool_occupancy_heatmap(pool: Pool, week_start: timezone.datetime.date) -> dict:
+    """
+    Computes how much of each business hour of a week each of the Pool's Lanes is booked, using a single query
+
+    An hourly slot is generated for each of the Pool's business hours on each day of the week, and days that fall
+        within the Pool's merged closure periods (see `get_pool_closure_periods()`) are flagged. Each slot is then
+        joined to the Lane Reservations that overlap it (using the GiST index of the Lane Reservation exclusion
+        constraint), and the booked part of the slot is the intersection of the Reservation's period with the slot.
+
+    Returns a dictionary with:
+
+    - `week_start`, the first date of the week
+    - `days`, a list of dictionaries with the `date` of each day of the week and whether the Pool is `closed`
+    - `hours`, the list of business hours shown for each day
+    - `lanes`, a list of dictionaries with each Lane's `id`, `name`, and `cells`, which holds a list per day with
+        the booked percentage (0 to 100) of each business hour, or None if the Pool is closed that day
+    """
+    hours = list(range(pool.business_hours.lower, pool.business_hours.upper))
+    days = [{"date": week_start + timezone.timedelta(days=day_offset), "closed": False} for day_offset in range(7)]
+    heatmap = {"week_start": week_start, "days": days, "hours": hours, "lanes": []}
+    if not hours:
+        return heatmap
+
+    sql = f"""
+        WITH slot AS (
+            SELECT
+                slot_start,
+                tstzrange(slot_start, slot_start + interval '1 hour') AS slot_period,
+                slot_start::date = ANY(%(closed_dates)s::date[]) AS closed
+            FROM generate_series(
+                %(week_start)s::date::timestamptz,
+                %(week_start)s::date::timestamptz + interval '7 days' - interval '1 hour',
+                interval '1 hour'
+            ) AS slot_start
+            WHERE extract(hour FROM slot_start)::integer >= %(open_hour)s
+                AND extract(hour FROM slot_start)::integer < %(close_hour)s
+        )
+        SELECT
+            lane.id,
+            lane.name,
+            slot.slot_start::date,
+            slot.closed,
+            coalesce(
+                sum(
+                    extract(epoch FROM upper(reservation.period * slot.slot_period))
+                    - extract(epoch FROM lower(reservation.period * slot.slot_period))
+                ),
+                0
+            )
+        FROM {Lane._meta.db_table} lane
+        CROSS JOIN slot
+        LEFT JOIN {LaneReservation._meta.db_table} reservation
+            ON reservation.lane_id = lane.id
+            AND reservation.cancelled IS NULL
+            AND NOT slot.closed
+            AND reservation.period && slot.slot_period
+        WHERE lane.pool_id = %(pool_id)s
+        GROUP BY lane.id, lane.name, slot.slot_start, slot.closed
+        ORDER BY lane.id, slot.slot_start
+    """
+    closure_periods = get_pool_closure_periods(pool.id)
+    closed_dates = [
+        day["date"]
+        for day in days
+        if overlaps_closure_periods(
+            closure_periods, get_closure_period(day["date"], day["date"] + timezone.timedelta(1))
+        )
+    ]
+    params = {
+        "pool_id": pool.id,
+        "closed_dates": closed_dates,
+        "week_start": week_start,
+        "open_hour": pool.business_hours.lower,
+        "close_hour": pool.business_hours.upper,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    day_indexes = {day["date"]: index for index, day in enumerate(days)}
+    lanes = {}
+    for lane_id, lane_name, slot_date, closed, booked_seconds in rows:
+        if lane_id not in lanes:
+            lanes[lane_id] = {"id": lane_id, "name": lane_name, "cells": [[] for day in days]}
+        day_index = day_indexes[slot_date]
+        if closed:
+            days[day_index]["closed"] = True
+            lanes[lane_id]["cells"][day_index].append(None)
+        else:
+            lanes[lane_id]["cells"][day_index].append(min(round(float(booked_seconds) / 36), 100))
+
+    heatmap["lanes"] = list(lanes.values())
+    return heatmap
+
+
+def get_live_occupancy(pool: Pool) -> dict:
+    """
+    Returns who's in the water at a Pool right now, read from the incrementally maintained counters (see
+        `LaneOccupancy`), with one query for the Pool and one for its Lanes
+
+    Returns a dictionary with the Pool's `id` and total `swimmers`, and a list of `lanes` with each Lane's `id`,
+        `name`, `swimmers`, `max_swimmers`, and whether it is `full`.
+    """
+    pool_occupancy = PoolOccupancy.objects.filter(pool_id=pool.id).values_list("swimmers", flat=True).first()
+    lanes = (
+        Lane.objects.filter(pool_id=pool.id)
+        .order_by("name", "id")
+        .values_list("id", "name", "max_swimmers", "occupancy__swimmers")
+    )
+    return {
+        "id": pool.id,
+        "swimmers": pool_occupancy or 0,
+        "lanes": [
+            {
+                "id": lane_id,
+                "name": name,
+                "swimmers": swimmers or 0,
+                "max_swimmers": max_swimmers,
+                "full": (swimmers or 0) >= max_swimmers,
+            }
+            for lane_id, name, max_swimmers, swimmers in lanes
+        ],
+    }
+
+
+def get_in_water_returning_sql(reservation_model) -> str:
+    """
+    Returns the columns to add to the `RETURNING` clause of an UPDATE cancelling Reservations (aliased
+        `reservation`): whether each one was in the water, its Lane, and its number of swimmers, for
+        `remove_cancelled_swimmers()`. Locker Reservations are never in the water.
+    """
+    if reservation_model is not LaneReservation:
+        return "FALSE, 0, 0"
+    users_table = LaneReservation.users.through._meta.db_table
+    return f"""
+        lower(reservation.actual) IS NOT NULL AND upper(reservation.actual) IS NULL,
+        reservation.lane_id,
+        (SELECT greatest(count(*), 1) FROM {users_table} WHERE lanereservation_id = reservation.id)
+    """
+
+
+def remove_cancelled_swimmers(rows) -> None:
+    """
+    Takes the swimmers of cancelled Lane Reservations that were in the water off the occupancy counters, as
+        `LaneReservation.cancel_reservation()` does, given the (was_in_water, lane_id, swimmers) columns of
+        `get_in_water_returning_sql()` for each cancelled Reservation
+    """
+    swimmers_out = Counter()
+    for was_in_water, lane_id, swimmers in rows:
+        if was_in_water:
+            swimmers_out[lane_id] += swimmers
+    for lane in Lane.objects.filter(id__in=swimmers_out):
+        LaneOccupancy.adjust(lane, -swimmers_out[lane.id])
+
+
+def recompute_occupancy() -> dict:
+    """
+    Recomputes every Lane and Pool occupancy counter from the Lane Reservations, correcting any drift (e.g.: after
+        Reservations are deleted, or their users change, while checked in)
+
+    Only counters whose value changed are written. Returns the number of Lane and Pool counters corrected.
+    """
+    lane_reservation_users = LaneReservation.users.through._meta.db_table
+    lane_reservation_users_column = LaneReservation.users.field.m2m_column_name()
+    lane_occupancy_table = LaneOccupancy._meta.db_table
+    pool_occupancy_table = PoolOccupancy._meta.db_table
+
+    results = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {lane_occupancy_table} AS occupancy (lane_id, swimmers, updated)
+            SELECT lane.id, coalesce(sum(in_water.swimmers), 0), now()
+            FROM {Lane._meta.db_table} lane
+            LEFT JOIN (
+                SELECT reservation.lane_id, greatest(count(reservation_user.id), 1) AS swimmers
+                FROM {LaneReservation._meta.db_table} reservation
+                LEFT JOIN {lane_reservation_users} reservation_user
+                    ON reservation_user.{lane_reservation_users_column} = reservation.id
+                WHERE reservation.cancelled IS NULL
+                    AND lower(reservation.actual) IS NOT NULL
+                    AND upper(reservation.actual) IS NULL
+                GROUP BY reservation.id
+            ) in_water ON in_water.lane_id = lane.id
+            GROUP BY lane.id
+            ON CONFLICT (lane_id) DO UPDATE SET swimmers = EXCLUDED.swimmers, updated = EXCLUDED.updated
+            WHERE occupancy.swimmers IS DISTINCT FROM EXCLUDED.swimmers
+            """
+        )
+        results["lanes"] = cursor.rowcount
+        cursor.execute(
+            f"""
+            INSERT INTO {pool_occupancy_table} AS occupancy (pool_id, swimmers, updated)
+            SELECT pool.id, coalesce(sum(lane_occupancy.swimmers), 0), now()
+            FROM {Pool._meta.db_table} pool
+            LEFT JOIN {Lane._meta.db_table} lane ON lane.pool_id = pool.id
+            LEFT JOIN {lane_occupancy_table} lane_occupancy ON lane_occupancy.lane_id = lane.id
+            GROUP BY pool.id
+            ON CONFLICT (pool_id) DO UPDATE SET swimmers = EXCLUDED.swimmers, updated = EXCLUDED.updated
+            WHERE occupancy.swimmers IS DISTINCT FROM EXCLUDED.swimmers
+            """
+        )
+        results["pools"] = cursor.rowcount
+    return results
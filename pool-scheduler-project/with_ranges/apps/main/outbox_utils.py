@@ -0,0 +1,243 @@
+import logging
+from fnmatch import fnmatchcase
+
+from apps.main.availability_utils import (
+    get_pool_closure_periods,
+    overlaps_closure_periods,
+)
+from apps.main.models import Invoice, LaneReservation, LockerReservation, OutboxEvent
+from apps.main.occupancy_utils import (
+    get_pool_occupancy_heatmap_cache_key,
+    get_week_start,
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import get_connection, send_mass_mail
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+logger = logging.getLogger("with_ranges.main")
+
+
+# How many events are locked and dispatched together
+OUTBOX_BATCH_SIZE = 100
+
+# How many times an event is attempted before it is left for an administrator to inspect
+OUTBOX_MAX_ATTEMPTS = 8
+
+# How long to wait before retrying a failed event, doubled after each further failure
+OUTBOX_RETRY_DELAY = timezone.timedelta(seconds=30)
+
+# How long processed events are kept before `purge_outbox()` deletes them
+OUTBOX_RETENTION = timezone.timedelta(days=7)
+
+# How long a month's queued invoice refresh keeps later events from queueing another one, in case the task is lost
+INVOICE_REFRESH_QUEUED_TIMEOUT = 60 * 60
+
+# The handlers registered with `outbox_handler()`, as (topic patterns, handler) tuples
+_outbox_handlers = []
+
+
+def outbox_handler(*topic_patterns):
+    """
+    Registers the decorated function to handle the events whose topic matches any of the patterns (e.g.:
+        "lane_reservation.*"). Handlers are called with a list of the matching events of each batch.
+
+    Events are delivered at least once, so handlers must be safe to repeat.
+    """
+
+    def register(handler):
+        _outbox_handlers.append((topic_patterns, handler))
+        return handler
+
+    return register
+
+
+def get_matching_events(events: list, topic_patterns: tuple) -> list:
+    """Returns the events whose topic matches any of the patterns"""
+    return [event for event in events if any(fnmatchcase(event.topic, pattern) for pattern in topic_patterns)]
+
+
+def get_retry_delay(attempts: int) -> timezone.timedelta:
+    """Returns how long to wait before attempting an event again, after it has failed `attempts` times"""
+    return OUTBOX_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+
+
+def get_event_date_ranges(event: OutboxEvent) -> list:
+    """
+    Returns the (local) first and last dates of an event's period, and of the period it replaced if it was
+        rescheduled, as `(first_date, last_date)` tuples
+    """
+    date_ranges = []
+    for lower_name, upper_name in (("start", "end"), ("previous_start", "previous_end")):
+        lower, upper = event.payload.get(lower_name), event.payload.get(upper_name)
+        if not lower or not upper:
+            continue
+        if event.topic.startswith("closure."):
+            date_ranges.append((parse_date(lower), parse_date(upper)))
+        else:
+            date_ranges.append(
+                (timezone.localtime(parse_datetime(lower)).date(), timezone.localtime(parse_datetime(upper)).date())
+            )
+    return date_ranges
+
+
+def get_event_week_starts(event: OutboxEvent) -> set:
+    """Returns the start of each week that an event's periods touch"""
+    week_starts = set()
+    for first_date, last_date in get_event_date_ranges(event):
+        week_start = get_week_start(first_date)
+        while week_start <= last_date:
+            week_starts.add(week_start)
+            week_start += timezone.timedelta(days=7)
+    return week_starts
+
+
+@outbox_handler("lane_reservation.*", "closure.created")
+def clear_pool_occupancy_heatmaps(events: list):
+    """Clears the cached occupancy heatmaps of the weeks that changed Lane Reservations and new Closures touch"""
+    cache_keys = {
+        get_pool_occupancy_heatmap_cache_key(event.payload["pool"], week_start)
+        for event in events
+        for week_start in get_event_week_starts(event)
+    }
+    cache.delete_many(list(cache_keys))
+
+
+def get_invoice_refresh_queued_cache_key(month: timezone.datetime.date) -> str:
+    """Returns the cache key marking that an invoice refresh of `month` is queued and hasn't started yet"""
+    return f"invoice_refresh_queued:{month:%Y-%m}"
+
+
+@outbox_handler("lane_reservation.*", "locker_reservation.*")
+def refresh_invoices(events: list):
+    """
+    Queues a re-run of the invoices of each already-billed month in which a changed Reservation starts, so invoices
+        reflect cancellations, reschedules, and actual usage (see `run_invoices()`, which only bills what changed)
+
+    The month is billed by `run_invoices_task` once the drain transaction commits, rather than within it, so the
+        outbox isn't held up by an invoice run. Each month is queued at most once until its task starts, however
+        many batches of events touch it.
+    """
+    from apps.main.tasks import run_invoices_task
+
+    def queue_invoice_refresh(month):
+        if cache.add(get_invoice_refresh_queued_cache_key(month), True, INVOICE_REFRESH_QUEUED_TIMEOUT):
+            run_invoices_task.delay(f"{month:%Y-%m}")
+
+    months = {first_date.replace(day=1) for event in events for first_date, last_date in get_event_date_ranges(event)}
+    for month in sorted(months):
+        if Invoice.objects.for_month(month).exists():
+            # Queued only if the drain transaction commits, as the events are otherwise retried
+            transaction.on_commit(lambda month=month: queue_invoice_refresh(month))
+
+
+@outbox_handler("lane_reservation.cancelled", "locker_reservation.cancelled")
+def notify_cancelled_reservation_users(events: list):
+    """
+    Emails the users of each cancelled Reservation, except where the Reservation overlaps a Closure of its Pool, as
+        those users are notified about the Closure instead (see `apply_closure()`)
+    """
+    lane_reservation_ids = [event.payload["id"] for event in events if event.topic.startswith("lane_reservation.")]
+    locker_reservation_ids = [event.payload["id"] for event in events if event.topic.startswith("locker_reservation.")]
+    reservations = [
+        (lane_reservation, lane_reservation.lane.pool, list(lane_reservation.users.all()))
+        for lane_reservation in LaneReservation.all_objects.filter(id__in=lane_reservation_ids)
+        .select_related("lane__pool")
+        .prefetch_related("users")
+    ] + [
+        (locker_reservation, locker_reservation.locker.pool, [locker_reservation.user])
+        for locker_reservation in LockerReservation.all_objects.filter(id__in=locker_reservation_ids).select_related(
+            "locker__pool", "user"
+        )
+    ]
+
+    messages = []
+    for reservation, pool, users in reservations:
+        if overlaps_closure_periods(get_pool_closure_periods(pool.id), reservation.period):
+            continue
+        period = reservation.period
+        message = (
+            f"Your reservation at {pool} from {timezone.localtime(period.lower):%Y-%m-%d %H:%M} until "
+            f"{timezone.localtime(period.upper):%Y-%m-%d %H:%M} has been cancelled."
+        )
+        for user in users:
+            if user.email:
+                messages.append(
+                    (f"Reservation cancelled at {pool}", message, settings.DEFAULT_FROM_EMAIL, [user.email])
+                )
+    if messages:
+        send_mass_mail(messages, connection=get_connection())
+
+
+def dispatch_outbox_events(events: list) -> dict:
+    """
+    Calls every registered handler with its matching events, each within its own savepoint so a failing handler
+        doesn't affect the others
+
+    The handlers that succeed are added to each event's `handled` list, so retrying an event only calls the
+        handlers that failed. Returns a dictionary mapping the id of each event given to a failing handler to the
+        error.
+    """
+    errors = {}
+    for topic_patterns, handler in _outbox_handlers:
+        handler_events = [
+            event for event in get_matching_events(events, topic_patterns) if handler.__name__ not in event.handled
+        ]
+        if not handler_events:
+            continue
+        try:
+            with transaction.atomic():
+                handler(handler_events)
+        except Exception as e:
+            logger.exception(f"Outbox handler {handler.__name__} failed for {len(handler_events)} events")
+            for event in handler_events:
+                errors[event.id] = f"{handler.__name__}: {e!r}"
+        else:
+            for event in handler_events:
+                event.handled.append(handler.__name__)
+    return errors
+
+
+def drain_outbox(batch_size: int = OUTBOX_BATCH_SIZE) -> dict:
+    """
+    Dispatches one batch of pending OutboxEvents, in order, to their handlers
+
+    The batch is locked with `FOR UPDATE SKIP LOCKED`, so several workers can drain the outbox at once without ever
+        waiting on each other or handling the same event concurrently. Events whose handlers succeeded are marked
+        processed, and the others are retried later with an increasing delay. If the worker crashes, the
+        transaction rolls back and the events are simply picked up again.
+
+    Returns the number of events processed and failed.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed=None, available__lte=now, attempts__lt=OUTBOX_MAX_ATTEMPTS)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return {"processed": 0, "failed": 0}
+
+        errors = dispatch_outbox_events(events)
+
+        now = timezone.now()
+        OutboxEvent.objects.filter(id__in=[event.id for event in events if event.id not in errors]).update(
+            processed=now
+        )
+        failed_events = [event for event in events if event.id in errors]
+        for event in failed_events:
+            event.attempts += 1
+            event.last_error = errors[event.id]
+            event.available = now + get_retry_delay(event.attempts)
+        OutboxEvent.objects.bulk_update(failed_events, ["attempts", "handled", "last_error", "available"])
+
+    return {"processed": len(events) - len(failed_events), "failed": len(failed_events)}
+
+
+def purge_outbox(retention: timezone.timedelta = OUTBOX_RETENTION) -> int:
+    """Deletes the events processed longer ago than the retention period, and returns how many were deleted"""
+    deleted, _ = OutboxEvent.objects.filter(processed__lt=timezone.now() - retention).delete()
+    return deleted
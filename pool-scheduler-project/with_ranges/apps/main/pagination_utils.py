@@ -0,0 +1,49 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+# Below this many (estimated) rows, paginators count exactly, as counting is cheap and an estimate would be noticed
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def get_estimated_count(queryset: QuerySet):
+    """
+    Returns the planner's estimate of how many rows a queryset returns, without running it, or None if the table
+        has never been analyzed
+
+    Unfiltered querysets use the table's row estimate in `pg_class`, and filtered ones the row estimate of the
+        query's plan (from EXPLAIN).
+    """
+    if not queryset.query.where:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < 0:
+            return None
+        return row[0]
+
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Paginator that estimates the number of objects of large querysets instead of running `COUNT(*)`, which reads
+        every matching row
+
+    Counts at or above `ESTIMATED_COUNT_THRESHOLD` are approximate, so the last page may be empty or incomplete.
+    """
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        estimate = get_estimated_count(self.object_list)
+        if estimate is None or estimate < ESTIMATED_COUNT_THRESHOLD:
+            return super().count
+        return estimate
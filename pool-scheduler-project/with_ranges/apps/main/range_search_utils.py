@@ -0,0 +1,207 @@
+from apps.main.models import Lane, LaneReservation, Locker, LockerReservation
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+from psycopg2.extras import DateTimeTZRange
+
+# The most windows that one search may ask about
+RANGE_SEARCH_MAX_WINDOWS = 1000
+
+# The most (window, Reservation) matches returned by one search, beyond which the results are truncated
+RANGE_SEARCH_MAX_MATCHES = 10000
+
+# How a Reservation's period must relate to each window to match it, and the range operator testing that
+RANGE_SEARCH_RELATIONS = {
+    "overlaps": "&&",
+    "contains": "@>",
+    "contained_by": "<@",
+}
+
+# Whether cancelled Reservations are searched: not at all, only them, or along with the active ones
+RANGE_SEARCH_CANCELLED_STATES = {
+    "active": "r.cancelled IS NULL",
+    "cancelled": "r.cancelled IS NOT NULL",
+    "any": "TRUE",
+}
+
+
+def get_aware_datetime(value):
+    """Parses an ISO 8601 datetime, in the current timezone if it has none, or returns None if it is invalid"""
+    parsed = parse_datetime(str(value))
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def get_windows_from_json(raw_windows: list) -> list:
+    """
+    Converts a list of dictionaries with ISO 8601 `start` and `end` values into DateTimeTZRanges
+
+    If a window is not properly formatted, raises a ValueError.
+    """
+    windows = []
+    for raw_window in raw_windows:
+        lower = get_aware_datetime(raw_window.get("start", ""))
+        upper = get_aware_datetime(raw_window.get("end", ""))
+        if lower is None or upper is None or not lower < upper:
+            raise ValueError(f"Invalid window: {raw_window}")
+        windows.append(DateTimeTZRange(lower, upper))
+    return windows
+
+
+def get_recurring_windows(first_date, last_date, weekdays: list, start_time, end_time) -> list:
+    """
+    Returns a window from `start_time` until `end_time` (the next day, if it is not later) on each date from
+        `first_date` through `last_date` whose weekday (Monday is 0) is one of `weekdays` (e.g.: every Friday
+        evening of a quarter), in the current timezone
+    """
+    windows = []
+    day = first_date
+    while day <= last_date:
+        if day.weekday() in weekdays:
+            lower = timezone.make_aware(timezone.datetime.combine(day, start_time))
+            upper_day = day if end_time > start_time else day + timezone.timedelta(days=1)
+            upper = timezone.make_aware(timezone.datetime.combine(upper_day, end_time))
+            windows.append(DateTimeTZRange(lower, upper))
+        day += timezone.timedelta(days=1)
+    return windows
+
+
+def get_recurring_windows_from_json(raw_recurrence: dict) -> list:
+    """
+    Converts a dictionary with ISO 8601 `first_date`, `last_date`, `start_time`, and `end_time` values, and a list of
+        `weekdays` (Monday is 0), into windows with `get_recurring_windows()`
+
+    If the recurrence is not properly formatted, raises a ValueError.
+    """
+    first_date = parse_date(str(raw_recurrence.get("first_date", "")))
+    last_date = parse_date(str(raw_recurrence.get("last_date", "")))
+    start_time = parse_time(str(raw_recurrence.get("start_time", "")))
+    end_time = parse_time(str(raw_recurrence.get("end_time", "")))
+    weekdays = {int(weekday) for weekday in raw_recurrence.get("weekdays", range(7))}
+    if None in (first_date, last_date, start_time, end_time) or first_date > last_date or start_time == end_time:
+        raise ValueError(f"Invalid recurrence: {raw_recurrence}")
+    if (last_date - first_date).days > RANGE_SEARCH_MAX_WINDOWS or not weekdays <= set(range(7)):
+        raise ValueError(f"Invalid recurrence: {raw_recurrence}")
+    return get_recurring_windows(first_date, last_date, weekdays, start_time, end_time)
+
+
+def get_id_list(value) -> list:
+    """Converts an id, or a list of ids, into a list of integers. If an id is not an integer, raises a ValueError."""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return [int(item) for item in value]
+
+
+def get_range_search_sql(kind: str, relation: str, cancelled: str, filters: dict) -> str:
+    """
+    Returns the query behind `search_reservation_ranges()`, joining the Reservations against the windows unnested
+        from an array of ranges, so every window is answered by the same index scans in a single query
+    """
+    lane_users_table = LaneReservation.users.through._meta.db_table
+    if kind == "lane":
+        reservation_table, resource_table = LaneReservation._meta.db_table, Lane._meta.db_table
+        resource_column = "lane_id"
+        users_sql = f"ARRAY(SELECT user_id FROM {lane_users_table} WHERE lanereservation_id = r.id ORDER BY user_id)"
+        user_filter_sql = (
+            f"EXISTS (SELECT 1 FROM {lane_users_table} "
+            f"WHERE lanereservation_id = r.id AND user_id = ANY(%(users)s))"
+        )
+    else:
+        reservation_table, resource_table = LockerReservation._meta.db_table, Locker._meta.db_table
+        resource_column = "locker_id"
+        users_sql = "ARRAY[r.user_id]"
+        user_filter_sql = "r.user_id = ANY(%(users)s)"
+
+    where_sql = [RANGE_SEARCH_CANCELLED_STATES[cancelled]]
+    if filters["pools"]:
+        where_sql.append("resource.pool_id = ANY(%(pools)s)")
+    if filters["resources"]:
+        where_sql.append(f"r.{resource_column} = ANY(%(resources)s)")
+    if filters["users"]:
+        where_sql.append(user_filter_sql)
+
+    return f"""
+        SELECT
+            w.ordinality - 1 AS window_index,
+            r.id,
+            resource.pool_id,
+            r.{resource_column},
+            {users_sql} AS users,
+            r.period,
+            r.cancelled
+        FROM unnest(%(windows)s::tstzrange[]) WITH ORDINALITY AS w(search_window, ordinality)
+        JOIN {reservation_table} r ON r.period {RANGE_SEARCH_RELATIONS[relation]} w.search_window
+        JOIN {resource_table} resource ON resource.id = r.{resource_column}
+        WHERE {" AND ".join(where_sql)}
+        ORDER BY w.ordinality, lower(r.period), r.id
+        LIMIT %(limit)s
+    """
+
+
+def search_reservation_ranges(
+    kind: str,
+    windows: list,
+    relation: str = "overlaps",
+    cancelled: str = "active",
+    pools: list = None,
+    resources: list = None,
+    users: list = None,
+) -> dict:
+    """
+    Finds the Lane or Locker Reservations (`kind`) whose periods overlap, contain, or are contained by (`relation`)
+        each of many windows (e.g.: every Friday evening of a quarter) with a single query, optionally only those at
+        the given Pools, Lanes or Lockers (`resources`), or of the given users
+
+    Returns the ids of the Reservations matching each window, in window order, and the details of every matched
+        Reservation once. If there are more than `RANGE_SEARCH_MAX_MATCHES` matches, the last windows' matches are
+        left out and `truncated` is set.
+
+    If the kind, relation, cancelled state, or number of windows is invalid, raises a ValueError.
+    """
+    if kind not in ("lane", "locker"):
+        raise ValueError(f"Invalid type: {kind}")
+    if relation not in RANGE_SEARCH_RELATIONS:
+        raise ValueError(f"Invalid relation: {relation}")
+    if cancelled not in RANGE_SEARCH_CANCELLED_STATES:
+        raise ValueError(f"Invalid cancelled state: {cancelled}")
+    if not 0 < len(windows) <= RANGE_SEARCH_MAX_WINDOWS:
+        raise ValueError(f"Searches must have between 1 and {RANGE_SEARCH_MAX_WINDOWS} windows")
+
+    filters = {"pools": pools or [], "resources": resources or [], "users": users or []}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            get_range_search_sql(kind, relation, cancelled, filters),
+            {"windows": windows, "limit": RANGE_SEARCH_MAX_MATCHES + 1, **filters},
+        )
+        rows = cursor.fetchall()
+
+    truncated = len(rows) > RANGE_SEARCH_MAX_MATCHES
+    window_matches = [[] for window in windows]
+    reservations = {}
+    for window_index, reservation_id, pool_id, resource_id, user_ids, period, cancelled_at in rows[
+        :RANGE_SEARCH_MAX_MATCHES
+    ]:
+        window_matches[window_index].append(reservation_id)
+        reservations[reservation_id] = {
+            "id": reservation_id,
+            "pool": pool_id,
+            kind: resource_id,
+            "users": user_ids,
+            "start": period.lower.isoformat(),
+            "end": period.upper.isoformat(),
+            "cancelled": cancelled_at and cancelled_at.isoformat(),
+        }
+
+    return {
+        "type": kind,
+        "relation": relation,
+        "windows": [
+            {"start": window.lower.isoformat(), "end": window.upper.isoformat(), "reservations": matches}
+            for window, matches in zip(windows, window_matches)
+        ],
+        "reservations": list(reservations.values()),
+        "truncated": truncated,
+    }
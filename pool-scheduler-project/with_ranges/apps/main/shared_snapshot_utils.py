@@ -0,0 +1,298 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+import numpy as np
+from apps.main.models import (
+    Closure,
+    Lane,
+    LaneReservation,
+    Locker,
+    LockerReservation,
+    Pool,
+)
+from apps.main.snapshot_utils import fetch_int64_table
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+logger = logging.getLogger("with_ranges.main")
+
+
+SHARED_SNAPSHOT_MAGIC = b"RSNS"
+SHARED_SNAPSHOT_VERSION = 1
+# Magic, version, and length of the JSON index that follows
+SHARED_SNAPSHOT_HEADER = struct.Struct("<4sII")
+# Each array starts on a multiple of this many bytes, so the int64 arrays can be mapped without copying
+SHARED_SNAPSHOT_ALIGNMENT = 8
+
+# How old a snapshot may be before availability checks read the database instead. `build_shared_snapshot_task`
+#   rebuilds it every minute (see `CELERY_BEAT_SCHEDULE`), so this only trips when the rebuilds stop.
+SHARED_SNAPSHOT_MAX_AGE = timezone.timedelta(minutes=5)
+
+SHARED_SNAPSHOT_MODELS = {
+    "lane": (LaneReservation, Lane),
+    "locker": (LockerReservation, Locker),
+}
+
+
+def get_shared_snapshot_path() -> str:
+    return str(settings.RESERVATION_SNAPSHOT_PATH)
+
+
+def get_shared_snapshot_arrays() -> dict:
+    """
+    Loads the intervals of every Pool from the database into the arrays stored in the shared snapshot file
+
+    For each kind of resource ("lane" and "locker"), sorted by resource id:
+
+    - `{kind}_resource_ids` and `{kind}_pool_ids`, one element per Lane or Locker
+    - `{kind}_offsets`, where the active Reservations of the i-th resource are elements `offsets[i]` through
+        `offsets[i + 1]` of the reservation arrays
+    - `{kind}_starts`, `{kind}_ends` and `{kind}_reservation_resource_ids`, one element per active Reservation,
+        sorted by start within each resource (the exclusion constraints keep them disjoint, so ends are sorted too)
+
+    And for closures, the merged closure periods of each Pool (see `compute_pool_closure_periods()`) in the same
+        layout: `closure_pool_ids`, `closure_offsets`, `closure_starts`, and `closure_ends`.
+
+    All times are int64 epoch seconds.
+    """
+    arrays = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Reads every table from the same database snapshot
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        for kind, (reservation_model, resource_model) in SHARED_SNAPSHOT_MODELS.items():
+            resource_column = reservation_model._meta.get_field(resource_model._meta.model_name).column
+            cursor.execute(f"SELECT id, pool_id FROM {resource_model._meta.db_table} ORDER BY id")
+            resources = fetch_int64_table(cursor, 2)
+            cursor.execute(
+                f"""
+                SELECT
+                    reservation.{resource_column},
+                    extract(epoch FROM lower(reservation.period))::bigint,
+                    extract(epoch FROM upper(reservation.period))::bigint
+                FROM {reservation_model._meta.db_table} reservation
+                WHERE reservation.cancelled IS NULL
+                    AND NOT lower_inf(reservation.period)
+                    AND NOT upper_inf(reservation.period)
+                ORDER BY reservation.{resource_column}, lower(reservation.period)
+                """
+            )
+            reservations = fetch_int64_table(cursor, 3)
+            arrays[f"{kind}_resource_ids"] = resources[:, 0].copy()
+            arrays[f"{kind}_pool_ids"] = resources[:, 1].copy()
+            arrays[f"{kind}_offsets"] = get_offsets(resources[:, 0], reservations[:, 0])
+            arrays[f"{kind}_reservation_resource_ids"] = reservations[:, 0].copy()
+            arrays[f"{kind}_starts"] = reservations[:, 1].copy()
+            arrays[f"{kind}_ends"] = reservations[:, 2].copy()
+
+        cursor.execute(f"SELECT id FROM {Pool._meta.db_table} ORDER BY id")
+        pool_ids = fetch_int64_table(cursor, 1)[:, 0]
+        cursor.execute(
+            f"""
+            SELECT
+                merged.pool_id,
+                extract(epoch FROM lower(merged.dates)::timestamptz)::bigint,
+                extract(epoch FROM upper(merged.dates)::timestamptz)::bigint
+            FROM (
+                SELECT closure.pool_id, unnest(range_agg(closure.dates)) AS dates
+                FROM {Closure._meta.db_table} closure
+                GROUP BY closure.pool_id
+            ) merged
+            ORDER BY merged.pool_id, lower(merged.dates)
+            """
+        )
+        closures = fetch_int64_table(cursor, 3)
+        arrays["closure_pool_ids"] = pool_ids.copy()
+        arrays["closure_offsets"] = get_offsets(pool_ids, closures[:, 0])
+        arrays["closure_starts"] = closures[:, 1].copy()
+        arrays["closure_ends"] = closures[:, 2].copy()
+    return arrays
+
+
+def get_offsets(owner_ids: np.ndarray, item_owner_ids: np.ndarray) -> np.ndarray:
+    """
+    Returns the offsets of each owner's items within the items, given the sorted ids of the owners and the sorted
+        owner id of each item
+    """
+    return np.searchsorted(item_owner_ids, np.append(owner_ids, np.iinfo(np.int64).max)).astype(np.int64)
+
+
+def write_shared_snapshot_file(path: str, arrays: dict, built_at: float):
+    """
+    Writes the arrays to a snapshot file at `path`, replacing any existing file atomically
+
+    The file is written under a temporary name in the same directory and renamed over `path`, so readers only
+        ever map a complete file. Workers that still map the previous file keep reading it until they next check
+        for a new one.
+    """
+    index = {"built_at": built_at, "arrays": {}}
+    offset = 0
+    for name, array in arrays.items():
+        index["arrays"][name] = [offset, array.dtype.str, len(array)]
+        offset += -(-array.nbytes // SHARED_SNAPSHOT_ALIGNMENT) * SHARED_SNAPSHOT_ALIGNMENT
+
+    index_bytes = json.dumps(index).encode()
+    header_length = SHARED_SNAPSHOT_HEADER.size + len(index_bytes)
+    padding = -header_length % SHARED_SNAPSHOT_ALIGNMENT
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=".reservation_snapshot.", delete=False) as temporary:
+        try:
+            temporary.write(
+                SHARED_SNAPSHOT_HEADER.pack(SHARED_SNAPSHOT_MAGIC, SHARED_SNAPSHOT_VERSION, len(index_bytes))
+            )
+            temporary.write(index_bytes)
+            temporary.write(b"\0" * padding)
+            for array in arrays.values():
+                temporary.write(np.ascontiguousarray(array).tobytes())
+                temporary.write(b"\0" * (-array.nbytes % SHARED_SNAPSHOT_ALIGNMENT))
+            temporary.flush()
+            os.fsync(temporary.fileno())
+            os.chmod(temporary.name, 0o644)
+            os.replace(temporary.name, path)
+        except BaseException:
+            os.unlink(temporary.name)
+            raise
+
+
+def build_shared_snapshot(path: str = None) -> dict:
+    """
+    Builds the shared snapshot file from the database (see `get_shared_snapshot_arrays()`), returning the number
+        of elements of each array
+    """
+    path = path or get_shared_snapshot_path()
+    built_at = timezone.now().timestamp()
+    arrays = get_shared_snapshot_arrays()
+    write_shared_snapshot_file(path, arrays, built_at)
+    logger.info(f"Built the shared Reservation snapshot at {path}")
+    return {name: len(array) for name, array in arrays.items()}
+
+
+class SharedReservationSnapshot:
+    """
+    A read-only view of a shared snapshot file, mapped into memory so every worker process shares the same pages
+
+    The arrays are NumPy views directly onto the mapping, so opening a snapshot costs no copies no matter how
+        many Reservations it holds. Lookups reflect the database as of `built_at`, so they suit fast availability
+        hints, while the database constraints stay the authority when booking.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as snapshot_file:
+            self.stat = os.fstat(snapshot_file.fileno())
+            self.mapping = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_length = SHARED_SNAPSHOT_HEADER.unpack_from(self.mapping)
+        if magic != SHARED_SNAPSHOT_MAGIC or version != SHARED_SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a version {SHARED_SNAPSHOT_VERSION} Reservation snapshot")
+
+        index = json.loads(self.mapping[SHARED_SNAPSHOT_HEADER.size : SHARED_SNAPSHOT_HEADER.size + index_length])
+        data_offset = SHARED_SNAPSHOT_HEADER.size + index_length
+        data_offset += -data_offset % SHARED_SNAPSHOT_ALIGNMENT
+        self.built_at = timezone.datetime.fromtimestamp(index["built_at"], tz=timezone.utc)
+        self.arrays = {
+            name: np.frombuffer(self.mapping, dtype=np.dtype(dtype), count=count, offset=data_offset + offset)
+            for name, (offset, dtype, count) in index["arrays"].items()
+        }
+
+    def get_intervals(self, prefix: str, owner_key: str, owner_id: int) -> tuple:
+        """Returns the starts and ends of one resource's Reservations (or one Pool's closures), or None"""
+        owner_ids = self.arrays[f"{prefix}_{owner_key}"]
+        index = int(np.searchsorted(owner_ids, owner_id))
+        if index == len(owner_ids) or owner_ids[index] != owner_id:
+            return None
+        offsets = self.arrays[f"{prefix}_offsets"]
+        lower, upper = offsets[index], offsets[index + 1]
+        return self.arrays[f"{prefix}_starts"][lower:upper], self.arrays[f"{prefix}_ends"][lower:upper]
+
+    @staticmethod
+    def overlaps(intervals: tuple, period: DateTimeTZRange) -> bool:
+        # The intervals are disjoint and sorted, so only the last one starting before the period ends can overlap it
+        starts, ends = intervals
+        index = int(np.searchsorted(starts, period.upper.timestamp()))
+        return index > 0 and ends[index - 1] > period.lower.timestamp()
+
+    def get_pool_id(self, kind: str, resource_id: int):
+        resource_ids = self.arrays[f"{kind}_resource_ids"]
+        index = int(np.searchsorted(resource_ids, resource_id))
+        if index == len(resource_ids) or resource_ids[index] != resource_id:
+            return None
+        return int(self.arrays[f"{kind}_pool_ids"][index])
+
+    def is_pool_closed(self, pool_id: int, period: DateTimeTZRange) -> bool:
+        """Returns whether the Pool is closed at any point during the period"""
+        intervals = self.get_intervals("closure", "pool_ids", pool_id)
+        return intervals is not None and self.overlaps(intervals, period)
+
+    def is_reserved(self, kind: str, resource_id: int, period: DateTimeTZRange):
+        """
+        Returns whether a Lane or Locker (depending on `kind`) has an active Reservation during the period, or None
+            if the resource is not in the snapshot
+        """
+        intervals = self.get_intervals(kind, "resource_ids", resource_id)
+        return None if intervals is None else self.overlaps(intervals, period)
+
+    def is_available(self, kind: str, resource_id: int, period: DateTimeTZRange) -> bool:
+        """
+        Returns whether a Lane or Locker (depending on `kind`) exists, its Pool is open, and it has no active
+            Reservation during the period
+        """
+        intervals = self.get_intervals(kind, "resource_ids", resource_id)
+        if intervals is None or self.overlaps(intervals, period):
+            return False
+        return not self.is_pool_closed(self.get_pool_id(kind, resource_id), period)
+
+    def get_available_resource_ids(self, kind: str, pool_id: int, period: DateTimeTZRange) -> list:
+        """
+        Returns the ids of the Lanes or Lockers (depending on `kind`) of a Pool that have no active Reservation
+            during the period, or an empty list if the Pool is closed
+        """
+        if self.is_pool_closed(pool_id, period):
+            return []
+        resource_ids = self.arrays[f"{kind}_resource_ids"][self.arrays[f"{kind}_pool_ids"] == pool_id]
+        busy = (self.arrays[f"{kind}_starts"] < period.upper.timestamp()) & (
+            self.arrays[f"{kind}_ends"] > period.lower.timestamp()
+        )
+        busy_resource_ids = self.arrays[f"{kind}_reservation_resource_ids"][busy]
+        return [int(resource_id) for resource_id in resource_ids[~np.isin(resource_ids, busy_resource_ids)]]
+
+
+_shared_snapshot = None
+_shared_snapshot_lock = threading.Lock()
+
+
+def get_shared_snapshot():
+    """
+    Returns the shared snapshot mapped by this process, remapping it when a newer file has been swapped in, or
+        None if no snapshot has been built yet
+    """
+    global _shared_snapshot
+    path = get_shared_snapshot_path()
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    with _shared_snapshot_lock:
+        snapshot = _shared_snapshot
+        if snapshot is None or (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+            snapshot = _shared_snapshot = SharedReservationSnapshot(path)
+        return snapshot
+
+
+def get_fresh_shared_snapshot():
+    """
+    Returns the shared snapshot (see `get_shared_snapshot()`) if it was built within `SHARED_SNAPSHOT_MAX_AGE`, or
+        None, in which case callers read the database instead
+    """
+    snapshot = get_shared_snapshot()
+    if snapshot is None or timezone.now() - snapshot.built_at > SHARED_SNAPSHOT_MAX_AGE:
+        return None
+    return snapshot
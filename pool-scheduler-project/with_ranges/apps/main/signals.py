@@ -0,0 +1,19 @@
+from apps.main.availability_utils import get_pool_closure_periods_cache_key
+from apps.main.models import Closure
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+@receiver([post_save, post_delete], sender=Closure)
+def clear_pool_closure_periods(sender, instance, **kwargs):
+    """
+    Clears the cached merged closure periods of the Closure's Pool whenever one of its Closures changes
+
+    The cache is cleared again once the transaction commits, in case the periods were re-cached from within the
+        transaction in the meantime.
+    """
+    cache_key = get_pool_closure_periods_cache_key(instance.pool_id)
+    cache.delete(cache_key)
+    transaction.on_commit(lambda: cache.delete(cache_key))
@@ -0,0 +1,188 @@
+import logging
+
+from apps.main.models import Closure, Lane, LaneReservation, LaneSlot, Pool
+from apps.main.shared_snapshot_utils import get_fresh_shared_snapshot
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+logger = logging.getLogger("with_ranges.main")
+
+
+# The length of each LaneSlot, matching the 30-minute granularity of LaneReservation periods (see
+#   `DateTimeRangeLowerMinuteValidator(0, 30)`)
+LANE_SLOT_LENGTH = timezone.timedelta(minutes=30)
+
+# How many days of LaneSlots `generate_lane_slots_task` keeps generated ahead of today
+LANE_SLOT_DAYS_AHEAD = 120
+
+
+def get_lane_slot_count(period: DateTimeTZRange) -> int:
+    """
+    Returns the number of LaneSlots covering the period
+
+    Raises a ValidationError unless the period is bounded, starts before it ends, and both ends fall on a slot
+        boundary.
+    """
+    if period.lower is None or period.upper is None or not period.lower < period.upper:
+        raise ValidationError("Reservation period must have a start before its end")
+    for value in (period.lower, period.upper):
+        if value.minute % 30 or value.second or value.microsecond:
+            raise ValidationError("Reservation period must start and end on the hour or half-hour")
+    return (period.upper - period.lower) // LANE_SLOT_LENGTH
+
+
+def generate_lane_slots(pool: Pool, first_date: timezone.datetime.date, last_date: timezone.datetime.date) -> dict:
+    """
+    Generates the LaneSlots of every Lane of a Pool for each of its business hours from `first_date` through
+        `last_date`, except on days within one of the Pool's Closures, using one INSERT statement
+
+    Slots that already exist are left untouched, and new slots covered by an active LaneReservation are created
+        claimed by it. From then on, slots are claimed and released as LaneReservations are written, by the triggers
+        of migration 0011. Free slots on days that have since been closed are deleted. Re-running the same dates is
+        harmless.
+
+    Returns the number of slots created and deleted.
+    """
+    params = {
+        "pool_id": pool.id,
+        "first_date": first_date,
+        "last_date": last_date,
+        "open_hour": pool.business_hours.lower,
+        "close_hour": pool.business_hours.upper,
+        "slot_length": LANE_SLOT_LENGTH,
+    }
+    slot_table = LaneSlot._meta.db_table
+    reservation_table = LaneReservation._meta.db_table
+    # A slot is open when its day is not within any of the Pool's Closures
+    closed_sql = f"""
+        EXISTS (
+            SELECT 1
+            FROM {Closure._meta.db_table} closure
+            WHERE closure.pool_id = %(pool_id)s AND closure.dates @> {{slot_start}}::date
+        )
+    """
+
+    results = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {slot_table} (lane_id, start, lane_reservation_id)
+            SELECT
+                lane.id,
+                slot.slot_start,
+                (
+                    SELECT reservation.id
+                    FROM {reservation_table} reservation
+                    WHERE reservation.lane_id = lane.id
+                        AND reservation.cancelled IS NULL
+                        AND reservation.period && tstzrange(slot.slot_start, slot.slot_start + %(slot_length)s)
+                    ORDER BY lower(reservation.period)
+                    LIMIT 1
+                )
+            FROM {Lane._meta.db_table} lane
+            CROSS JOIN generate_series(
+                %(first_date)s::date::timestamptz + make_interval(hours => %(open_hour)s),
+                %(last_date)s::date::timestamptz + make_interval(hours => %(close_hour)s) - %(slot_length)s,
+                %(slot_length)s
+            ) AS slot(slot_start)
+            WHERE lane.pool_id = %(pool_id)s
+                AND slot.slot_start::time >= make_time(%(open_hour)s, 0, 0)
+                AND slot.slot_start + %(slot_length)s <= slot.slot_start::date + make_interval(hours => %(close_hour)s)
+                AND NOT {closed_sql.format(slot_start="slot.slot_start")}
+            ON CONFLICT (lane_id, start) DO NOTHING
+            """,
+            params,
+        )
+        results["created"] = cursor.rowcount
+
+        cursor.execute(
+            f"""
+            DELETE FROM {slot_table} slot
+            USING {Lane._meta.db_table} lane
+            WHERE slot.lane_id = lane.id
+                AND lane.pool_id = %(pool_id)s
+                AND slot.start >= %(first_date)s::date::timestamptz
+                AND slot.start < %(last_date)s::date::timestamptz + interval '1 day'
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM {reservation_table} reservation
+                    WHERE reservation.id = slot.lane_reservation_id AND reservation.cancelled IS NULL
+                )
+                AND {closed_sql.format(slot_start="slot.start")}
+            """,
+            params,
+        )
+        results["deleted"] = cursor.rowcount
+
+    logger.info(f"Generated Lane Slots for {pool} from {first_date} through {last_date}: {results}")
+    return results
+
+
+def claim_lane_slots(pool: Pool, period: DateTimeTZRange, users: list = ()):
+    """
+    Reserves a Lane in a Pool for the period and users by claiming the Lane's contiguous LaneSlots, returning the
+        new LaneReservation, or None if no Lane of the Pool has all of the slots free
+
+    Raises a ValidationError if the period does not line up with the slots (see `get_lane_slot_count()`).
+
+    This is the booking path for high contention (e.g.: when registration for summer lessons opens). Candidate
+        Lanes are found among the free slots, then within a savepoint each candidate's Lane row is locked with
+        `SELECT ... FOR NO KEY UPDATE SKIP LOCKED`, before its slots are locked with `SELECT ... FOR UPDATE SKIP
+        LOCKED`. The Lane lock guards the whole set of slots, so concurrent claims for the same period never each
+        lock part of a Lane's slots and both give it up: exactly one of them goes on to lock the slots, and the
+        others move on to the next Lane without waiting or aborting on `excl_overlap_lane_res`. A claim that still
+        can't lock all of a Lane's slots (e.g.: while a Reservation is being moved onto them) releases the ones it
+        got and moves on too. Closed days and hours outside of business hours have no slots, so they can't be
+        claimed.
+    """
+    slot_count = get_lane_slot_count(period)
+    free_slots = LaneSlot.objects.free().filter(
+        lane__pool=pool,
+        lane__max_swimmers__gte=max(len(users), 1),
+        start__gte=period.lower,
+        start__lt=period.upper,
+    )
+    candidate_lane_ids = list(
+        free_slots.order_by()
+        .values("lane_id")
+        .annotate(free_count=Count("id"))
+        .filter(free_count=slot_count)
+        .order_by("lane_id")
+        .values_list("lane_id", flat=True)
+    )
+    # Candidates that the shared snapshot has free are tried first, since a Lane whose slots haven't been generated
+    #   yet for a Reservation would only fail on `excl_overlap_lane_res`. The snapshot may be stale, so none are
+    #   skipped.
+    snapshot = get_fresh_shared_snapshot()
+    if snapshot is not None:
+        candidate_lane_ids.sort(key=lambda lane_id: bool(snapshot.is_reserved("lane", lane_id, period)))
+
+    with transaction.atomic():
+        for lane_id in candidate_lane_ids:
+            try:
+                with transaction.atomic():
+                    # `NO KEY` still lets other transactions insert LaneReservations referencing the Lane
+                    if not Lane.objects.filter(id=lane_id).select_for_update(skip_locked=True, no_key=True).exists():
+                        raise IntegrityError(f"Lane {lane_id} is being claimed concurrently")
+
+                    slot_ids = list(
+                        free_slots.filter(lane_id=lane_id)
+                        .select_for_update(skip_locked=True, of=("self",))
+                        .values_list("id", flat=True)
+                    )
+                    if len(slot_ids) < slot_count:
+                        # Rolling back the savepoint releases the slots locked so far
+                        raise IntegrityError(f"Lane {lane_id} has slots claimed concurrently")
+
+                    # The locked slots are claimed by the insert's trigger (see migration 0011). A LaneReservation
+                    #   made within a concurrent transaction that hasn't committed yet may still conflict.
+                    lane_reservation = LaneReservation.objects.create(lane_id=lane_id, period=period)
+                    lane_reservation.users.add(*users)
+                    return lane_reservation
+            except IntegrityError as e:
+                logger.info(f"Could not claim Lane Slots: {e}")
+
+    return None
@@ -0,0 +1,225 @@
+import logging
+import threading
+
+import numpy as np
+from apps.main.change_feed_utils import get_settled_change_seq
+from apps.main.models import Lane, LaneReservation, Locker, LockerReservation
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger("with_ranges.main")
+
+
+# Stands in for a missing (NULL or unbounded) epoch in the int64 columns, such as the `actual` period of a
+#   Reservation the user hasn't checked in to
+NULL_EPOCH = np.iinfo(np.int64).min
+
+# How many rows are converted to arrays at a time while loading, so the Python tuples fetched from the cursor never
+#   number more than this
+SNAPSHOT_FETCH_SIZE = 10000
+
+SNAPSHOT_MODELS = {
+    "lane": (LaneReservation, Lane),
+    "locker": (LockerReservation, Locker),
+}
+
+
+def fetch_int64_table(cursor, column_count: int) -> np.ndarray:
+    """
+    Fetches the rows of an executed query with `column_count` integer (or boolean) columns into a 2-dimensional
+        int64 array, converting `SNAPSHOT_FETCH_SIZE` rows at a time
+    """
+    chunks = [np.empty((0, column_count), dtype=np.int64)]
+    while rows := cursor.fetchmany(SNAPSHOT_FETCH_SIZE):
+        chunks.append(np.array(rows, dtype=np.int64).reshape(-1, column_count))
+    return np.concatenate(chunks)
+
+
+class ReservationSnapshot:
+    """
+    A columnar in-memory copy of one Pool's Lane or Locker Reservations (including cancelled ones), sorted by id
+
+    Each column is a NumPy array with one element per Reservation, so a year of Reservations takes a few dozen
+        bytes each instead of a model instance each:
+
+    - `ids`, `resource_ids` (the Lane or Locker), and `cancelled` (bool)
+    - `starts` and `ends` of the period, and `actual_starts` and `actual_ends` of the actual usage period, as
+        int64 epoch seconds (NULL_EPOCH where missing)
+
+    `refresh()` brings the arrays up to date incrementally, using the change sequence of the rows as a cursor (see
+        `refresh()`).
+    """
+
+    columns = ("ids", "resource_ids", "starts", "ends", "cancelled", "actual_starts", "actual_ends")
+
+    def __init__(self, kind: str, pool_id: int):
+        self.kind = kind
+        self.pool_id = pool_id
+        self.reservation_model, self.resource_model = SNAPSHOT_MODELS[kind]
+        self.cursor = None
+        self.lock = threading.Lock()
+        self.set_columns(self.get_empty_columns())
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def get_empty_columns() -> dict:
+        return {
+            "ids": np.empty(0, dtype=np.int64),
+            "resource_ids": np.empty(0, dtype=np.int64),
+            "starts": np.empty(0, dtype=np.int64),
+            "ends": np.empty(0, dtype=np.int64),
+            "cancelled": np.empty(0, dtype=bool),
+            "actual_starts": np.empty(0, dtype=np.int64),
+            "actual_ends": np.empty(0, dtype=np.int64),
+        }
+
+    def set_columns(self, columns: dict):
+        for name in self.columns:
+            setattr(self, name, columns[name])
+
+    def get_rows_sql(self, changed_only: bool) -> str:
+        resource_column = self.reservation_model._meta.get_field(self.resource_model._meta.model_name).column
+        changed_sql = "AND reservation.change_seq >= %(cursor)s" if changed_only else ""
+        return f"""
+            SELECT
+                reservation.id,
+                reservation.{resource_column},
+                coalesce(extract(epoch FROM lower(reservation.period))::bigint, %(null_epoch)s),
+                coalesce(extract(epoch FROM upper(reservation.period))::bigint, %(null_epoch)s),
+                reservation.cancelled IS NOT NULL,
+                coalesce(extract(epoch FROM lower(reservation.actual))::bigint, %(null_epoch)s),
+                coalesce(extract(epoch FROM upper(reservation.actual))::bigint, %(null_epoch)s)
+            FROM {self.reservation_model._meta.db_table} reservation
+            JOIN {self.resource_model._meta.db_table} resource ON resource.id = reservation.{resource_column}
+            WHERE resource.pool_id = %(pool_id)s {changed_sql}
+            ORDER BY reservation.id
+        """
+
+    def fetch_columns(self, cursor, changed_only: bool) -> dict:
+        """Fetches the Pool's Reservations (or only those changed since the cursor) into a dictionary of columns"""
+        cursor.execute(
+            self.get_rows_sql(changed_only),
+            {"pool_id": self.pool_id, "cursor": self.cursor, "null_epoch": int(NULL_EPOCH)},
+        )
+        table = fetch_int64_table(cursor, len(self.columns))
+        if not len(table):
+            return self.get_empty_columns()
+
+        columns = {name: table[:, index].copy() for index, name in enumerate(self.columns)}
+        columns["cancelled"] = columns["cancelled"].astype(bool)
+        return columns
+
+    def refresh(self):
+        """
+        Brings the snapshot up to date with the database
+
+        The first refresh loads every Reservation. Later refreshes only fetch the rows inserted or updated by
+            transactions that were still running or had not started when the previous refresh began (see
+            `get_settled_change_seq()`), and merge them in by id. Deleted rows are detected by comparing row
+            counts, in which case the remaining ids are fetched to drop the deleted ones.
+        """
+        with self.lock, connection.cursor() as cursor:
+            next_cursor = get_settled_change_seq()
+
+            if self.cursor is None:
+                self.set_columns(self.fetch_columns(cursor, changed_only=False))
+                self.cursor = next_cursor
+                logger.debug(f"Loaded {len(self)} {self.kind} Reservations of Pool {self.pool_id} into a snapshot")
+                return
+
+            changed = self.fetch_columns(cursor, changed_only=True)
+            self.cursor = next_cursor
+            if len(changed["ids"]):
+                kept = ~np.isin(self.ids, changed["ids"])
+                merged = {name: np.concatenate((getattr(self, name)[kept], changed[name])) for name in self.columns}
+                order = np.argsort(merged["ids"], kind="stable")
+                self.set_columns({name: column[order] for name, column in merged.items()})
+
+            resource_column = self.reservation_model._meta.get_field(self.resource_model._meta.model_name).column
+            cursor.execute(
+                f"""
+                SELECT count(*)
+                FROM {self.reservation_model._meta.db_table} reservation
+                JOIN {self.resource_model._meta.db_table} resource ON resource.id = reservation.{resource_column}
+                WHERE resource.pool_id = %s
+                """,
+                [self.pool_id],
+            )
+            if cursor.fetchone()[0] != len(self):
+                cursor.execute(
+                    f"""
+                    SELECT reservation.id
+                    FROM {self.reservation_model._meta.db_table} reservation
+                    JOIN {self.resource_model._meta.db_table} resource
+                        ON resource.id = reservation.{resource_column}
+                    WHERE resource.pool_id = %s
+                    """,
+                    [self.pool_id],
+                )
+                existing_ids = np.fromiter((row[0] for row in cursor), dtype=np.int64)
+                kept = np.isin(self.ids, existing_ids)
+                self.set_columns({name: getattr(self, name)[kept] for name in self.columns})
+
+    def get_active(self) -> np.ndarray:
+        """Returns the mask of the Reservations that are not cancelled"""
+        return ~self.cancelled
+
+    def get_durations(self) -> np.ndarray:
+        """Returns the length of each Reservation's period, in seconds"""
+        return self.ends - self.starts
+
+    def get_average_length(self):
+        """Returns the average length of the active Reservations' periods, or None if there are none"""
+        durations = self.get_durations()[self.get_active()]
+        if not len(durations):
+            return None
+        return timezone.timedelta(seconds=float(durations.mean()))
+
+    def get_average_actual_length(self):
+        """Returns the average length of actual usage of the active Reservations checked in and out"""
+        used = self.get_active() & (self.actual_starts != NULL_EPOCH) & (self.actual_ends != NULL_EPOCH)
+        if not used.any():
+            return None
+        return timezone.timedelta(seconds=float((self.actual_ends[used] - self.actual_starts[used]).mean()))
+
+    def get_ids_longer_than(self, threshold: timezone.timedelta) -> np.ndarray:
+        """Returns the ids of the active Reservations whose period is longer than the threshold"""
+        return self.ids[self.get_active() & (self.get_durations() > threshold.total_seconds())]
+
+    def get_utilization(self, window_start: timezone.datetime, window_end: timezone.datetime) -> dict:
+        """
+        Returns the fraction (0 to 1) of the window during which each Lane or Locker is reserved, keyed by its id
+
+        Only the Lanes or Lockers with at least one active Reservation in the snapshot are included.
+        """
+        lower = int(window_start.timestamp())
+        upper = int(window_end.timestamp())
+        if upper <= lower:
+            return {}
+
+        active = self.get_active()
+        booked = np.clip(self.ends[active], lower, upper) - np.clip(self.starts[active], lower, upper)
+        resource_ids, resource_indexes = np.unique(self.resource_ids[active], return_inverse=True)
+        booked_totals = np.bincount(resource_indexes, weights=booked, minlength=len(resource_ids))
+        return {
+            int(resource_id): float(total) / (upper - lower) for resource_id, total in zip(resource_ids, booked_totals)
+        }
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_reservation_snapshot(kind: str, pool_id: int) -> ReservationSnapshot:
+    """
+    Returns this process's snapshot of a Pool's Lane or Locker Reservations (`kind` is "lane" or "locker"),
+        refreshed incrementally from the database
+    """
+    with _snapshots_lock:
+        snapshot = _snapshots.get((kind, pool_id))
+        if snapshot is None:
+            snapshot = _snapshots[(kind, pool_id)] = ReservationSnapshot(kind, pool_id)
+    snapshot.refresh()
+    return snapshot
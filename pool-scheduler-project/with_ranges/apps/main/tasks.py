@@ -1,6 +1,104 @@
+import time
+
+from apps.main.billing_utils import get_billing_month, run_invoices
+from apps.main.closure_utils import get_closure_notification_messages
+from apps.main.models import Closure, Pool
+from apps.main.occupancy_utils import recompute_occupancy
+from apps.main.outbox_utils import (
+    OUTBOX_BATCH_SIZE,
+    drain_outbox,
+    get_invoice_refresh_queued_cache_key,
+    purge_outbox,
+)
+from apps.main.shared_snapshot_utils import build_shared_snapshot
+from apps.main.slot_utils import LANE_SLOT_DAYS_AHEAD, generate_lane_slots
 from celery import shared_task
+from django.core.cache import cache
+from django.core.mail import get_connection, send_mass_mail
+from django.utils import timezone
+
+# The number of emails sent over one SMTP connection by `notify_closure_affected_users_task`
+CLOSURE_NOTIFICATION_BATCH_SIZE = 100
+
+# How long (in seconds) one run of `drain_outbox_task` keeps draining batches, so runs don't pile up
+OUTBOX_DRAIN_TIME_LIMIT = 50
 
 
 @shared_task
 def add(x, y):
     return x + y
+
+
+@shared_task
+def run_invoices_task(month_string=None, full=False):
+    """
+    Bills one month ("YYYY-MM", defaulting to the previous month) for all users, only for the Reservations changed
+        since its previous run unless `full` (see `run_invoices()`)
+    """
+    month = get_billing_month(month_string)
+    # Changes from here on queue another refresh of the month (see `refresh_invoices()`)
+    cache.delete(get_invoice_refresh_queued_cache_key(month))
+    return run_invoices(month, full=full)
+
+
+@shared_task
+def notify_closure_affected_users_task(
+    closure_id,
+    lane_reservation_ids,
+    locker_reservation_ids,
+    rebooked_lane_reservation_ids=(),
+    rebooked_locker_reservation_ids=(),
+):
+    """Emails each user affected by an applied Closure once, sending the emails in batches"""
+    closure = Closure.objects.select_related("pool").get(id=closure_id)
+    messages = get_closure_notification_messages(
+        closure,
+        lane_reservation_ids,
+        locker_reservation_ids,
+        rebooked_lane_reservation_ids,
+        rebooked_locker_reservation_ids,
+    )
+    connection = get_connection()
+    for index in range(0, len(messages), CLOSURE_NOTIFICATION_BATCH_SIZE):
+        send_mass_mail(messages[index : index + CLOSURE_NOTIFICATION_BATCH_SIZE], connection=connection)
+    return len(messages)
+
+
+@shared_task
+def generate_lane_slots_task(days_ahead=LANE_SLOT_DAYS_AHEAD):
+    """Keeps the LaneSlots of every Pool generated from today through `days_ahead` days from now"""
+    first_date = timezone.now().date()
+    last_date = first_date + timezone.timedelta(days=days_ahead)
+    return {pool.id: generate_lane_slots(pool, first_date, last_date) for pool in Pool.objects.all()}
+
+
+@shared_task
+def build_shared_snapshot_task():
+    """Rebuilds the shared Reservation snapshot file that worker processes map into memory"""
+    return build_shared_snapshot()
+
+
+@shared_task
+def recompute_occupancy_task():
+    """Corrects any drift of the live Lane and Pool occupancy counters"""
+    return recompute_occupancy()
+
+
+@shared_task
+def drain_outbox_task():
+    """Dispatches pending OutboxEvents in batches until none are left or the time limit is reached"""
+    started = time.monotonic()
+    results = {"processed": 0, "failed": 0}
+    while time.monotonic() - started < OUTBOX_DRAIN_TIME_LIMIT:
+        batch_results = drain_outbox()
+        results["processed"] += batch_results["processed"]
+        results["failed"] += batch_results["failed"]
+        if batch_results["processed"] + batch_results["failed"] < OUTBOX_BATCH_SIZE:
+            break
+    return results
+
+
+@shared_task
+def purge_outbox_task():
+    """Deletes old processed OutboxEvents"""
+    return purge_outbox()
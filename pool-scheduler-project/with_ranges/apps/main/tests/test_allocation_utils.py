@@ -0,0 +1,140 @@
+from unittest import mock
+
+from apps.main.allocation_utils import (
+    LaneRequest,
+    allocate_locker,
+    pack_lane_requests,
+    validate_lane_request,
+)
+from apps.main.models import Locker, LockerReservation, Pool
+from apps.main.views.lane_reservation_views import get_lane_requests_from_json
+from apps.users.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange, NumericRange
+
+
+def get_period(start_hour, end_hour):
+    day = timezone.datetime(2026, 11, 2, tzinfo=timezone.utc)
+    return DateTimeTZRange(day + timezone.timedelta(hours=start_hour), day + timezone.timedelta(hours=end_hour))
+
+
+class TestPackLaneRequests(SimpleTestCase):
+    def test_back_to_back_requests_share_a_lane(self):
+        lane_requests = [LaneRequest(get_period(hour, hour + 1), 2) for hour in range(6, 12)]
+        assignments, unassigned = pack_lane_requests(lane_requests, [(1, 6), (2, 6)], {})
+        self.assertEqual(set(assignments.values()), {1})
+        self.assertEqual(unassigned, [])
+
+    def test_overlapping_requests_use_separate_lanes(self):
+        lane_requests = [LaneRequest(get_period(6, 8), 2), LaneRequest(get_period(7, 9), 2)]
+        assignments, unassigned = pack_lane_requests(lane_requests, [(1, 6), (2, 6), (3, 6)], {})
+        self.assertEqual(len(set(assignments.values())), 2)
+
+    def test_minimizes_lanes_used(self):
+        # Two chains of back-to-back requests, interleaved in the input, fit in exactly two Lanes
+        lane_requests = []
+        for hour in range(6, 16, 2):
+            lane_requests.append(LaneRequest(get_period(hour, hour + 2), 1))
+            lane_requests.append(LaneRequest(get_period(hour + 1, hour + 3), 1))
+        assignments, unassigned = pack_lane_requests(lane_requests, [(lane_id, 6) for lane_id in range(1, 9)], {})
+        self.assertEqual(len(set(assignments.values())), 2)
+        self.assertEqual(unassigned, [])
+
+    def test_respects_max_swimmers(self):
+        lane_requests = [LaneRequest(get_period(6, 7), 5), LaneRequest(get_period(7, 8), 2)]
+        assignments, unassigned = pack_lane_requests(lane_requests, [(1, 2), (2, 8)], {})
+        self.assertEqual(assignments[0], 2)
+        # The small request reuses the large Lane rather than opening another
+        self.assertEqual(assignments[1], 2)
+
+        assignments, unassigned = pack_lane_requests([LaneRequest(get_period(6, 7), 9)], [(1, 2), (2, 8)], {})
+        self.assertEqual(assignments, {})
+        self.assertEqual(unassigned, [0])
+
+    def test_opens_smallest_sufficient_lane(self):
+        assignments, unassigned = pack_lane_requests([LaneRequest(get_period(6, 7), 3)], [(1, 8), (2, 4), (3, 2)], {})
+        self.assertEqual(assignments, {0: 2})
+
+    def test_respects_existing_reservations(self):
+        reserved_periods = {1: [get_period(9, 10), get_period(6, 8)]}
+        lane_requests = [LaneRequest(get_period(7, 9), 1), LaneRequest(get_period(8, 9), 1)]
+        assignments, unassigned = pack_lane_requests(lane_requests, [(1, 6), (2, 6)], reserved_periods)
+        self.assertEqual(assignments, {0: 2, 1: 1})
+
+        assignments, unassigned = pack_lane_requests([LaneRequest(get_period(7, 9), 1)], [(1, 6)], reserved_periods)
+        self.assertEqual(unassigned, [0])
+
+
+class TestValidateLaneRequest(SimpleTestCase):
+    def test_valid_request(self):
+        validate_lane_request(LaneRequest(get_period(6, 8), 2, (1, 2)))
+
+    def test_period_must_fit_the_reservation_period_validators(self):
+        day = timezone.datetime(2026, 11, 2, 6, tzinfo=timezone.utc)
+        for period in (
+            get_period(8, 6),
+            DateTimeTZRange(day + timezone.timedelta(minutes=15), day + timezone.timedelta(hours=1)),
+            DateTimeTZRange(day, day + timezone.timedelta(hours=1, seconds=30)),
+        ):
+            with self.subTest(period=period), self.assertRaises(ValidationError):
+                validate_lane_request(LaneRequest(period, 1))
+
+    def test_swimmers_must_cover_the_users(self):
+        with self.assertRaises(ValidationError):
+            validate_lane_request(LaneRequest(get_period(6, 8), 1, (1, 2, 3)))
+        with self.assertRaises(ValidationError):
+            validate_lane_request(LaneRequest(get_period(6, 8), 0))
+
+
+class TestGetLaneRequestsFromJson(SimpleTestCase):
+    def test_swimmers_default_to_the_distinct_users(self):
+        lane_requests = get_lane_requests_from_json(
+            [{"start": "2026-11-02T06:00:00+00:00", "end": "2026-11-02T07:30:00+00:00", "users": [1, "2", 1]}]
+        )
+        self.assertEqual(lane_requests[0].user_ids, (1, 2))
+        self.assertEqual(lane_requests[0].swimmers, 2)
+
+    def test_invalid_requests_raise(self):
+        for raw_lane_request in (
+            {"start": "2026-11-02T06:00:00+00:00", "end": "2026-11-02T07:00:00+00:00", "swimmers": 1, "users": [1, 2]},
+            {"start": "2026-11-02T06:10:00+00:00", "end": "2026-11-02T07:00:00+00:00", "swimmers": 1},
+            {"start": "2026-11-02T06:00:00+00:00", "end": "2026-11-02T07:00:05+00:00", "swimmers": 1},
+        ):
+            with self.subTest(raw_lane_request=raw_lane_request), self.assertRaises(ValueError):
+                get_lane_requests_from_json([raw_lane_request])
+
+
+class TestAllocateLocker(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.pool = Pool.objects.create(name="Test Pool", address="1 Main St", depth_range=NumericRange(3, 12))
+        self.lockers = [
+            Locker.objects.create(number=number, pool=self.pool, per_hour_cost=1) for number in ("A1", "A2")
+        ]
+        self.user = User.objects.create_user("swimmer@example.com", "password")
+
+    def test_allocates_until_every_locker_is_taken(self):
+        other_user = User.objects.create_user("other@example.com", "password")
+        first = allocate_locker(self.pool, self.user, get_period(6, 8))
+        second = allocate_locker(self.pool, other_user, get_period(7, 9))
+        self.assertCountEqual([first.locker, second.locker], self.lockers)
+        self.assertIsNone(
+            allocate_locker(self.pool, User.objects.create_user("third@example.com", "x"), get_period(7, 8))
+        )
+
+    def test_overlapping_user_reservation_raises(self):
+        LockerReservation.objects.create(locker=self.lockers[0], user=self.user, period=get_period(6, 8))
+        with self.assertRaisesMessage(ValidationError, "User already has a Locker reserved during this period"):
+            allocate_locker(self.pool, self.user, get_period(7, 9))
+
+    def test_concurrent_user_reservation_raises_instead_of_trying_other_lockers(self):
+        # The user's Reservation is committed after the up-front check, so only the constraint catches it
+        LockerReservation.objects.create(locker=self.lockers[0], user=self.user, period=get_period(6, 8))
+        with mock.patch("apps.main.allocation_utils.has_overlapping_locker_reservation", return_value=False):
+            with self.assertRaisesMessage(ValidationError, "User already has a Locker reserved during this period"):
+                allocate_locker(self.pool, self.user, get_period(7, 9))
+        self.assertEqual(LockerReservation.objects.count(), 1)
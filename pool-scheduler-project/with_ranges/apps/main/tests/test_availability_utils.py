@@ -0,0 +1,115 @@
+from apps.main.availability_utils import get_closure_period, overlaps_closure_periods
+from apps.main.models import Lane, LaneBusyTime, LaneReservation, Locker, Pool
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange, NumericRange
+
+
+def get_date(day):
+    return timezone.datetime(2026, 11, day).date()
+
+
+class TestOverlapsClosurePeriods(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.closure_periods = [
+            get_closure_period(get_date(2), get_date(4)),
+            get_closure_period(get_date(10), get_date(11)),
+            get_closure_period(get_date(20), get_date(25)),
+        ]
+
+    def get_period(self, day, start_hour, end_day, end_hour):
+        return DateTimeTZRange(
+            get_closure_period(get_date(day), get_date(day)).lower + timezone.timedelta(hours=start_hour),
+            get_closure_period(get_date(end_day), get_date(end_day)).lower + timezone.timedelta(hours=end_hour),
+        )
+
+    def test_get_closure_period(self):
+        closure_period = get_closure_period(get_date(2), get_date(4))
+        self.assertEqual(closure_period.upper - closure_period.lower, timezone.timedelta(days=2))
+        self.assertTrue(timezone.is_aware(closure_period.lower))
+
+    def test_overlapping_periods(self):
+        for period in (
+            self.get_period(2, 9, 2, 10),
+            self.get_period(1, 20, 2, 1),
+            self.get_period(3, 23, 4, 1),
+            self.get_period(5, 0, 22, 0),
+            self.get_period(24, 9, 26, 9),
+        ):
+            self.assertTrue(overlaps_closure_periods(self.closure_periods, period), period)
+
+    def test_open_periods(self):
+        for period in (
+            self.get_period(1, 9, 2, 0),
+            self.get_period(4, 0, 4, 10),
+            self.get_period(11, 0, 20, 0),
+            self.get_period(25, 0, 27, 0),
+        ):
+            self.assertFalse(overlaps_closure_periods(self.closure_periods, period), period)
+
+    def test_no_closures(self):
+        self.assertFalse(overlaps_closure_periods([], self.get_period(2, 9, 2, 10)))
+
+
+class TestBusyTimeLookups(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.period = get_closure_period(get_date(2), get_date(4))
+
+    def test_overlap_lookup(self):
+        sql = str(LaneBusyTime.objects.filter(busy__overlap=self.period).query)
+        self.assertIn('"busy" && ', sql)
+        self.assertIn("::tstzrange", sql)
+
+    def test_contains_lookup(self):
+        sql = str(LaneBusyTime.objects.filter(busy__contains=self.period).query)
+        self.assertIn('"busy" @> ', sql)
+
+    def test_reverse_overlap_lookup(self):
+        sql = str(Locker.objects.exclude(busy_time__busy__overlap=self.period).query)
+        self.assertIn("&&", sql)
+
+
+class TestBusyTimeRetention(TestCase):
+    def setUp(self):
+        super().setUp()
+        pool = Pool.objects.create(name="Test Pool", address="1 Main St", depth_range=NumericRange(3, 12))
+        self.lane = Lane.objects.create(name="Lane 1", pool=pool, max_swimmers=4, per_hour_cost=5)
+        self.day_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def get_period(self, days, hours=1) -> DateTimeTZRange:
+        lower = self.day_start + timezone.timedelta(days=days, hours=6)
+        return DateTimeTZRange(lower, lower + timezone.timedelta(hours=hours))
+
+    def get_busy_ranges(self) -> list:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT lower(busy_range), upper(busy_range)
+                FROM {LaneBusyTime._meta.db_table} busy_time, unnest(busy_time.busy) AS busy_range
+                WHERE busy_time.lane_id = %s
+                ORDER BY 1
+                """,
+                [self.lane.id],
+            )
+            return cursor.fetchall()
+
+    def test_periods_past_the_retention_horizon_are_pruned(self):
+        # Older than a week, within the week, and upcoming
+        old_period, recent_period, next_period = self.get_period(-10), self.get_period(-2), self.get_period(1)
+        LaneReservation.objects.bulk_create(
+            [LaneReservation(lane=self.lane, period=period) for period in (old_period, recent_period)]
+        )
+        self.assertEqual(self.get_busy_ranges(), [(recent_period.lower, recent_period.upper)])
+
+        LaneReservation.objects.create(lane=self.lane, period=next_period)
+        self.assertEqual(
+            self.get_busy_ranges(),
+            [(recent_period.lower, recent_period.upper), (next_period.lower, next_period.upper)],
+        )
+
+        # Cancelling the pruned Reservation leaves the busy time alone
+        LaneReservation.objects.filter(period=old_period).update(cancelled=timezone.now())
+        self.assertEqual(len(self.get_busy_ranges()), 2)
@@ -0,0 +1,84 @@
+from apps.main.models import Lane, LaneReservation, Locker, LockerReservation, Pool
+from apps.main.views.lane_reservation_views import get_lane_reservation_batch_context
+from apps.main.views.locker_reservation_views import (
+    get_locker_reservation_batch_context,
+)
+from apps.users.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange, NumericRange
+
+
+class TestReservationBatchContext(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.pool = Pool.objects.create(name="Test Pool", address="1 Main St", depth_range=NumericRange(3, 12))
+        self.lane = Lane.objects.create(name="Lane 1", pool=self.pool, max_swimmers=4, per_hour_cost=5)
+        self.locker = Locker.objects.create(number="A1", pool=self.pool, per_hour_cost=1)
+        self.user = User.objects.create_user("swimmer@example.com", "password")
+
+        # Five past Reservations of an hour each, one a day, and one of 10 hours tomorrow
+        day_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.past_lane_reservations = [
+            LaneReservation.objects.create(
+                lane=self.lane,
+                period=DateTimeTZRange(
+                    day_start - timezone.timedelta(days=days, hours=-6),
+                    day_start - timezone.timedelta(days=days, hours=-7),
+                ),
+            )
+            for days in range(5, 0, -1)
+        ]
+        self.long_lane_reservation = LaneReservation.objects.create(
+            lane=self.lane,
+            period=DateTimeTZRange(
+                day_start + timezone.timedelta(days=1, hours=6), day_start + timezone.timedelta(days=1, hours=16)
+            ),
+        )
+        self.locker_reservation = LockerReservation.objects.create(
+            locker=self.locker,
+            user=self.user,
+            period=DateTimeTZRange(day_start - timezone.timedelta(days=40), day_start - timezone.timedelta(days=2)),
+        )
+
+    def test_each_block_is_counted_and_limited_in_three_queries(self):
+        with self.assertNumQueries(3):
+            context = get_lane_reservation_batch_context(
+                ["in_the_past", "greater_than_eight_hr", "overdue_end"], row_limit=2
+            )
+        batch_results = {batch_result["name"]: batch_result for batch_result in context["batch_results"]}
+
+        self.assertEqual(batch_results["in_the_past"]["count"], 5)
+        # The first rows of each block, by start
+        self.assertEqual(batch_results["in_the_past"]["lane_reservations"], self.past_lane_reservations[:2])
+        self.assertEqual(batch_results["greater_than_eight_hr"]["count"], 1)
+        self.assertEqual(batch_results["greater_than_eight_hr"]["lane_reservations"], [self.long_lane_reservation])
+        self.assertEqual(batch_results["overdue_end"]["count"], 5)
+
+    def test_unknown_and_empty_blocks(self):
+        self.assertEqual(get_lane_reservation_batch_context(["unknown"]), {"batch_results": []})
+        context = get_locker_reservation_batch_context(["greater_than_thirty_days", "overdue_start"])
+        batch_results = {batch_result["name"]: batch_result for batch_result in context["batch_results"]}
+        self.assertEqual(batch_results["greater_than_thirty_days"]["locker_reservations"], [self.locker_reservation])
+        self.assertEqual(batch_results["overdue_start"]["count"], 1)
+
+    def test_batch_response_renders_each_block(self):
+        response = self.client.get(
+            reverse("main:lane_reservations_batch"), {"block": ["in_the_past", "greater_than_eight_hr"]}
+        )
+        self.assertEqual(response.status_code, 200)
+        html = response.content.decode()
+        self.assertIn('id="laneBatch_in_the_past" class="mb-4" hx-swap-oob="true"', html)
+        self.assertIn('id="laneBatch_greater_than_eight_hr" class="mb-4" hx-swap-oob="true"', html)
+        self.assertIn("5 Reservations", html)
+        self.assertIn(reverse("main:lane_reservation_detail_view", args=[self.long_lane_reservation.id]), html)
+
+        response = self.client.get(reverse("main:locker_reservations_batch"), {"block": "in_the_past"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            reverse("main:locker_reservation_detail_view", args=[self.locker_reservation.id]),
+            response.content.decode(),
+        )
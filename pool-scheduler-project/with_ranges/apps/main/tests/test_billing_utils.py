@@ -0,0 +1,212 @@
+from decimal import Decimal
+from unittest import mock
+
+from apps.main.billing_utils import get_billing_month, run_invoices
+from apps.main.models import (
+    Invoice,
+    InvoiceLine,
+    InvoiceRun,
+    Lane,
+    LaneReservation,
+    Locker,
+    LockerReservation,
+    Pool,
+)
+from apps.users.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange, NumericRange
+
+MONTH = timezone.datetime(2026, 11, 1).date()
+
+
+def get_period(day, start_hour, end_hour):
+    """Returns a period on a day of the billed month (or a later month, for days beyond it)"""
+    day_start = timezone.datetime(2026, 11, 1, tzinfo=timezone.utc) + timezone.timedelta(days=day - 1)
+    return DateTimeTZRange(
+        day_start + timezone.timedelta(hours=start_hour), day_start + timezone.timedelta(hours=end_hour)
+    )
+
+
+class TestGetBillingMonth(SimpleTestCase):
+    def test_month_string(self):
+        self.assertEqual(get_billing_month("2026-02"), timezone.datetime(2026, 2, 1).date())
+
+    def test_invalid_month_string(self):
+        for month_string in ("2026", "02-2026", "2026-13"):
+            with self.assertRaises(ValueError):
+                get_billing_month(month_string)
+
+    def test_defaults_to_previous_month(self):
+        now = timezone.datetime(2026, 1, 15, 12, tzinfo=timezone.utc)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            self.assertEqual(get_billing_month(), timezone.datetime(2025, 12, 1).date())
+
+
+class RunInvoicesTestMixin:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        pool = Pool.objects.create(name="Test Pool", address="1 Main St", depth_range=NumericRange(3, 12))
+        self.lane = Lane.objects.create(name="Lane 1", pool=pool, max_swimmers=4, per_hour_cost=10)
+        self.locker = Locker.objects.create(number="A1", pool=pool, per_hour_cost=2)
+        self.first_user = User.objects.create_user("first@example.com", "password")
+        self.second_user = User.objects.create_user("second@example.com", "password")
+
+        # 2 hours split between two users, and 3 hours for one
+        self.lane_reservation = LaneReservation.objects.create(lane=self.lane, period=get_period(2, 6, 8))
+        self.lane_reservation.users.add(self.first_user, self.second_user)
+        self.locker_reservation = LockerReservation.objects.create(
+            locker=self.locker, user=self.first_user, period=get_period(2, 6, 9)
+        )
+        # Starts in the next month
+        LockerReservation.objects.create(locker=self.locker, user=self.second_user, period=get_period(31, 6, 9))
+
+    def get_totals(self) -> dict:
+        return dict(Invoice.objects.for_month(MONTH).values_list("user__email", "total"))
+
+
+@override_settings(TIME_ZONE="UTC")
+class TestRunInvoices(RunInvoicesTestMixin, TestCase):
+    """
+    Every write of a test shares its transaction, and so its change sequence, so each run bills every Reservation
+        again, as a full run would
+    """
+
+    def test_first_run_bills_each_user_their_share(self):
+        results = run_invoices(MONTH)
+
+        self.assertTrue(results["full"])
+        self.assertEqual(results["charges"], 3)
+        self.assertEqual(results["invoices_created"], 2)
+        self.assertEqual(results["lines_written"], 3)
+        self.assertEqual(
+            self.get_totals(), {"first@example.com": Decimal("16.00"), "second@example.com": Decimal("10.00")}
+        )
+        line = InvoiceLine.objects.get(invoice__user=self.second_user)
+        self.assertEqual((line.hours, line.share_count, line.amount), (Decimal("2.00"), 2, Decimal("10.00")))
+
+    def test_rerun_writes_nothing_when_nothing_changed(self):
+        run_invoices(MONTH)
+        updated = dict(InvoiceLine.objects.values_list("id", "updated"))
+
+        results = run_invoices(MONTH)
+
+        self.assertEqual(
+            results,
+            {
+                "full": False,
+                "charges": 3,
+                "unassigned_lane_reservations": 0,
+                "invoices_created": 0,
+                "lines_written": 0,
+                "lines_deleted": 0,
+                "invoices_updated": 0,
+                "invoices_deleted": 0,
+            },
+        )
+        self.assertEqual(dict(InvoiceLine.objects.values_list("id", "updated")), updated)
+
+    def test_rerun_only_writes_changed_charges(self):
+        run_invoices(MONTH)
+        # Billed for the actual usage once checked out
+        LaneReservation.objects.filter(id=self.lane_reservation.id).update(actual=get_period(2, 6, 9))
+        self.locker_reservation.cancel_reservation()
+
+        results = run_invoices(MONTH)
+
+        self.assertEqual(results["lines_written"], 2)
+        self.assertEqual(results["lines_deleted"], 1)
+        self.assertEqual(results["invoices_updated"], 2)
+        self.assertEqual(results["invoices_deleted"], 0)
+        self.assertEqual(
+            self.get_totals(), {"first@example.com": Decimal("15.00"), "second@example.com": Decimal("15.00")}
+        )
+
+        # Invoices left without lines are deleted
+        self.lane_reservation.cancel_reservation()
+        results = run_invoices(MONTH)
+        self.assertEqual(results["invoices_deleted"], 2)
+        self.assertFalse(Invoice.objects.for_month(MONTH).exists())
+
+    def test_lane_reservations_without_users_are_counted(self):
+        LaneReservation.objects.create(lane=self.lane, period=get_period(3, 6, 8))
+        with self.assertLogs("with_ranges.main", "WARNING"):
+            results = run_invoices(MONTH)
+        self.assertEqual(results["charges"], 4)
+        self.assertEqual(results["unassigned_lane_reservations"], 1)
+        self.assertEqual(results["lines_written"], 3)
+        self.assertEqual(
+            self.get_totals(), {"first@example.com": Decimal("16.00"), "second@example.com": Decimal("10.00")}
+        )
+
+
+@override_settings(TIME_ZONE="UTC")
+class TestIncrementalRunInvoices(RunInvoicesTestMixin, TransactionTestCase):
+    """Each write commits in its own transaction, with its own change sequence"""
+
+    def setUp(self):
+        super().setUp()
+        run_invoices(MONTH)
+
+    def test_reruns_only_bill_changed_reservations(self):
+        self.assertEqual(
+            run_invoices(MONTH),
+            {
+                "full": False,
+                "charges": 0,
+                "unassigned_lane_reservations": 0,
+                "invoices_created": 0,
+                "lines_written": 0,
+                "lines_deleted": 0,
+                "invoices_updated": 0,
+                "invoices_deleted": 0,
+            },
+        )
+
+        LaneReservation.objects.filter(id=self.lane_reservation.id).update(actual=get_period(2, 6, 9))
+        results = run_invoices(MONTH)
+
+        # Only the changed Lane Reservation's two users are charged again
+        self.assertEqual((results["charges"], results["lines_written"], results["invoices_updated"]), (2, 2, 2))
+        self.assertEqual(
+            self.get_totals(), {"first@example.com": Decimal("21.00"), "second@example.com": Decimal("15.00")}
+        )
+        # The next run starts after the change
+        self.assertGreater(
+            InvoiceRun.objects.get(month=MONTH).change_seq,
+            LaneReservation.objects.get(id=self.lane_reservation.id).change_seq,
+        )
+
+    def test_lines_of_changed_reservations_are_deleted(self):
+        self.lane_reservation.users.remove(self.second_user)
+        LockerReservation.objects.filter(id=self.locker_reservation.id).update(period=get_period(32, 6, 9))
+
+        results = run_invoices(MONTH)
+
+        self.assertEqual(results["charges"], 1)
+        self.assertEqual(results["lines_deleted"], 2)
+        self.assertEqual(results["invoices_deleted"], 1)
+        # The first user is no longer sharing the Lane Reservation
+        self.assertEqual(self.get_totals(), {"first@example.com": Decimal("20.00")})
+
+    def test_deleted_reservations_update_totals(self):
+        LockerReservation.objects.filter(id=self.locker_reservation.id).delete()
+        results = run_invoices(MONTH)
+        self.assertEqual((results["charges"], results["invoices_updated"]), (0, 1))
+        self.assertEqual(
+            self.get_totals(), {"first@example.com": Decimal("10.00"), "second@example.com": Decimal("10.00")}
+        )
+
+    def test_full_runs_bill_cost_changes(self):
+        Lane.objects.filter(id=self.lane.id).update(per_hour_cost=20)
+        self.assertEqual(run_invoices(MONTH)["lines_written"], 0)
+
+        results = run_invoices(MONTH, full=True)
+
+        self.assertTrue(results["full"])
+        self.assertEqual((results["charges"], results["lines_written"]), (3, 2))
+        self.assertEqual(
+            self.get_totals(), {"first@example.com": Decimal("26.00"), "second@example.com": Decimal("20.00")}
+        )
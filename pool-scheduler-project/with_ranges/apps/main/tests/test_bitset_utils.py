@@ -0,0 +1,159 @@
+from unittest import mock
+
+from apps.main.availability_utils import get_closure_period
+from apps.main.bitset_utils import (
+    DAY_SLOT_COUNT,
+    FULL_DAY_MASK,
+    find_common_free_periods,
+    find_resources_free_every_day,
+    get_business_hours_mask,
+    get_free_mask,
+    get_run_starts,
+    get_slot_indexes,
+    get_slot_mask,
+    get_time_mask,
+    search_pool_free_periods,
+)
+from apps.main.models import Pool
+from django.test import SimpleTestCase
+from django.utils import timezone
+from psycopg2.extras import NumericRange
+
+
+def get_time(hour, minute=0):
+    return timezone.datetime.min.time().replace(hour=hour, minute=minute)
+
+
+class TestMasks(SimpleTestCase):
+    def test_slot_mask(self):
+        self.assertEqual(get_slot_mask(0, 2), 0b11)
+        self.assertEqual(get_slot_mask(3, 5), 0b11000)
+        self.assertEqual(get_slot_mask(0, DAY_SLOT_COUNT), FULL_DAY_MASK)
+        self.assertEqual(get_slot_mask(5, 5), 0)
+        self.assertEqual(get_slot_mask(40, 60), get_slot_mask(40, DAY_SLOT_COUNT))
+
+    def test_time_mask(self):
+        self.assertEqual(get_time_mask(get_time(6), get_time(8)), get_slot_mask(12, 16))
+        # A partially covered slot is included
+        self.assertEqual(get_time_mask(get_time(6, 15), get_time(7, 45)), get_slot_mask(12, 16))
+        self.assertEqual(get_time_mask(get_time(23, 30)), get_slot_mask(47, 48))
+
+    def test_business_hours_mask(self):
+        self.assertEqual(get_business_hours_mask(NumericRange(9, 17)), get_slot_mask(18, 34))
+        self.assertEqual(get_business_hours_mask(NumericRange(None, 12)), get_slot_mask(0, 24))
+        self.assertEqual(get_business_hours_mask(NumericRange(0, 24)), FULL_DAY_MASK)
+
+    def test_free_mask(self):
+        self.assertEqual(get_free_mask(), FULL_DAY_MASK)
+        self.assertEqual(get_free_mask(get_slot_mask(0, 24), get_slot_mask(24, 48)), 0)
+        self.assertEqual(get_free_mask(get_slot_mask(0, 10), get_slot_mask(5, 20)), get_slot_mask(20, 48))
+
+    def test_run_starts(self):
+        free_mask = get_slot_mask(2, 6) | get_slot_mask(10, 12)
+        self.assertEqual(get_slot_indexes(get_run_starts(free_mask, 1)), [2, 3, 4, 5, 10, 11])
+        self.assertEqual(get_slot_indexes(get_run_starts(free_mask, 2)), [2, 3, 4, 10])
+        self.assertEqual(get_slot_indexes(get_run_starts(free_mask, 4)), [2])
+        self.assertEqual(get_run_starts(free_mask, 5), 0)
+        self.assertEqual(get_slot_indexes(get_run_starts(FULL_DAY_MASK, DAY_SLOT_COUNT)), [0])
+
+
+class TestFindFree(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.days = [timezone.datetime(2026, 11, day).date() for day in (2, 3)]
+        self.day_masks = {
+            1: {self.days[0]: get_slot_mask(12, 16), self.days[1]: 0},
+            2: {self.days[0]: get_slot_mask(18, 20), self.days[1]: get_slot_mask(12, 13)},
+            3: {self.days[0]: 0, self.days[1]: get_slot_mask(30, 48)},
+        }
+
+    def test_common_free_periods(self):
+        window_mask = get_slot_mask(12, 22)
+        periods = find_common_free_periods(self.day_masks, [1, 2], 2, window_mask)
+        self.assertEqual(
+            [(period.lower.day, period.lower.hour, period.lower.minute) for period in periods],
+            [
+                (2, 8, 0),
+                (2, 10, 0),
+                (3, 6, 30),
+                (3, 7, 0),
+                (3, 7, 30),
+                (3, 8, 0),
+                (3, 8, 30),
+                (3, 9, 0),
+                (3, 9, 30),
+                (3, 10, 0),
+            ],
+        )
+        self.assertTrue(all(period.upper - period.lower == timezone.timedelta(hours=1) for period in periods))
+
+    def test_resources_free_every_day(self):
+        self.assertEqual(find_resources_free_every_day(self.day_masks, get_slot_mask(12, 16)), [3])
+        self.assertEqual(find_resources_free_every_day(self.day_masks, get_slot_mask(20, 30)), [1, 2, 3])
+
+    def test_resources_without_masks_are_free(self):
+        periods = find_common_free_periods(self.day_masks, [1, 4], 2, get_slot_mask(12, 22))
+        self.assertEqual(periods, find_common_free_periods(self.day_masks, [1], 2, get_slot_mask(12, 22)))
+
+
+class TestSearchPoolFreePeriods(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.days = [timezone.datetime(2026, 11, day).date() for day in (2, 3)]
+        self.day_masks = {1: {day: get_slot_mask(0, 47) for day in self.days}}
+
+    def search(
+        self,
+        resource_ids=(),
+        pool_resource_ids=(1, 2),
+        business_hours=NumericRange(0, 24),
+        closure_periods=(),
+        window_mask=FULL_DAY_MASK,
+    ):
+        pool = Pool(id=1, business_hours=business_hours)
+        with mock.patch("apps.main.bitset_utils.Lane.objects") as lanes, mock.patch(
+            "apps.main.bitset_utils.get_lane_day_masks", return_value=self.day_masks
+        ), mock.patch("apps.main.bitset_utils.get_pool_closure_periods", return_value=list(closure_periods)):
+            lanes.filter.return_value.values_list.return_value = list(pool_resource_ids)
+            return search_pool_free_periods(
+                pool, "lane", list(resource_ids), self.days[0], self.days[1], 1, window_mask
+            )
+
+    def test_invalid_searches_raise(self):
+        for arguments in (
+            (Pool(id=1), "pool", [], self.days[0], self.days[1], 1),
+            (Pool(id=1), "lane", [], self.days[1], self.days[0], 1),
+            (Pool(id=1), "lane", [], self.days[0], self.days[0] + timezone.timedelta(days=31), 1),
+            (Pool(id=1), "lane", [], self.days[0], self.days[1], 0),
+        ):
+            with self.subTest(arguments=arguments), self.assertRaises(ValueError):
+                search_pool_free_periods(*arguments)
+        with self.assertRaises(ValueError):
+            self.search([3])
+
+    def test_resources_default_to_the_pool(self):
+        results = self.search()
+        self.assertEqual(results["lane"], [1, 2])
+        # Lane 1 is only free in the last slot of each day, and Lane 2 has no masks, so it is free every day
+        self.assertEqual([period["start"][11:16] for period in results["periods"]], ["23:30", "23:30"])
+        self.assertEqual(results["free_every_day"], [2])
+
+    def test_closed_days_are_not_free(self):
+        # Lane 2 has no Reservations, but the Pool is closed on the first day
+        results = self.search([2], closure_periods=[get_closure_period(self.days[0], self.days[1])])
+        self.assertEqual({period["start"][:10] for period in results["periods"]}, {self.days[1].isoformat()})
+        self.assertEqual(len(results["periods"]), DAY_SLOT_COUNT)
+        self.assertEqual(results["free_every_day"], [])
+
+    def test_slots_outside_business_hours_are_not_free(self):
+        results = self.search([2], business_hours=NumericRange(9, 17))
+        starts = [period["start"][11:16] for period in results["periods"]]
+        self.assertEqual(starts[0], "09:00")
+        self.assertEqual(starts[-1], "16:30")
+        self.assertEqual(len(starts), 2 * 16)
+        # Lane 1's only free slot, 23:30, is after hours
+        self.assertEqual(self.search([1], business_hours=NumericRange(9, 17))["periods"], [])
+        self.assertEqual(self.search(business_hours=NumericRange(9, 17))["free_every_day"], [2])
+        after_hours = self.search(business_hours=NumericRange(9, 17), window_mask=get_time_mask(get_time(18)))
+        self.assertEqual(after_hours["periods"], [])
+        self.assertEqual(after_hours["free_every_day"], [])
@@ -0,0 +1,183 @@
+from unittest import mock
+
+from apps.main.admin import BulkReservationActionsMixin
+from apps.main.bulk_utils import (
+    bulk_cancel_reservations,
+    bulk_shift_reservations,
+    validate_shift_offset,
+)
+from apps.main.models import (
+    Closure,
+    Lane,
+    LaneOccupancy,
+    LaneReservation,
+    LaneSlot,
+    Locker,
+    LockerReservation,
+    Pool,
+    PoolOccupancy,
+)
+from apps.main.slot_utils import generate_lane_slots
+from apps.users.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from psycopg2.extras import DateRange, DateTimeTZRange, NumericRange
+
+ONE_HOUR = timezone.timedelta(hours=1)
+
+
+class TestValidateShiftOffset(SimpleTestCase):
+    def test_valid_offsets(self):
+        for minutes in (30, 60, -30, -90, 60 * 24):
+            validate_shift_offset(timezone.timedelta(minutes=minutes))
+
+    def test_invalid_offsets(self):
+        for offset in (timezone.timedelta(0), timezone.timedelta(minutes=20), timezone.timedelta(minutes=-45)):
+            with self.assertRaises(ValidationError):
+                validate_shift_offset(offset)
+
+
+class TestBulkReservationActions(SimpleTestCase):
+    def test_shift_action_names_are_unique(self):
+        names = [
+            action if isinstance(action, str) else action.__name__ for action in BulkReservationActionsMixin.actions
+        ]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertIn("shift_reservations_minus_30_minutes", names)
+
+
+@override_settings(TIME_ZONE="UTC")
+class BulkTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.pool = Pool.objects.create(
+            name="Test Pool", address="1 Main St", depth_range=NumericRange(3, 12), business_hours=NumericRange(9, 17)
+        )
+        self.lane = Lane.objects.create(name="Lane 1", pool=self.pool, max_swimmers=4, per_hour_cost=5)
+        self.user = User.objects.create_user("swimmer@example.com", "password")
+        self.day_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) + timezone.timedelta(days=7)
+
+    def get_period(self, start_hour, end_hour) -> DateTimeTZRange:
+        return DateTimeTZRange(
+            self.day_start + timezone.timedelta(hours=start_hour), self.day_start + timezone.timedelta(hours=end_hour)
+        )
+
+    def create_lane_reservations(self, *hours) -> list:
+        return [
+            LaneReservation.objects.create(lane=self.lane, period=self.get_period(start_hour, end_hour))
+            for start_hour, end_hour in hours
+        ]
+
+    def get_periods(self, reservations) -> list:
+        return [LaneReservation.all_objects.get(id=reservation.id).period for reservation in reservations]
+
+
+class TestBulkShiftReservations(BulkTestCase):
+    def test_back_to_back_reservations_shift_together(self):
+        reservations = self.create_lane_reservations((10, 11), (11, 12), (12, 13))
+
+        results = bulk_shift_reservations(LaneReservation.objects.filter(lane=self.lane), ONE_HOUR)
+
+        self.assertEqual(results, {"moved": [reservation.id for reservation in reservations], "conflicts": {}})
+        self.assertEqual(
+            self.get_periods(reservations), [self.get_period(11, 12), self.get_period(12, 13), self.get_period(13, 14)]
+        )
+
+    def test_conflicts_cascade_to_the_reservations_behind_them(self):
+        first, second, third = self.create_lane_reservations((10, 11), (11, 12), (12, 13))
+
+        # The third stays, so the second can't move onto it, and then neither can the first
+        results = bulk_shift_reservations(LaneReservation.objects.filter(id__in=[first.id, second.id]), ONE_HOUR)
+
+        self.assertEqual(results["moved"], [])
+        self.assertEqual(
+            results["conflicts"],
+            {
+                first.id: f"Would overlap Lane Reservation {second.id}",
+                second.id: f"Would overlap Lane Reservation {third.id}",
+            },
+        )
+        self.assertEqual(self.get_periods([first, second]), [self.get_period(10, 11), self.get_period(11, 12)])
+
+    def test_closures_and_checked_in_reservations_are_left_alone(self):
+        staying, checked_in, moving = self.create_lane_reservations((10, 11), (12, 13), (14, 15))
+        checked_in.check_in()
+        # The day after, for the Reservation shifted past midnight
+        Closure.objects.create(
+            pool=self.pool,
+            dates=DateRange(
+                self.day_start.date() + timezone.timedelta(days=1), self.day_start.date() + timezone.timedelta(days=2)
+            ),
+            reason="Filter cleaning",
+        )
+
+        results = bulk_shift_reservations(LaneReservation.objects.filter(id__in=[checked_in.id, moving.id]), ONE_HOUR)
+        self.assertEqual(results["moved"], [moving.id])
+        self.assertEqual(results["conflicts"], {checked_in.id: "Already checked in"})
+
+        results = bulk_shift_reservations(LaneReservation.objects.filter(id=staying.id), ONE_HOUR * 14)
+        self.assertEqual(results, {"moved": [], "conflicts": {staying.id: "Would overlap a Closure"}})
+
+    def test_locker_reservations_of_the_same_user_conflict(self):
+        lockers = [Locker.objects.create(number=number, pool=self.pool, per_hour_cost=1) for number in ("A1", "A2")]
+        first = LockerReservation.objects.create(locker=lockers[0], user=self.user, period=self.get_period(10, 11))
+        second = LockerReservation.objects.create(locker=lockers[1], user=self.user, period=self.get_period(11, 12))
+
+        results = bulk_shift_reservations(LockerReservation.objects.filter(id=first.id), ONE_HOUR)
+
+        self.assertEqual(
+            results, {"moved": [], "conflicts": {first.id: f"Would overlap Locker Reservation {second.id}"}}
+        )
+
+    def test_concurrent_conflicts_are_caught_by_the_deferred_constraints(self):
+        first, second = self.create_lane_reservations((10, 11), (11, 12))
+
+        # As if the second Reservation had been booked after the conflicts were checked
+        with mock.patch("apps.main.bulk_utils.get_shift_conflicts", return_value={}):
+            with self.assertRaises(ValidationError):
+                bulk_shift_reservations(LaneReservation.objects.filter(id=first.id), ONE_HOUR)
+
+        # Nothing was shifted
+        self.assertEqual(self.get_periods([first, second]), [self.get_period(10, 11), self.get_period(11, 12)])
+
+    def test_lane_slots_move_with_their_reservations(self):
+        generate_lane_slots(self.pool, self.day_start.date(), self.day_start.date())
+        first, second = self.create_lane_reservations((10, 11), (11, 12))
+
+        bulk_shift_reservations(LaneReservation.objects.filter(lane=self.lane), ONE_HOUR)
+
+        for reservation, start_hour in ((first, 11), (second, 12)):
+            self.assertEqual(
+                list(LaneSlot.objects.filter(lane_reservation=reservation).values_list("start", flat=True)),
+                [
+                    self.get_period(start_hour, start_hour).lower + timezone.timedelta(minutes=minutes)
+                    for minutes in (0, 30)
+                ],
+            )
+        self.assertFalse(
+            LaneSlot.objects.filter(start__lt=self.get_period(11, 11).lower).exclude(lane_reservation=None)
+        )
+
+
+class TestBulkCancelReservations(BulkTestCase):
+    def test_swimmers_in_the_water_are_taken_off_the_counters(self):
+        in_water, booked = self.create_lane_reservations((10, 11), (12, 13))
+        in_water.users.add(self.user, User.objects.create_user("other@example.com", "password"))
+        in_water.check_in()
+        booked.users.add(self.user)
+        self.assertEqual(LaneOccupancy.objects.get(lane=self.lane).swimmers, 2)
+
+        results = bulk_cancel_reservations(LaneReservation.objects.filter(lane=self.lane))
+
+        self.assertEqual(results, {"cancelled": [in_water.id, booked.id]})
+        self.assertEqual(LaneOccupancy.objects.get(lane=self.lane).swimmers, 0)
+        self.assertEqual(PoolOccupancy.objects.get(pool=self.pool).swimmers, 0)
+
+        # Cancelling again finds nothing
+        self.assertEqual(
+            bulk_cancel_reservations(LaneReservation.all_objects.filter(lane=self.lane)), {"cancelled": []}
+        )
+        self.assertEqual(LaneOccupancy.objects.get(lane=self.lane).swimmers, 0)
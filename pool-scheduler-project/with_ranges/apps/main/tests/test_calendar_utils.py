@@ -0,0 +1,113 @@
+import struct
+
+from apps.main.calendar_utils import (
+    CALENDAR_BUCKETS_MAGIC,
+    CALENDAR_COLUMNS_MAGIC,
+    encode_calendar_buckets,
+    encode_calendar_columns,
+    get_calendar_bucket_unit,
+    get_calendar_window,
+)
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+
+class TestEncodeCalendarColumns(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.calendar_columns = {
+            "group_ids": [3, 7],
+            "group_labels": ["Pool A Lane 1", "Pool Ü Lane 2"],
+            "ids": [11, 12, 13],
+            "groups": [3, 3, 7],
+            "starts": [1798794000, 1798797600, 1798801200],
+            "ends": [1798797600, 1798801200, 1798804800],
+        }
+
+    def test_header(self):
+        encoded = encode_calendar_columns(self.calendar_columns)
+        self.assertEqual(struct.unpack_from("<4sII", encoded), (CALENDAR_COLUMNS_MAGIC, 3, 2))
+
+    def test_columns_and_labels(self):
+        encoded = encode_calendar_columns(self.calendar_columns)
+        offset = 12
+        for key, column_format in (("ids", "<3Q"), ("groups", "<3Q"), ("starts", "<3q"), ("ends", "<3q")):
+            self.assertEqual(list(struct.unpack_from(column_format, encoded, offset)), self.calendar_columns[key])
+            offset += 24
+        self.assertEqual(list(struct.unpack_from("<2Q", encoded, offset)), self.calendar_columns["group_ids"])
+        offset += 16
+
+        labels = []
+        for i in range(2):
+            (label_length,) = struct.unpack_from("<I", encoded, offset)
+            offset += 4
+            labels.append(encoded[offset : offset + label_length].decode())
+            offset += label_length
+        self.assertEqual(labels, self.calendar_columns["group_labels"])
+        self.assertEqual(offset, len(encoded))
+
+    def test_large_ids_and_early_starts(self):
+        # Ids beyond 32 bits, and a Reservation before the epoch
+        calendar_columns = {
+            "group_ids": [2**40],
+            "group_labels": ["Pool A Lane 1"],
+            "ids": [2**33],
+            "groups": [2**40],
+            "starts": [-3600],
+            "ends": [0],
+        }
+        encoded = encode_calendar_columns(calendar_columns)
+        self.assertEqual(struct.unpack_from("<QQqqQ", encoded, 12), (2**33, 2**40, -3600, 0, 2**40))
+
+    def test_empty(self):
+        empty_columns = {key: [] for key in self.calendar_columns}
+        self.assertEqual(encode_calendar_columns(empty_columns), struct.pack("<4sII", CALENDAR_COLUMNS_MAGIC, 0, 0))
+
+
+class TestEncodeCalendarBuckets(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.calendar_buckets = {
+            "bucket_size": 3600,
+            "group_ids": [3, 7],
+            "group_labels": ["Pool A Lane 1", "Pool Ü Lane 2"],
+            "groups": [3, 7],
+            "starts": [1798794000, 1798797600],
+            "occupied": [1800, 3600],
+        }
+
+    def test_header_and_columns(self):
+        encoded = encode_calendar_buckets(self.calendar_buckets)
+        self.assertEqual(struct.unpack_from("<4sIII", encoded), (CALENDAR_BUCKETS_MAGIC, 2, 2, 3600))
+        offset = 16
+        for key, column_format in (("groups", "<2Q"), ("starts", "<2q"), ("occupied", "<2Q"), ("group_ids", "<2Q")):
+            self.assertEqual(list(struct.unpack_from(column_format, encoded, offset)), self.calendar_buckets[key])
+            offset += 16
+
+    def test_empty(self):
+        empty_buckets = {key: [] for key in self.calendar_buckets}
+        empty_buckets["bucket_size"] = 86400
+        self.assertEqual(
+            encode_calendar_buckets(empty_buckets), struct.pack("<4sIII", CALENDAR_BUCKETS_MAGIC, 0, 0, 86400)
+        )
+
+
+class TestCalendarWindow(SimpleTestCase):
+    def test_get_calendar_window(self):
+        window = get_calendar_window("1798794000", "1798797600")
+        self.assertEqual(window.upper - window.lower, timezone.timedelta(hours=1))
+        self.assertEqual(window.lower.tzinfo, timezone.utc)
+
+    def test_get_calendar_window_invalid(self):
+        for start, end in (("abc", "1798797600"), ("1798797600", ""), ("1798797600", "1798794000")):
+            with self.assertRaises(ValueError):
+                get_calendar_window(start, end)
+
+    def test_get_calendar_bucket_unit(self):
+        for days, bucket_unit in ((1, None), (7, None), (8, "hour"), (31, "hour"), (32, "day"), (366, "day")):
+            window = get_calendar_window("0", str(days * 86400))
+            self.assertEqual(get_calendar_bucket_unit(window), bucket_unit)
+
+    def test_get_calendar_bucket_unit_without_hourly_buckets(self):
+        window = get_calendar_window("0", str(8 * 86400))
+        self.assertEqual(get_calendar_bucket_unit(window, timezone.timedelta(0)), "day")
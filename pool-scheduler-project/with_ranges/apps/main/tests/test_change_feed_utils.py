@@ -0,0 +1,78 @@
+from apps.main.change_feed_utils import (
+    format_change_cursor,
+    parse_change_cursor,
+    serialize_change,
+)
+from django.test import SimpleTestCase
+from django.utils import timezone
+from psycopg2.extras import DateRange, DateTimeTZRange
+
+
+class TestChangeCursor(SimpleTestCase):
+    def test_round_trip(self):
+        self.assertEqual(parse_change_cursor(format_change_cursor(48213, 907)), (48213, 907))
+
+    def test_empty_cursor_starts_from_beginning(self):
+        self.assertEqual(parse_change_cursor(""), (0, 0))
+
+    def test_invalid_cursor(self):
+        for cursor in ("48213", "48213-", "a-b", "1-2-3"):
+            with self.assertRaises(ValueError):
+                parse_change_cursor(cursor)
+
+
+class TestSerializeChange(SimpleTestCase):
+    def test_cancelled_lane_reservation(self):
+        start = timezone.datetime(2026, 3, 2, 6, tzinfo=timezone.utc)
+        row = {
+            "id": 7,
+            "pool": 1,
+            "lane_id": 3,
+            "users": [4, 9],
+            "period": DateTimeTZRange(start, start + timezone.timedelta(hours=1)),
+            # Unsaved Reservations default to an empty tuple
+            "actual": (None, None),
+            "cancelled": start - timezone.timedelta(days=1),
+        }
+        self.assertEqual(
+            serialize_change("lane_reservation", row),
+            {
+                "id": 7,
+                "pool": 1,
+                "lane": 3,
+                "users": [4, 9],
+                "start": "2026-03-02T06:00:00+00:00",
+                "end": "2026-03-02T07:00:00+00:00",
+                "actual_start": None,
+                "actual_end": None,
+                "cancelled": "2026-03-01T06:00:00+00:00",
+            },
+        )
+
+    def test_checked_in_locker_reservation(self):
+        start = timezone.datetime(2026, 3, 2, 6, tzinfo=timezone.utc)
+        row = {
+            "id": 8,
+            "pool": 1,
+            "locker_id": 5,
+            "user_id": 4,
+            "period": DateTimeTZRange(start, start + timezone.timedelta(days=2)),
+            "actual": DateTimeTZRange(start, None),
+            "cancelled": None,
+        }
+        change = serialize_change("locker_reservation", row)
+        self.assertEqual((change["locker"], change["user"]), (5, 4))
+        self.assertEqual((change["actual_start"], change["actual_end"]), ("2026-03-02T06:00:00+00:00", None))
+        self.assertIsNone(change["cancelled"])
+
+    def test_closure(self):
+        row = {
+            "id": 2,
+            "pool_id": 1,
+            "dates": DateRange(timezone.datetime(2026, 3, 2).date(), timezone.datetime(2026, 3, 4).date()),
+            "reason": "Repainting",
+        }
+        self.assertEqual(
+            serialize_change("closure", row),
+            {"id": 2, "pool": 1, "start": "2026-03-02", "end": "2026-03-04", "reason": "Repainting"},
+        )
@@ -0,0 +1,207 @@
+from unittest import mock
+
+from apps.main.closure_utils import (
+    apply_closure,
+    cancel_closure_reservations,
+    get_closure_notification_messages,
+)
+from apps.main.models import (
+    Closure,
+    Lane,
+    LaneReservation,
+    Locker,
+    LockerReservation,
+    Pool,
+)
+from apps.main.tasks import (
+    CLOSURE_NOTIFICATION_BATCH_SIZE,
+    notify_closure_affected_users_task,
+)
+from apps.users.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import send_mass_mail
+from django.test import TestCase
+from django.utils import timezone
+from psycopg2.extras import DateRange, DateTimeTZRange, NumericRange
+
+
+class ClosureTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.pool = Pool.objects.create(name="Test Pool", address="1 Main St", depth_range=NumericRange(3, 12))
+        self.lane = Lane.objects.create(name="Lane 1", pool=self.pool, max_swimmers=4, per_hour_cost=5)
+        self.locker = Locker.objects.create(number="A1", pool=self.pool, per_hour_cost=1)
+        self.second_lane = Lane.objects.create(name="Lane 2", pool=self.pool, max_swimmers=4, per_hour_cost=5)
+        self.other_pool = Pool.objects.create(name="Other Pool", address="2 Main St", depth_range=NumericRange(3, 12))
+        self.other_lane = Lane.objects.create(name="Lane 1", pool=self.other_pool, max_swimmers=4, per_hour_cost=5)
+        self.other_locker = Locker.objects.create(number="B1", pool=self.other_pool, per_hour_cost=1)
+        self.first_user = User.objects.create_user("first@example.com", "password")
+        self.second_user = User.objects.create_user("second@example.com", "password")
+
+        # The Closure covers the two days starting a week from today
+        self.closure_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) + timezone.timedelta(
+            days=7
+        )
+        self.closure = Closure.objects.create(
+            pool=self.pool,
+            dates=DateRange(self.closure_start.date(), self.closure_start.date() + timezone.timedelta(days=2)),
+            reason="Filter cleaning",
+        )
+
+    def get_period(self, start_hours: int, end_hours: int) -> DateTimeTZRange:
+        """Returns a period starting and ending the given number of hours after the Closure starts"""
+        return DateTimeTZRange(
+            self.closure_start + timezone.timedelta(hours=start_hours),
+            self.closure_start + timezone.timedelta(hours=end_hours),
+        )
+
+    def create_lane_reservation(self, lane: Lane, period: DateTimeTZRange, users=()) -> LaneReservation:
+        lane_reservation = LaneReservation.objects.create(lane=lane, period=period)
+        lane_reservation.users.add(*users)
+        return lane_reservation
+
+
+class TestCancelClosureReservations(ClosureTestCase):
+    def test_only_active_overlapping_reservations_are_cancelled(self):
+        first_day = self.create_lane_reservation(self.lane, self.get_period(6, 8), [self.first_user])
+        # Straddles the end of the Closure's last day
+        last_day = self.create_lane_reservation(self.lane, self.get_period(47, 49))
+        # Ends as the Closure starts, and starts as it ends
+        before = self.create_lane_reservation(self.lane, self.get_period(-2, 0))
+        after = self.create_lane_reservation(self.second_lane, self.get_period(48, 50))
+        other_pool = self.create_lane_reservation(self.other_lane, self.get_period(6, 8))
+        already_cancelled = self.create_lane_reservation(self.lane, self.get_period(10, 12))
+        already_cancelled.cancel_reservation()
+        already_cancelled_time = LaneReservation.all_objects.get(id=already_cancelled.id).cancelled
+
+        cancelled_ids = cancel_closure_reservations(self.closure, LaneReservation, Lane)
+
+        self.assertCountEqual(cancelled_ids, [first_day.id, last_day.id])
+        self.assertCountEqual(
+            LaneReservation.objects.values_list("id", flat=True), [before.id, after.id, other_pool.id]
+        )
+        # Already-cancelled Reservations keep their cancellation time
+        self.assertEqual(LaneReservation.all_objects.get(id=already_cancelled.id).cancelled, already_cancelled_time)
+
+    def test_locker_reservations_are_cancelled(self):
+        overlapping = LockerReservation.objects.create(
+            locker=self.locker, user=self.first_user, period=self.get_period(-2, 2)
+        )
+        other_pool = LockerReservation.objects.create(
+            locker=self.other_locker, user=self.second_user, period=self.get_period(-2, 2)
+        )
+
+        self.assertEqual(cancel_closure_reservations(self.closure, LockerReservation, Locker), [overlapping.id])
+        self.assertEqual(list(LockerReservation.objects.values_list("id", flat=True)), [other_pool.id])
+        self.assertEqual(cancel_closure_reservations(self.closure, LockerReservation, Locker), [])
+
+
+class TestApplyClosure(ClosureTestCase):
+    def test_reservations_are_rebooked_into_another_pool(self):
+        lane_reservation = self.create_lane_reservation(
+            self.lane, self.get_period(6, 8), [self.first_user, self.second_user]
+        )
+        locker_reservation = LockerReservation.objects.create(
+            locker=self.locker, user=self.first_user, period=self.get_period(6, 8)
+        )
+
+        with mock.patch("apps.main.tasks.notify_closure_affected_users_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                results = apply_closure(self.closure, rebook_pool=self.other_pool)
+                delay.assert_not_called()
+
+        self.assertEqual(results["cancelled_lane_reservations"], [lane_reservation.id])
+        self.assertEqual(results["cancelled_locker_reservations"], [locker_reservation.id])
+
+        replacement = LaneReservation.objects.get(id=results["rebooked_lane_reservations"][lane_reservation.id])
+        self.assertEqual(replacement.lane, self.other_lane)
+        self.assertEqual(replacement.period, lane_reservation.period)
+        self.assertCountEqual(replacement.users.all(), [self.first_user, self.second_user])
+
+        locker_replacement = LockerReservation.objects.get(
+            id=results["rebooked_locker_reservations"][locker_reservation.id]
+        )
+        self.assertEqual(locker_replacement.locker, self.other_locker)
+        self.assertEqual(locker_replacement.user, self.first_user)
+        self.assertEqual(locker_replacement.period, locker_reservation.period)
+
+        # The affected users are notified once the transaction commits
+        delay.assert_called_once_with(
+            self.closure.id,
+            [lane_reservation.id],
+            [locker_reservation.id],
+            [lane_reservation.id],
+            [locker_reservation.id],
+        )
+
+    def test_reservations_are_not_rebooked_into_a_closed_pool(self):
+        Closure.objects.create(pool=self.other_pool, dates=self.closure.dates, reason="Repainting")
+        lane_reservation = self.create_lane_reservation(self.lane, self.get_period(6, 8), [self.first_user])
+        LockerReservation.objects.create(locker=self.locker, user=self.first_user, period=self.get_period(6, 8))
+
+        with mock.patch("apps.main.tasks.notify_closure_affected_users_task.delay"):
+            results = apply_closure(self.closure, rebook_pool=self.other_pool)
+
+        self.assertEqual(results["cancelled_lane_reservations"], [lane_reservation.id])
+        self.assertEqual(results["rebooked_lane_reservations"], {})
+        self.assertEqual(results["rebooked_locker_reservations"], {})
+        self.assertFalse(LaneReservation.objects.filter(lane=self.other_lane).exists())
+
+    def test_nothing_is_queued_without_affected_reservations(self):
+        self.create_lane_reservation(self.lane, self.get_period(48, 50))
+        with mock.patch("apps.main.tasks.notify_closure_affected_users_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                results = apply_closure(self.closure)
+        self.assertEqual(results["cancelled_lane_reservations"], [])
+        delay.assert_not_called()
+
+
+class TestClosureNotifications(ClosureTestCase):
+    def test_each_user_gets_one_message_with_their_counts(self):
+        first = self.create_lane_reservation(self.lane, self.get_period(6, 8), [self.first_user, self.second_user])
+        second = self.create_lane_reservation(self.lane, self.get_period(10, 12), [self.first_user])
+        locker_reservation = LockerReservation.objects.create(
+            locker=self.locker, user=self.first_user, period=self.get_period(6, 8)
+        )
+
+        messages = get_closure_notification_messages(
+            self.closure, [first.id, second.id], [locker_reservation.id], [first.id], []
+        )
+
+        self.assertEqual(
+            [recipients for subject, message, sender, recipients in messages],
+            [
+                [self.first_user.email],
+                [self.second_user.email],
+            ],
+        )
+        self.assertIn("3 of your reservations there have been cancelled", messages[0][1])
+        self.assertIn("1 of them have been rebooked", messages[0][1])
+        self.assertIn("1 of your reservations there have been cancelled", messages[1][1])
+        self.assertIn("1 of them have been rebooked", messages[1][1])
+
+    def test_counts_are_kept_when_no_locker_reservations_are_affected(self):
+        lane_reservation = self.create_lane_reservation(self.lane, self.get_period(6, 8), [self.first_user])
+        messages = get_closure_notification_messages(self.closure, [lane_reservation.id], [], [lane_reservation.id], [])
+        self.assertEqual(len(messages), 1)
+        self.assertIn("1 of your reservations there have been cancelled", messages[0][1])
+        self.assertIn("1 of them have been rebooked", messages[0][1])
+
+    def test_emails_are_sent_in_batches(self):
+        user_count = CLOSURE_NOTIFICATION_BATCH_SIZE * 2 + 50
+        users = User.objects.bulk_create([User(email=f"swimmer{index}@example.com") for index in range(user_count)])
+        lane_reservation = self.create_lane_reservation(self.lane, self.get_period(6, 8), users)
+
+        with mock.patch("apps.main.tasks.send_mass_mail", wraps=send_mass_mail) as mocked_send_mass_mail:
+            sent = notify_closure_affected_users_task(self.closure.id, [lane_reservation.id], [])
+
+        self.assertEqual(sent, user_count)
+        self.assertEqual(
+            [len(call.args[0]) for call in mocked_send_mass_mail.call_args_list],
+            [CLOSURE_NOTIFICATION_BATCH_SIZE, CLOSURE_NOTIFICATION_BATCH_SIZE, 50],
+        )
+        # All batches share one connection
+        self.assertEqual(len({call.kwargs["connection"] for call in mocked_send_mass_mail.call_args_list}), 1)
+        self.assertEqual(len(mail.outbox), user_count)
@@ -0,0 +1,109 @@
+import json
+from unittest import mock
+
+from apps.main.events_utils import (
+    EVENT_QUEUE_SIZE,
+    RESET_EVENT,
+    EventBroker,
+    EventStream,
+    EventSubscription,
+    format_server_sent_event,
+    get_event_filters,
+)
+from apps.users.models import User
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+
+def get_event(event_type="lane_reservation", pool=1, resource=10, reservation_id=100):
+    return {"type": event_type, "action": "created", "id": reservation_id, "pool": pool, "resource": resource}
+
+
+class TestEventSubscription(SimpleTestCase):
+    def test_matches(self):
+        self.assertTrue(EventSubscription({}).matches(get_event()))
+        self.assertTrue(EventSubscription({"pool": 1}).matches(get_event()))
+        self.assertFalse(EventSubscription({"pool": 2}).matches(get_event()))
+        self.assertTrue(EventSubscription({"lane": 10}).matches(get_event()))
+        # Lanes and Lockers share the `resource` field, so the type must match too
+        self.assertFalse(EventSubscription({"locker": 10}).matches(get_event()))
+        self.assertTrue(EventSubscription({"type": "closure"}).matches(get_event("closure")))
+
+    def test_overflow_resets(self):
+        subscription = EventSubscription({})
+        for reservation_id in range(EVENT_QUEUE_SIZE + 1):
+            subscription.put(get_event(reservation_id=reservation_id))
+        self.assertEqual(subscription.queue.qsize(), 1)
+        self.assertEqual(subscription.queue.get_nowait(), RESET_EVENT)
+
+
+class TestEventBroker(SimpleTestCase):
+    def test_publish(self):
+        # Subscriptions are added directly, so no listener thread is started
+        broker = EventBroker()
+        pool_subscription = EventSubscription({"pool": 1})
+        lane_subscription = EventSubscription({"lane": 11})
+        broker.subscriptions.update({pool_subscription, lane_subscription})
+
+        broker.publish(get_event())
+        self.assertEqual(pool_subscription.queue.get_nowait()["id"], 100)
+        self.assertTrue(lane_subscription.queue.empty())
+
+        broker.unsubscribe(pool_subscription)
+        broker.publish(get_event(resource=11))
+        self.assertTrue(pool_subscription.queue.empty())
+        self.assertEqual(lane_subscription.queue.get_nowait()["resource"], 11)
+
+    def test_subscriptions_are_capped(self):
+        broker = EventBroker(max_subscriptions=2)
+        # Stands in for the listener thread, so none is started
+        broker.listener = mock.Mock()
+        first_subscription = broker.subscribe()
+        self.assertIsNotNone(broker.subscribe({"pool": 1}))
+        self.assertIsNone(broker.subscribe())
+
+        # Closing a stream frees its subscription, even if it was never iterated
+        EventStream(broker, first_subscription).close()
+        self.assertIsNotNone(broker.subscribe())
+
+
+class TestEventFormatting(SimpleTestCase):
+    def test_event_filters(self):
+        self.assertEqual(get_event_filters(QueryDict("pool=3&type=closure&lane=")), {"pool": 3, "type": "closure"})
+        with self.assertRaises(ValueError):
+            get_event_filters(QueryDict("pool=three"))
+
+    def test_server_sent_event(self):
+        message = format_server_sent_event(get_event())
+        self.assertTrue(message.startswith("event: lane_reservation\ndata: "))
+        self.assertTrue(message.endswith("\n\n"))
+        self.assertEqual(json.loads(message.split("data: ", 1)[1]), get_event())
+
+
+class TestEventsView(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = EventBroker(max_subscriptions=1)
+        self.broker.listener = mock.Mock()
+        patcher = mock.patch("apps.main.views.views.get_event_broker", return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_anonymous_users_are_refused(self):
+        response = self.client.get(reverse("main:events_view"))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.broker.subscriptions, set())
+
+    def test_streams_beyond_the_cap_are_refused(self):
+        self.client.force_login(User.objects.create_user("display@example.com", "password"))
+        response = self.client.get(reverse("main:events_view"), {"pool": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(next(iter(response.streaming_content)), b"retry: 5000\n\n")
+
+        refused = self.client.get(reverse("main:events_view"))
+        self.assertEqual(refused.status_code, 503)
+        self.assertIn("Retry-After", refused)
+
+        response.close()
+        self.assertEqual(self.broker.subscriptions, set())
@@ -0,0 +1,86 @@
+from apps.main.closure_utils import cancel_closure_reservations
+from apps.main.models import (
+    Closure,
+    Lane,
+    LaneOccupancy,
+    LaneReservation,
+    Pool,
+    PoolOccupancy,
+)
+from apps.main.occupancy_utils import (
+    get_pool_occupancy_heatmap_cache_key,
+    get_week_start,
+)
+from apps.users.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from psycopg2.extras import DateRange, DateTimeTZRange, NumericRange
+
+
+class TestOccupancyUtils(SimpleTestCase):
+    def test_get_week_start(self):
+        sunday = timezone.datetime(2026, 10, 18).date()
+        for day_offset in range(7):
+            self.assertEqual(get_week_start(sunday + timezone.timedelta(days=day_offset)), sunday)
+        self.assertEqual(get_week_start(sunday - timezone.timedelta(days=1)), sunday - timezone.timedelta(days=7))
+
+    def test_cache_key_is_per_pool_and_week(self):
+        week_start = timezone.datetime(2026, 10, 18).date()
+        self.assertEqual(get_pool_occupancy_heatmap_cache_key(3, week_start), "pool_occupancy_heatmap:3:2026-10-18")
+        self.assertNotEqual(
+            get_pool_occupancy_heatmap_cache_key(3, week_start), get_pool_occupancy_heatmap_cache_key(4, week_start)
+        )
+
+
+class TestIsInWater(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.datetime(2026, 11, 2, 7, tzinfo=timezone.utc)
+
+    def test_checked_in(self):
+        self.assertTrue(LaneReservation(actual=DateTimeTZRange(self.now, None)).is_in_water())
+
+    def test_not_checked_in(self):
+        self.assertFalse(LaneReservation().is_in_water())
+
+    def test_checked_out(self):
+        actual = DateTimeTZRange(self.now, self.now + timezone.timedelta(hours=1))
+        self.assertFalse(LaneReservation(actual=actual).is_in_water())
+
+    def test_cancelled(self):
+        lane_reservation = LaneReservation(actual=DateTimeTZRange(self.now, None), cancelled=self.now)
+        self.assertFalse(lane_reservation.is_in_water())
+
+
+class TestClosureCancellationOccupancy(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.pool = Pool.objects.create(name="Test Pool", address="1 Main St", depth_range=NumericRange(3, 12))
+        self.lane = Lane.objects.create(name="Lane 1", pool=self.pool, max_swimmers=4, per_hour_cost=5)
+        today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.lane_reservation = LaneReservation.objects.create(
+            lane=self.lane, period=DateTimeTZRange(today, today + timezone.timedelta(hours=2))
+        )
+        self.lane_reservation.users.add(
+            User.objects.create_user("first@example.com", "password"),
+            User.objects.create_user("second@example.com", "password"),
+        )
+        self.lane_reservation.check_in()
+        self.closure = Closure.objects.create(
+            pool=self.pool,
+            dates=DateRange(today.date(), today.date() + timezone.timedelta(days=1)),
+            reason="Filter cleaning",
+        )
+
+    def test_swimmers_in_the_water_are_taken_off_the_counters(self):
+        self.assertEqual(LaneOccupancy.objects.get(lane=self.lane).swimmers, 2)
+        cancelled_ids = cancel_closure_reservations(self.closure, LaneReservation, Lane)
+        self.assertEqual(cancelled_ids, [self.lane_reservation.id])
+        self.assertEqual(LaneOccupancy.objects.get(lane=self.lane).swimmers, 0)
+        self.assertEqual(PoolOccupancy.objects.get(pool=self.pool).swimmers, 0)
+
+        # Cancelling again finds nothing, and leaves the counters alone
+        self.assertEqual(cancel_closure_reservations(self.closure, LaneReservation, Lane), [])
+        self.assertEqual(LaneOccupancy.objects.get(lane=self.lane).swimmers, 0)
@@ -0,0 +1,49 @@
+from apps.main.models import (
+    Closure,
+    InvoiceLine,
+    Lane,
+    LaneReservation,
+    LaneSlot,
+    Locker,
+    LockerReservation,
+    Pool,
+)
+from django.test import SimpleTestCase
+
+
+def get_sql(queryset) -> str:
+    sql, params = queryset.query.sql_with_params()
+    return sql
+
+
+class TestDefaultOrdering(SimpleTestCase):
+    def test_default_ordering_needs_no_joins(self):
+        for queryset in (
+            Closure.objects.all(),
+            Lane.objects.all(),
+            Locker.objects.all(),
+            LaneReservation.objects.all(),
+            LaneReservation.all_objects.all(),
+            LockerReservation.objects.all(),
+            LaneSlot.objects.all(),
+            InvoiceLine.objects.all(),
+        ):
+            with self.subTest(model=queryset.model.__name__):
+                self.assertNotIn("JOIN", get_sql(queryset))
+
+    def test_pool_scoped_querysets_join_only_the_resource(self):
+        sql = get_sql(LaneReservation.objects.for_pool(Pool(id=1)))
+        self.assertIn('"main_lane"', sql)
+        self.assertNotIn('"main_pool"', sql)
+        self.assertTrue(sql.endswith('ORDER BY "main_lanereservation"."period" ASC, "main_lanereservation"."id" ASC'))
+
+    def test_pool_name_ordering_is_opt_in(self):
+        for queryset in (
+            Closure.objects.order_by_pool_name(),
+            Lane.objects.order_by_pool_name(),
+            Locker.objects.order_by_pool_name(),
+            LaneReservation.objects.for_pool(Pool(id=1)).order_by_pool_name(),
+            LockerReservation.all_objects.order_by_pool_name(),
+        ):
+            with self.subTest(model=queryset.model.__name__):
+                self.assertIn('ORDER BY "main_pool"."name" ASC', get_sql(queryset))
@@ -0,0 +1,88 @@
+import datetime
+from unittest import mock
+
+from apps.main.models import Invoice, OutboxEvent
+from apps.main.outbox_utils import (
+    OUTBOX_RETRY_DELAY,
+    get_event_date_ranges,
+    get_event_week_starts,
+    get_matching_events,
+    get_retry_delay,
+    refresh_invoices,
+)
+from apps.users.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+
+class TestOutboxEvents(SimpleTestCase):
+    def test_matching_events(self):
+        events = [
+            OutboxEvent(topic="lane_reservation.cancelled"),
+            OutboxEvent(topic="locker_reservation.cancelled"),
+            OutboxEvent(topic="closure.created"),
+        ]
+        self.assertEqual(get_matching_events(events, ("lane_reservation.*",)), events[:1])
+        self.assertEqual(get_matching_events(events, ("*.cancelled", "closure.created")), events)
+
+    def test_retry_delay_doubles(self):
+        self.assertEqual(get_retry_delay(1), OUTBOX_RETRY_DELAY)
+        self.assertEqual(get_retry_delay(3), OUTBOX_RETRY_DELAY * 4)
+
+    @override_settings(TIME_ZONE="UTC")
+    def test_rescheduled_reservation_date_ranges(self):
+        event = OutboxEvent(
+            topic="lane_reservation.rescheduled",
+            payload={
+                "start": "2026-03-02T06:00:00+00:00",
+                "end": "2026-03-02T07:00:00+00:00",
+                "previous_start": "2026-02-27T23:00:00+00:00",
+                "previous_end": "2026-02-28T01:00:00+00:00",
+            },
+        )
+        self.assertEqual(
+            get_event_date_ranges(event),
+            [
+                (datetime.date(2026, 3, 2), datetime.date(2026, 3, 2)),
+                (datetime.date(2026, 2, 27), datetime.date(2026, 2, 28)),
+            ],
+        )
+        # Weeks start on Sunday
+        self.assertEqual(get_event_week_starts(event), {datetime.date(2026, 3, 1), datetime.date(2026, 2, 22)})
+
+    def test_closure_week_starts(self):
+        event = OutboxEvent(topic="closure.created", payload={"start": "2026-03-06", "end": "2026-03-16"})
+        self.assertEqual(
+            get_event_week_starts(event),
+            {datetime.date(2026, 3, 1), datetime.date(2026, 3, 8), datetime.date(2026, 3, 15)},
+        )
+
+
+@override_settings(TIME_ZONE="UTC")
+class TestRefreshInvoices(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        user = User.objects.create_user("swimmer@example.com", "password")
+        Invoice.objects.create(user=user, month=datetime.date(2026, 2, 1))
+
+    def get_event(self, start, end):
+        return OutboxEvent(topic="lane_reservation.cancelled", payload={"start": start, "end": end})
+
+    def test_billed_months_are_queued_once_on_commit(self):
+        events = [
+            self.get_event("2026-02-03T06:00:00+00:00", "2026-02-03T07:00:00+00:00"),
+            self.get_event("2026-02-10T06:00:00+00:00", "2026-02-10T07:00:00+00:00"),
+            # Not billed yet
+            self.get_event("2026-03-02T06:00:00+00:00", "2026-03-02T07:00:00+00:00"),
+        ]
+        with mock.patch("apps.main.tasks.run_invoices_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                refresh_invoices(events)
+                delay.assert_not_called()
+            delay.assert_called_once_with("2026-02")
+
+            # A later batch doesn't queue the month again until its task has started
+            with self.captureOnCommitCallbacks(execute=True):
+                refresh_invoices(events[:1])
+            delay.assert_called_once_with("2026-02")
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from apps.main.admin import PeriodListFilter
+from apps.main.pagination_utils import (
+    ESTIMATED_COUNT_THRESHOLD,
+    EstimatedCountPaginator,
+)
+from django.db.models import QuerySet
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+
+class CountedQuerySet(QuerySet):
+    def count(self):
+        return 42
+
+
+class TestEstimatedCountPaginator(SimpleTestCase):
+    def test_lists_are_counted_exactly(self):
+        self.assertEqual(EstimatedCountPaginator(list(range(25)), 10).num_pages, 3)
+
+    def test_large_querysets_are_estimated(self):
+        queryset = mock.MagicMock(spec=QuerySet)
+        with mock.patch("apps.main.pagination_utils.get_estimated_count", return_value=ESTIMATED_COUNT_THRESHOLD * 5):
+            self.assertEqual(EstimatedCountPaginator(queryset, 100).count, ESTIMATED_COUNT_THRESHOLD * 5)
+        queryset.count.assert_not_called()
+
+    def test_small_querysets_are_counted_exactly(self):
+        with mock.patch("apps.main.pagination_utils.get_estimated_count", return_value=40):
+            self.assertEqual(EstimatedCountPaginator(CountedQuerySet(), 100).count, 42)
+
+
+class TestPeriodListFilter(SimpleTestCase):
+    def get_period(self, value):
+        return PeriodListFilter.get_period(None, value)
+
+    def test_day(self):
+        period = self.get_period("2026-10-20")
+        self.assertEqual(timezone.localtime(period.lower).date(), timezone.datetime(2026, 10, 20).date())
+        self.assertEqual(period.upper - period.lower, timezone.timedelta(days=1))
+
+    def test_ranges(self):
+        self.assertEqual(
+            self.get_period("next_7_days").upper - self.get_period("next_7_days").lower, timezone.timedelta(days=7)
+        )
+        self.assertIsNone(self.get_period("past").lower)
+        self.assertEqual(timezone.localtime(self.get_period("this_month").lower).day, 1)
+
+    def test_invalid_value(self):
+        self.assertIsNone(self.get_period("someday"))
+        self.assertIsNone(self.get_period(None))
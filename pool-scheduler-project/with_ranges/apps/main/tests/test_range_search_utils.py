@@ -0,0 +1,111 @@
+import datetime
+from unittest import mock
+
+from apps.main.range_search_utils import (
+    RANGE_SEARCH_MAX_WINDOWS,
+    get_id_list,
+    get_range_search_sql,
+    get_recurring_windows,
+    get_recurring_windows_from_json,
+    get_windows_from_json,
+    search_reservation_ranges,
+)
+from django.test import SimpleTestCase
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+NO_FILTERS = {"pools": [], "resources": [], "users": []}
+
+
+def get_window(day: int, hour: int = 9) -> DateTimeTZRange:
+    lower = timezone.datetime(2023, 6, day, hour, tzinfo=timezone.utc)
+    return DateTimeTZRange(lower, lower + timezone.timedelta(hours=2))
+
+
+class TestWindows(SimpleTestCase):
+    def test_windows_from_json(self):
+        windows = get_windows_from_json([{"start": "2023-06-02T17:00:00+00:00", "end": "2023-06-02T21:00:00+00:00"}])
+        self.assertEqual(windows[0].upper - windows[0].lower, timezone.timedelta(hours=4))
+
+    def test_empty_or_backwards_windows_are_invalid(self):
+        with self.assertRaises(ValueError):
+            get_windows_from_json([{"start": "2023-06-02T21:00:00", "end": "2023-06-02T17:00:00"}])
+        with self.assertRaises(ValueError):
+            get_windows_from_json([{"start": "2023-06-02T21:00:00"}])
+
+    def test_recurring_windows_fall_on_the_given_weekdays(self):
+        # Every Friday evening of June 2023
+        windows = get_recurring_windows(
+            datetime.date(2023, 6, 1), datetime.date(2023, 6, 30), {4}, datetime.time(17), datetime.time(21)
+        )
+        self.assertEqual([timezone.localtime(window.lower).day for window in windows], [2, 9, 16, 23, 30])
+        self.assertEqual(timezone.localtime(windows[0].upper).hour, 21)
+
+    def test_recurring_windows_can_span_midnight(self):
+        windows = get_recurring_windows(
+            datetime.date(2023, 6, 2), datetime.date(2023, 6, 2), {4}, datetime.time(22), datetime.time(2)
+        )
+        self.assertEqual(timezone.localtime(windows[0].upper).date(), datetime.date(2023, 6, 3))
+
+    def test_recurrence_must_be_bounded(self):
+        with self.assertRaises(ValueError):
+            get_recurring_windows_from_json(
+                {"first_date": "2020-01-01", "last_date": "2030-01-01", "start_time": "17:00", "end_time": "21:00"}
+            )
+        with self.assertRaises(ValueError):
+            get_recurring_windows_from_json(
+                {"first_date": "2023-06-01", "last_date": "2023-06-30", "start_time": "17:00", "end_time": "17:00"}
+            )
+
+    def test_id_list(self):
+        self.assertEqual(get_id_list(None), [])
+        self.assertEqual(get_id_list("3"), [3])
+        self.assertEqual(get_id_list([1, "2"]), [1, 2])
+        with self.assertRaises(ValueError):
+            get_id_list(["x"])
+
+
+class TestRangeSearchSql(SimpleTestCase):
+    def test_windows_are_unnested_and_joined_with_the_relation(self):
+        sql = get_range_search_sql("lane", "contained_by", "active", NO_FILTERS)
+        self.assertIn("unnest(%(windows)s::tstzrange[])", sql)
+        self.assertIn("r.period <@ w.search_window", sql)
+        self.assertIn("r.cancelled IS NULL", sql)
+        self.assertNotIn("ANY(", sql)
+
+    def test_filters_are_only_added_when_given(self):
+        sql = get_range_search_sql("locker", "overlaps", "any", {"pools": [1], "resources": [2], "users": [3]})
+        self.assertIn("resource.pool_id = ANY(%(pools)s)", sql)
+        self.assertIn("r.locker_id = ANY(%(resources)s)", sql)
+        self.assertIn("r.user_id = ANY(%(users)s)", sql)
+
+
+class TestSearchReservationRanges(SimpleTestCase):
+    def search(self, rows, windows):
+        cursor = mock.MagicMock()
+        cursor.fetchall.return_value = rows
+        with mock.patch("apps.main.range_search_utils.connection") as connection:
+            connection.cursor.return_value.__enter__.return_value = cursor
+            return search_reservation_ranges("lane", windows)
+
+    def test_invalid_searches_raise(self):
+        for arguments in (
+            {"kind": "pool", "windows": [get_window(1)]},
+            {"kind": "lane", "windows": [get_window(1)], "relation": "adjacent"},
+            {"kind": "lane", "windows": [get_window(1)], "cancelled": "maybe"},
+            {"kind": "lane", "windows": []},
+            {"kind": "lane", "windows": [get_window(1)] * (RANGE_SEARCH_MAX_WINDOWS + 1)},
+        ):
+            with self.assertRaises(ValueError):
+                search_reservation_ranges(**arguments)
+
+    def test_matches_are_grouped_by_window_with_details_once(self):
+        period = DateTimeTZRange(get_window(1).lower, get_window(2).upper)
+        results = self.search(
+            [(0, 5, 1, 2, [7], period, None), (1, 5, 1, 2, [7], period, None)],
+            [get_window(1), get_window(2), get_window(3)],
+        )
+        self.assertEqual([window["reservations"] for window in results["windows"]], [[5], [5], []])
+        self.assertEqual(len(results["reservations"]), 1)
+        self.assertEqual(results["reservations"][0]["lane"], 2)
+        self.assertFalse(results["truncated"])
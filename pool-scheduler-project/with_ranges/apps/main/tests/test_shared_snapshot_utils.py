@@ -0,0 +1,122 @@
+import os
+import tempfile
+from unittest import mock
+
+import numpy as np
+from apps.main.shared_snapshot_utils import (
+    SHARED_SNAPSHOT_MAX_AGE,
+    SharedReservationSnapshot,
+    get_fresh_shared_snapshot,
+    get_offsets,
+    get_shared_snapshot,
+    write_shared_snapshot_file,
+)
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+DAY_START = timezone.datetime(2026, 11, 2, tzinfo=timezone.utc)
+
+
+def get_epoch(hours):
+    return int(DAY_START.timestamp()) + int(hours) * 3600
+
+
+def get_period(start_hour, end_hour):
+    return DateTimeTZRange(
+        DAY_START + timezone.timedelta(hours=start_hour), DAY_START + timezone.timedelta(hours=end_hour)
+    )
+
+
+def get_arrays(lane_reservations=((1, 6, 8), (1, 10, 12), (3, 6, 7))):
+    """Pool 1 has Lanes 1 and 2, Pool 2 has Lane 3 and is closed from hour 20, and no Pool has Lockers"""
+    lane_reservations = np.array(lane_reservations, dtype=np.int64).reshape(-1, 3)
+    lane_resource_ids = np.array([1, 2, 3], dtype=np.int64)
+    pool_ids = np.array([1, 2], dtype=np.int64)
+    closures = np.array([[2, get_epoch(20), get_epoch(44)]], dtype=np.int64)
+    empty = np.empty(0, dtype=np.int64)
+    return {
+        "lane_resource_ids": lane_resource_ids,
+        "lane_pool_ids": np.array([1, 1, 2], dtype=np.int64),
+        "lane_offsets": get_offsets(lane_resource_ids, lane_reservations[:, 0]),
+        "lane_reservation_resource_ids": lane_reservations[:, 0],
+        "lane_starts": np.array([get_epoch(hour) for hour in lane_reservations[:, 1]], dtype=np.int64),
+        "lane_ends": np.array([get_epoch(hour) for hour in lane_reservations[:, 2]], dtype=np.int64),
+        "locker_resource_ids": empty,
+        "locker_pool_ids": empty,
+        "locker_offsets": get_offsets(empty, empty),
+        "locker_reservation_resource_ids": empty,
+        "locker_starts": empty,
+        "locker_ends": empty,
+        "closure_pool_ids": pool_ids,
+        "closure_offsets": get_offsets(pool_ids, closures[:, 0]),
+        "closure_starts": closures[:, 1],
+        "closure_ends": closures[:, 2],
+    }
+
+
+class TestSharedReservationSnapshot(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "reservation_snapshot.bin")
+        write_shared_snapshot_file(self.path, get_arrays(), DAY_START.timestamp())
+        self.snapshot = SharedReservationSnapshot(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_offsets(self):
+        self.assertEqual(list(get_offsets(np.array([1, 2, 3]), np.array([1, 1, 3]))), [0, 2, 2, 3])
+
+    def test_round_trip(self):
+        self.assertEqual(self.snapshot.built_at, DAY_START)
+        for name, array in get_arrays().items():
+            self.assertTrue(np.array_equal(self.snapshot.arrays[name], array), name)
+
+    def test_is_available(self):
+        self.assertFalse(self.snapshot.is_available("lane", 1, get_period(7, 9)))
+        self.assertTrue(self.snapshot.is_available("lane", 1, get_period(8, 10)))
+        self.assertTrue(self.snapshot.is_available("lane", 2, get_period(7, 9)))
+        # Lane 3's Pool is closed
+        self.assertTrue(self.snapshot.is_available("lane", 3, get_period(8, 10)))
+        self.assertFalse(self.snapshot.is_available("lane", 3, get_period(19, 21)))
+        # Unknown Lane
+        self.assertFalse(self.snapshot.is_available("lane", 4, get_period(8, 10)))
+
+    def test_is_reserved(self):
+        self.assertTrue(self.snapshot.is_reserved("lane", 1, get_period(7, 9)))
+        self.assertFalse(self.snapshot.is_reserved("lane", 2, get_period(7, 9)))
+        # Closures don't reserve a Lane, and unknown Lanes are left to the database
+        self.assertFalse(self.snapshot.is_reserved("lane", 3, get_period(19, 21)))
+        self.assertIsNone(self.snapshot.is_reserved("lane", 4, get_period(8, 10)))
+
+    def test_available_resource_ids(self):
+        self.assertEqual(self.snapshot.get_available_resource_ids("lane", 1, get_period(7, 11)), [2])
+        self.assertEqual(self.snapshot.get_available_resource_ids("lane", 1, get_period(8, 10)), [1, 2])
+        self.assertEqual(self.snapshot.get_available_resource_ids("lane", 2, get_period(20, 22)), [])
+        self.assertEqual(self.snapshot.get_available_resource_ids("locker", 1, get_period(8, 10)), [])
+
+    def test_swap(self):
+        with override_settings(RESERVATION_SNAPSHOT_PATH=self.path):
+            snapshot = get_shared_snapshot()
+            self.assertIs(get_shared_snapshot(), snapshot)
+
+            write_shared_snapshot_file(self.path, get_arrays(lane_reservations=()), DAY_START.timestamp())
+            new_snapshot = get_shared_snapshot()
+            self.assertIsNot(new_snapshot, snapshot)
+            self.assertTrue(new_snapshot.is_available("lane", 1, get_period(7, 9)))
+            # The previous mapping stays readable after the swap
+            self.assertFalse(snapshot.is_available("lane", 1, get_period(7, 9)))
+
+        with override_settings(RESERVATION_SNAPSHOT_PATH=os.path.join(self.directory.name, "missing.bin")):
+            self.assertIsNone(get_shared_snapshot())
+
+    def test_fresh_snapshot(self):
+        with override_settings(RESERVATION_SNAPSHOT_PATH=self.path):
+            with mock.patch("apps.main.shared_snapshot_utils.timezone.now", return_value=DAY_START):
+                self.assertIsNotNone(get_fresh_shared_snapshot())
+            stale = DAY_START + SHARED_SNAPSHOT_MAX_AGE + timezone.timedelta(seconds=1)
+            with mock.patch("apps.main.shared_snapshot_utils.timezone.now", return_value=stale):
+                self.assertIsNone(get_fresh_shared_snapshot())
@@ -0,0 +1,177 @@
+import threading
+from unittest import mock
+
+from apps.main.allocation_utils import LaneRequest, reserve_lane_requests
+from apps.main.models import Lane, LaneReservation, LaneSlot, Pool
+from apps.main.slot_utils import (
+    claim_lane_slots,
+    generate_lane_slots,
+    get_lane_slot_count,
+)
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange, NumericRange
+
+
+def get_period(start_minutes, end_minutes):
+    day = timezone.datetime(2026, 11, 2, 6, tzinfo=timezone.utc)
+    return DateTimeTZRange(
+        day + timezone.timedelta(minutes=start_minutes), day + timezone.timedelta(minutes=end_minutes)
+    )
+
+
+class TestGetLaneSlotCount(SimpleTestCase):
+    def test_slot_count(self):
+        self.assertEqual(get_lane_slot_count(get_period(0, 30)), 1)
+        self.assertEqual(get_lane_slot_count(get_period(30, 180)), 5)
+
+    def test_unaligned_period(self):
+        with self.assertRaises(ValidationError):
+            get_lane_slot_count(get_period(15, 60))
+        with self.assertRaises(ValidationError):
+            get_lane_slot_count(get_period(0, 45))
+
+    def test_empty_or_unbounded_period(self):
+        with self.assertRaises(ValidationError):
+            get_lane_slot_count(get_period(60, 60))
+        with self.assertRaises(ValidationError):
+            get_lane_slot_count(DateTimeTZRange(get_period(0, 30).lower, None))
+
+
+@override_settings(TIME_ZONE="UTC")
+class TestLaneSlotClaims(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.pool = Pool.objects.create(
+            name="Test Pool", address="1 Main St", depth_range=NumericRange(3, 12), business_hours=NumericRange(9, 17)
+        )
+        self.lanes = [
+            Lane.objects.create(name=f"Lane {number}", pool=self.pool, max_swimmers=4, per_hour_cost=5)
+            for number in (1, 2)
+        ]
+        self.day = timezone.datetime(2026, 11, 2).date()
+        generate_lane_slots(self.pool, self.day, self.day)
+
+    def get_claimed_starts(self, lane_reservation: LaneReservation) -> list:
+        """Returns the start minutes after 09:00 of the slots claimed by the LaneReservation"""
+        return [
+            int((slot.start - get_period(180, 180).lower).total_seconds() // 60)
+            for slot in LaneSlot.objects.filter(lane_reservation=lane_reservation).order_by("start")
+        ]
+
+    def test_business_hours_are_generated_once(self):
+        self.assertEqual(LaneSlot.objects.count(), 2 * 16)
+        self.assertEqual(generate_lane_slots(self.pool, self.day, self.day), {"created": 0, "deleted": 0})
+
+    def test_reservations_created_outside_of_claims_claim_their_slots(self):
+        # 09:00 - 10:00, e.g.: from a form or the admin
+        lane_reservation = LaneReservation.objects.create(lane=self.lanes[0], period=get_period(180, 240))
+        self.assertEqual(self.get_claimed_starts(lane_reservation), [0, 30])
+
+        # 10:00 - 11:00, packed with `bulk_create()`
+        (packed, *others), unassigned = reserve_lane_requests(self.pool, [LaneRequest(get_period(240, 300), 1)])
+        self.assertEqual(self.get_claimed_starts(packed), [60, 90])
+
+        # The claimed slots are no longer free, so a claim over them moves on to the other Lane
+        self.assertEqual(claim_lane_slots(self.pool, get_period(180, 300)).lane, self.lanes[1])
+
+    def test_moved_and_cancelled_reservations_release_their_slots(self):
+        lane_reservation = LaneReservation.objects.create(lane=self.lanes[0], period=get_period(180, 240))
+        LaneReservation.objects.filter(id=lane_reservation.id).update(lane=self.lanes[1], period=get_period(210, 270))
+        self.assertEqual(list(LaneSlot.objects.filter(lane=self.lanes[0]).exclude(lane_reservation=None)), [])
+        self.assertEqual(self.get_claimed_starts(lane_reservation), [30, 60])
+
+        lane_reservation.cancel_reservation()
+        self.assertEqual(LaneSlot.objects.free().count(), LaneSlot.objects.count())
+
+    def test_claims_use_each_lane_once(self):
+        first = claim_lane_slots(self.pool, get_period(180, 240))
+        second = claim_lane_slots(self.pool, get_period(180, 240))
+        self.assertCountEqual([first.lane, second.lane], self.lanes)
+        self.assertEqual(self.get_claimed_starts(first), [0, 30])
+        self.assertIsNone(claim_lane_slots(self.pool, get_period(210, 270)))
+
+
+@override_settings(TIME_ZONE="UTC")
+class TestConcurrentLaneSlotClaims(TransactionTestCase):
+    """Claims made in another thread, and so over another database connection, while the test's claim runs"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.pool = Pool.objects.create(
+            name="Test Pool", address="1 Main St", depth_range=NumericRange(3, 12), business_hours=NumericRange(9, 17)
+        )
+        self.lanes = [
+            Lane.objects.create(name=f"Lane {number}", pool=self.pool, max_swimmers=4, per_hour_cost=5)
+            for number in (1, 2)
+        ]
+        generate_lane_slots(self.pool, timezone.datetime(2026, 11, 2).date(), timezone.datetime(2026, 11, 2).date())
+        self.locked = threading.Event()
+        self.release = threading.Event()
+
+    def run_concurrently(self, target):
+        """Runs the target in another thread until it sets `locked`, and returns the thread and its results"""
+        results = []
+
+        def run():
+            try:
+                results.append(target())
+            finally:
+                self.locked.set()
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.assertTrue(self.locked.wait(10))
+        self.addCleanup(thread.join, 10)
+        self.addCleanup(self.release.set)
+        return thread, results
+
+    def test_a_partly_locked_lane_is_left_to_the_claim_holding_it(self):
+        # A concurrent claim of Lane 1 that has locked the Lane, but only the first of its slots so far
+        def claim_first_slot():
+            with transaction.atomic():
+                list(Lane.objects.filter(id=self.lanes[0].id).select_for_update(no_key=True))
+                list(LaneSlot.objects.filter(lane=self.lanes[0]).order_by("start")[:1].select_for_update())
+                self.locked.set()
+                self.release.wait(10)
+
+        self.run_concurrently(claim_first_slot)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(claim_lane_slots(self.pool, get_period(180, 240)).lane, self.lanes[1])
+        # Only Lane 2's slots were locked, so the concurrent claim can still lock all of Lane 1's
+        slot_locks = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith(f'SELECT "{LaneSlot._meta.db_table}"') and "FOR UPDATE" in query["sql"]
+        ]
+        self.assertEqual(len(slot_locks), 1)
+        self.assertIn(f'"lane_id" = {self.lanes[1].id}', slot_locks[0])
+        self.assertFalse(LaneSlot.objects.filter(lane=self.lanes[0]).exclude(lane_reservation=None).exists())
+
+    def test_exactly_one_claim_wins_each_lane(self):
+        Lane.objects.filter(id=self.lanes[1].id).delete()
+        create = LaneReservation.objects.create
+
+        def create_once_released(**kwargs):
+            # Holds the other thread's claim open once it has locked the Lane and its slots
+            if threading.current_thread() is not threading.main_thread():
+                self.locked.set()
+                self.release.wait(10)
+            return create(**kwargs)
+
+        with mock.patch.object(LaneReservation.objects, "create", side_effect=create_once_released):
+            thread, results = self.run_concurrently(lambda: claim_lane_slots(self.pool, get_period(180, 240)))
+            # Gives up on the Lane at once, rather than waiting for or aborting the other claim
+            self.assertIsNone(claim_lane_slots(self.pool, get_period(180, 240)))
+            self.release.set()
+            thread.join(10)
+
+        self.assertEqual(results[0].lane, self.lanes[0])
+        self.assertEqual(LaneReservation.objects.count(), 1)
@@ -0,0 +1,52 @@
+import numpy as np
+from apps.main.snapshot_utils import NULL_EPOCH, ReservationSnapshot
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+DAY_START = timezone.datetime(2026, 11, 2, tzinfo=timezone.utc)
+HOUR = 3600
+
+
+def get_epoch(hours):
+    return int(DAY_START.timestamp()) + hours * HOUR
+
+
+class TestReservationSnapshot(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.snapshot = ReservationSnapshot("lane", pool_id=1)
+        self.snapshot.set_columns(
+            {
+                "ids": np.array([1, 2, 3, 4], dtype=np.int64),
+                "resource_ids": np.array([10, 10, 11, 11], dtype=np.int64),
+                "starts": np.array([get_epoch(6), get_epoch(8), get_epoch(6), get_epoch(20)], dtype=np.int64),
+                "ends": np.array([get_epoch(8), get_epoch(18), get_epoch(7), get_epoch(30)], dtype=np.int64),
+                "cancelled": np.array([False, False, False, True]),
+                "actual_starts": np.array([get_epoch(6), get_epoch(8), NULL_EPOCH, NULL_EPOCH], dtype=np.int64),
+                "actual_ends": np.array([get_epoch(7), NULL_EPOCH, NULL_EPOCH, NULL_EPOCH], dtype=np.int64),
+            }
+        )
+
+    def test_average_length(self):
+        # Cancelled Reservation 4 is ignored
+        self.assertEqual(self.snapshot.get_average_length(), timezone.timedelta(hours=13 / 3))
+
+    def test_average_actual_length(self):
+        # Only Reservation 1 has been checked in and out
+        self.assertEqual(self.snapshot.get_average_actual_length(), timezone.timedelta(hours=1))
+
+    def test_ids_longer_than(self):
+        self.assertEqual(list(self.snapshot.get_ids_longer_than(timezone.timedelta(hours=8))), [2])
+        self.assertEqual(list(self.snapshot.get_ids_longer_than(timezone.timedelta(hours=1))), [1, 2])
+
+    def test_utilization(self):
+        window_end = DAY_START + timezone.timedelta(hours=12)
+        utilization = self.snapshot.get_utilization(DAY_START, window_end)
+        self.assertEqual(utilization, {10: 6 / 12, 11: 1 / 12})
+        self.assertEqual(self.snapshot.get_utilization(window_end, DAY_START), {})
+
+    def test_empty_snapshot(self):
+        snapshot = ReservationSnapshot("locker", pool_id=1)
+        self.assertEqual(len(snapshot), 0)
+        self.assertIsNone(snapshot.get_average_length())
+        self.assertEqual(snapshot.get_utilization(DAY_START, DAY_START + timezone.timedelta(days=1)), {})
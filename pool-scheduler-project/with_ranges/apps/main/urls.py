@@ -1,13 +1,20 @@
 from apps.main.views import (
+    changes_view,
+    events_view,
     home,
     home_partial_view,
     lane_reservation_actual_buttons_partial_view,
+    lane_reservation_add_user_partial_view,
     lane_reservation_cancel_partial_view,
     lane_reservation_check_in_partial_view,
     lane_reservation_check_out_partial_view,
+    lane_reservation_claim_view,
     lane_reservation_detail_view,
     lane_reservation_partial_view,
     lane_reservations_average_length_of_all_partial_view,
+    lane_reservations_batch_partial_view,
+    lane_reservations_batch_request_view,
+    lane_reservations_calendar_data_view,
     lane_reservations_contains_datetime_partial_view,
     lane_reservations_greater_than_eight_hr_partial_view,
     lane_reservations_in_the_past_partial_view,
@@ -21,12 +28,15 @@ from apps.main.views import (
     lane_reservations_year_to_date_partial_view,
     lane_tools_view,
     locker_reservation_actual_buttons_partial_view,
+    locker_reservation_allocate_view,
     locker_reservation_cancel_partial_view,
     locker_reservation_check_in_partial_view,
     locker_reservation_check_out_partial_view,
     locker_reservation_detail_view,
     locker_reservation_partial_view,
     locker_reservations_average_length_of_all_partial_view,
+    locker_reservations_batch_partial_view,
+    locker_reservations_calendar_data_view,
     locker_reservations_contains_date_partial_view,
     locker_reservations_greater_than_thirty_days_partial_view,
     locker_reservations_in_the_past_partial_view,
@@ -40,10 +50,14 @@ from apps.main.views import (
     locker_reservations_til_end_of_year_partial_view,
     locker_reservations_year_to_date_partial_view,
     locker_tools_view,
+    pool_analytics_view,
     pool_detail_view,
+    pool_free_periods_view,
     pool_list_view,
+    pool_live_occupancy_view,
     pool_tools_view,
     reservation_list_view,
+    reservation_range_search_view,
 )
 from django.urls import path
 
@@ -57,13 +71,29 @@ urlpatterns = [
         home_partial_view,
         name="home_partial_view",
     ),
+    path("changes/", changes_view, name="changes_view"),
+    path("events/", events_view, name="events_view"),
+    path("reservations/search/", reservation_range_search_view, name="reservation_range_search_view"),
     path("pools/", pool_list_view, name="pool_list_view"),
     path("pools/tools/", pool_tools_view, name="pool_tools_view"),
     path("pools/<int:pool_id>/", pool_detail_view, name="pool_detail_view"),
+    path("pools/<int:pool_id>/analytics/", pool_analytics_view, name="pool_analytics_view"),
+    path("pools/<int:pool_id>/occupancy/", pool_live_occupancy_view, name="pool_live_occupancy_view"),
+    path("pools/<int:pool_id>/free-periods/", pool_free_periods_view, name="pool_free_periods_view"),
     path("lane-tools/", lane_tools_view, name="lane_tools_view"),
     path("locker-tools/", locker_tools_view, name="locker_tools_view"),
     path("reservations/", reservation_list_view, name="reservation_list_view"),
     path("reservations/lane/", lane_reservation_partial_view, name="lane_reservation"),
+    path(
+        "reservations/lane/batch-request/",
+        lane_reservations_batch_request_view,
+        name="lane_reservations_batch_request",
+    ),
+    path(
+        "reservations/lane/claim/",
+        lane_reservation_claim_view,
+        name="lane_reservation_claim",
+    ),
     path(
         "reservations/lane/<int:lane_reservation_id>/",
         lane_reservation_detail_view,
@@ -74,6 +104,11 @@ urlpatterns = [
         lane_reservation_actual_buttons_partial_view,
         name="lane_reservation_actual_buttons",
     ),
+    path(
+        "reservations/lane/add-user/<int:lane_reservation_id>/",
+        lane_reservation_add_user_partial_view,
+        name="lane_reservation_add_user",
+    ),
     path(
         "reservations/lane/cancel/<int:lane_reservation_id>/",
         lane_reservation_cancel_partial_view,
@@ -90,6 +125,11 @@ urlpatterns = [
         name="lane_reservation_check_out",
     ),
     path("reservations/locker/", locker_reservation_partial_view, name="locker_reservation"),
+    path(
+        "reservations/locker/allocate/",
+        locker_reservation_allocate_view,
+        name="locker_reservation_allocate",
+    ),
     path(
         "reservations/locker/<int:locker_reservation_id>/",
         locker_reservation_detail_view,
@@ -161,6 +201,16 @@ urlpatterns = [
         lane_reservations_average_length_of_all_partial_view,
         name="lane_reservations_average_length_of_all",
     ),
+    path(
+        "lane-tools/lane_reservations_batch/",
+        lane_reservations_batch_partial_view,
+        name="lane_reservations_batch",
+    ),
+    path(
+        "lane-tools/lane_reservations_calendar_data/",
+        lane_reservations_calendar_data_view,
+        name="lane_reservations_calendar_data",
+    ),
     path(
         "lane-tools/lane_reservations_contains_datetime/",
         lane_reservations_contains_datetime_partial_view,
@@ -232,6 +282,16 @@ urlpatterns = [
         locker_reservations_average_length_of_all_partial_view,
         name="locker_reservations_average_length_of_all",
     ),
+    path(
+        "locker-tools/locker_reservations_batch/",
+        locker_reservations_batch_partial_view,
+        name="locker_reservations_batch",
+    ),
+    path(
+        "locker-tools/locker_reservations_calendar_data/",
+        locker_reservations_calendar_data_view,
+        name="locker_reservations_calendar_data",
+    ),
     path(
         "locker-tools/locker_reservations_overlapping_date/",
         locker_reservations_contains_date_partial_view,
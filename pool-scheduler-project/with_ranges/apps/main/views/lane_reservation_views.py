@@ -1,5 +1,26 @@
+import json
 import logging
 
+from apps.main.allocation_utils import (
+    LaneRequest,
+    reserve_lane_requests,
+    validate_lane_request,
+)
+from apps.main.batch_utils import get_reservation_batch_context
+from apps.main.calendar_utils import (
+    CALENDAR_FORMAT_BINARY,
+    CALENDAR_FORMAT_COLUMNS,
+    CALENDAR_FORMAT_DICTS,
+    CALENDAR_FORMAT_JSON,
+    encode_calendar_buckets,
+    encode_calendar_columns,
+    get_calendar_bucket_unit,
+    get_calendar_buckets,
+    get_calendar_columns,
+    get_calendar_json,
+    get_calendar_window,
+    get_calendar_window_context,
+)
 from apps.main.date_utils import (
     get_date_from_string,
     get_date_range_from_string_list,
@@ -10,8 +31,11 @@ from apps.main.date_utils import (
     get_this_month_range,
     get_this_week_range,
 )
-from apps.main.forms import DateTimeRangeForm
+from apps.main.forms import DateTimeRangeForm, LaneSlotClaimForm
 from apps.main.models import Closure, Lane, LaneReservation, Pool
+from apps.main.slot_utils import claim_lane_slots
+from apps.users.models import User
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
 from django.db.models import (
     Aggregate,
@@ -27,23 +51,31 @@ from django.db.models import (
     Value,
 )
 from django.db.models.functions import Cast, Concat
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
 from psycopg2.extras import DateTimeTZRange
 from render_block import render_block_to_string
 
 logger = logging.getLogger("with_ranges.main")
 
+# The maximum number of rows listed in each block of `lane_reservations_batch_partial_view`
+LANE_RESERVATION_BATCH_ROW_LIMIT = 25
 
-def get_lane_reservation_calendar_context(lane_reservation_queryset: QuerySet) -> dict:
+
+def get_lane_reservation_calendar_querysets(
+    lane_reservation_queryset: QuerySet, calendar_format: str = CALENDAR_FORMAT_DICTS
+) -> tuple:
     """
-    Given a `LaneReservation` QuerySet, returns a context dictionary with the components needed
-        to display reservations on a calendar, grouped by Lane
+    Given a `LaneReservation` QuerySet, returns a tuple of `.values()` QuerySets for the calendar groups (one per
+        Lane) and the calendar reservations
 
-        This function allows us to inject a calendar into various views
+    For the columnar formats, the reservations keep their `start` and `end` datetimes, rather than the formatted
+        strings and `content` label used by the other formats
     """
     lanes = (
         Lane.objects.filter(lane_reservations__in=lane_reservation_queryset)
@@ -55,6 +87,14 @@ def get_lane_reservation_calendar_context(lane_reservation_queryset: QuerySet) -
         )
     )
 
+    if calendar_format in (CALENDAR_FORMAT_COLUMNS, CALENDAR_FORMAT_BINARY):
+        return lanes, lane_reservation_queryset.values(
+            "id",
+            group=F("lane__id"),
+            start=F("period__startswith"),
+            end=F("period__endswith"),
+        )
+
     lane_reservation_queryset = lane_reservation_queryset.annotate(
         formatted_start=Func(
             F("period__startswith"), Value("YYYY-MM-DD HH24:MI:SS TZ"), function="to_char", output_field=CharField()
@@ -71,7 +111,40 @@ def get_lane_reservation_calendar_context(lane_reservation_queryset: QuerySet) -
         start=F("formatted_start"),
         end=F("formatted_end"),
     )
+    return lanes, lane_reservation_queryset
+
+
+def get_lane_reservation_calendar_context(
+    lane_reservation_queryset: QuerySet, calendar_format: str = CALENDAR_FORMAT_DICTS
+) -> dict:
+    """
+    Given a `LaneReservation` QuerySet, returns a context dictionary with the components needed
+        to display reservations on a calendar, grouped by Lane
+
+        This function allows us to inject a calendar into various views
+
+    The `calendar_format` determines how the calendar data is provided to the template:
+
+    - `CALENDAR_FORMAT_DICTS`: lists of dictionaries in `calendar_groups` and `calendar_reservations`
+    - `CALENDAR_FORMAT_JSON`: the complete calendar JSON document built by Postgres in `calendar_json`, without
+        creating any Python-side row objects
+    - `CALENDAR_FORMAT_COLUMNS`: compact columnar JSON in `calendar_columns`, with the labels rendered client-side
+    """
+    lanes, lane_reservation_queryset = get_lane_reservation_calendar_querysets(
+        lane_reservation_queryset, calendar_format
+    )
+
     context = {}
+    context["calendar_item_kind"] = "Lane"
+    if calendar_format == CALENDAR_FORMAT_JSON:
+        context["calendar_json"] = get_calendar_json(lanes, lane_reservation_queryset).decode()
+        return context
+
+    if calendar_format == CALENDAR_FORMAT_COLUMNS:
+        calendar_columns = get_calendar_columns(lanes, lane_reservation_queryset)
+        context["calendar_columns"] = json.dumps(calendar_columns, separators=(",", ":")).replace("<", "\\u003c")
+        return context
+
     context["calendar_groups"] = list(lanes)
     context["calendar_reservations"] = list(lane_reservation_queryset)
     return context
@@ -119,6 +192,33 @@ def lane_reservation_actual_buttons_partial_view(request, lane_reservation_id):
     return HttpResponse(html)
 
 
+@require_POST
+def lane_reservation_add_user_partial_view(request, lane_reservation_id):
+    """
+    Adds the user chosen with the typeahead search (see `user_search_view`) to a Lane Reservation, and returns the
+        updated list of its users, with the reason if the user could not be added
+    """
+    template = "main/lane_reservation_partials.html"
+    context = {}
+
+    if not request.user.is_authenticated:
+        return HttpResponse("Authentication required", status=403)
+
+    lane_reservation = get_object_or_404(LaneReservation.objects.select_related("lane"), id=lane_reservation_id)
+    user = User.objects.filter(id=request.POST.get("user") or None).first()
+    if user is None:
+        context["errors"] = ["Choose a user to add"]
+    else:
+        try:
+            lane_reservation.add_user(user)
+        except ValidationError as e:
+            context["errors"] = e.messages
+
+    context["lane_reservation"] = lane_reservation
+    html = render_block_to_string(template, "lane_reservation_users", context)
+    return HttpResponse(html)
+
+
 def lane_reservation_cancel_partial_view(request, lane_reservation_id):
     """
     Handles cancellation of a Reservation
@@ -227,7 +327,7 @@ def lane_reservations_this_month_partial_view(request):
     lane_page_number = request.GET.get("page")
     context["lane_reservations_this_month_page"] = lane_paginator.get_page(lane_page_number)
 
-    context = {**context, **get_lane_reservation_calendar_context(lane_reservations_this_month)}
+    context = {**context, **get_lane_reservation_calendar_context(lane_reservations_this_month, CALENDAR_FORMAT_JSON)}
     html = render_block_to_string(template, "lane_reservations_this_month", context)
     return HttpResponse(html)
 
@@ -242,7 +342,10 @@ def lane_reservations_in_the_past_partial_view(request):
     lane_reservations_in_the_past = LaneReservation.objects.filter(period__endswith__lt=timezone.now())
     context["lane_reservations_in_the_past"] = lane_reservations_in_the_past
 
-    context = {**context, **get_lane_reservation_calendar_context(lane_reservations_in_the_past)}
+    context = {
+        **context,
+        **get_lane_reservation_calendar_context(lane_reservations_in_the_past, CALENDAR_FORMAT_COLUMNS),
+    }
     html = render_block_to_string(template, "lane_reservations_in_the_past", context)
     return HttpResponse(html)
 
@@ -255,12 +358,18 @@ def lane_reservations_year_to_date_partial_view(request):
     template = "main/lane_reservation_partials.html"
     context = {}
 
-    lane_reservations_year_to_date = LaneReservation.objects.filter(
-        period__overlap=DateTimeTZRange(get_start_datetime_of_this_year(), timezone.now())
-    )
+    calendar_window = DateTimeTZRange(get_start_datetime_of_this_year(), timezone.now())
+    lane_reservations_year_to_date = LaneReservation.objects.filter(period__overlap=calendar_window)
     context["lane_reservations_year_to_date"] = lane_reservations_year_to_date
 
-    context = {**context, **get_lane_reservation_calendar_context(lane_reservations_year_to_date)}
+    # The calendar data is fetched separately by `calendar.html`, using the compact binary format, and is
+    #   aggregated into occupancy buckets until the user zooms in
+    context["calendar_item_kind"] = "Lane"
+    calendar_data_url = reverse("main:lane_reservations_calendar_data")
+    context["calendar_binary_url"] = f"{calendar_data_url}?block=year_to_date&format={CALENDAR_FORMAT_BINARY}"
+    context["calendar_event_type"] = "lane_reservation"
+    context["calendar_events_url"] = f"{reverse('main:events_view')}?type=lane_reservation"
+    context.update(get_calendar_window_context(calendar_window))
     html = render_block_to_string(template, "lane_reservations_year_to_date", context)
     return HttpResponse(html)
 
@@ -273,12 +382,18 @@ def lane_reservations_til_end_of_year_partial_view(request):
     template = "main/lane_reservation_partials.html"
     context = {}
 
-    lane_reservations_til_end_of_year = LaneReservation.objects.filter(
-        period__overlap=DateTimeTZRange(timezone.now(), get_start_datetime_of_next_year())
-    )
+    calendar_window = DateTimeTZRange(timezone.now(), get_start_datetime_of_next_year())
+    lane_reservations_til_end_of_year = LaneReservation.objects.filter(period__overlap=calendar_window)
     context["lane_reservations_til_end_of_year"] = lane_reservations_til_end_of_year
 
-    context = {**context, **get_lane_reservation_calendar_context(lane_reservations_til_end_of_year)}
+    # The calendar data is fetched separately by `calendar.html`, using the compact binary format, and is
+    #   aggregated into occupancy buckets until the user zooms in
+    context["calendar_item_kind"] = "Lane"
+    calendar_data_url = reverse("main:lane_reservations_calendar_data")
+    context["calendar_binary_url"] = f"{calendar_data_url}?block=til_end_of_year&format={CALENDAR_FORMAT_BINARY}"
+    context["calendar_event_type"] = "lane_reservation"
+    context["calendar_events_url"] = f"{reverse('main:events_view')}?type=lane_reservation"
+    context.update(get_calendar_window_context(calendar_window))
     html = render_block_to_string(template, "lane_reservations_til_end_of_year", context)
     return HttpResponse(html)
 
@@ -441,3 +556,263 @@ def lane_reservations_overlapping_datetime_manual_partial_view(request):
 
     html = render_block_to_string(template, "lane_reservations_overlapping_datetime_manual", context)
     return HttpResponse(html)
+
+
+def get_lane_reservation_batch_filters() -> dict:
+    """
+    Returns a dictionary of the blocks available to `lane_reservations_batch_partial_view`, where each key is
+        the block name and each value is a tuple of (title, Q object) used to filter LaneReservations
+
+    The Q objects may refer to the `delta` annotation added in `get_lane_reservation_batch_context()`
+    """
+    now = timezone.now()
+    return {
+        "greater_than_eight_hr": (
+            "Reservations greater than 8 hours in Length",
+            Q(delta__gt=timezone.timedelta(hours=8)),
+        ),
+        "this_week": (
+            "Reservations This Week",
+            Q(period__overlap=get_this_week_range(starting_day_sunday=True)),
+        ),
+        "this_month": (
+            "Reservations This Month",
+            Q(period__overlap=get_this_month_range()),
+        ),
+        "in_the_past": (
+            "All Past Reservations",
+            Q(period__endswith__lt=now),
+        ),
+        "year_to_date": (
+            "Reservations Year-to-Date",
+            Q(period__overlap=DateTimeTZRange(get_start_datetime_of_this_year(), now)),
+        ),
+        "til_end_of_year": (
+            "Reservations now til End-of-Year",
+            Q(period__overlap=DateTimeTZRange(now, get_start_datetime_of_next_year())),
+        ),
+        "overdue_start": (
+            "Overdue Start",
+            Q(period__startswith__lt=now, actual__startswith__isnull=True),
+        ),
+        "overdue_end": (
+            "Overdue End",
+            Q(period__endswith__lt=now, actual__endswith__isnull=True),
+        ),
+    }
+
+
+def get_lane_reservation_batch_queryset() -> QuerySet:
+    """
+    Returns a `LaneReservation` QuerySet with the annotations needed by the filters in
+        `get_lane_reservation_batch_filters()`
+    """
+    return LaneReservation.objects.annotate(
+        delta=ExpressionWrapper(
+            F("period__endswith") - F("period__startswith"),
+            output_field=DurationField(),
+        )
+    )
+
+
+def get_lane_reservation_batch_context(block_names: list, row_limit: int = LANE_RESERVATION_BATCH_ROW_LIMIT) -> dict:
+    """
+    Given a list of block names from `get_lane_reservation_batch_filters()`, returns a context dictionary containing
+        the count and first `row_limit` reservations for each block (see `get_reservation_batch_context()`)
+    """
+    return get_reservation_batch_context(
+        get_lane_reservation_batch_queryset(),
+        get_lane_reservation_batch_filters(),
+        block_names,
+        row_limit,
+        "lane",
+    )
+
+
+def lane_reservations_batch_partial_view(request):
+    """
+    Renders several lane reservation blocks in a single response
+
+    - GET request without any `block` parameters returns the overview skeleton, containing a placeholder for each
+        available block, which then requests its content from this same view
+    - GET request with one or more `block` parameters (e.g.: `?block=this_week&block=overdue_end`) returns the
+        requested blocks as htmx out-of-band swaps, each replacing its matching placeholder
+    """
+    template = "main/lane_reservation_partials.html"
+    context = {}
+
+    block_names = request.GET.getlist("block")
+    if block_names:
+        context = {**context, **get_lane_reservation_batch_context(block_names)}
+        html = render_block_to_string(template, "lane_reservations_batch_oob", context)
+        return HttpResponse(html)
+
+    batch_filters = get_lane_reservation_batch_filters()
+    context["batch_blocks"] = [{"name": name, "title": title} for name, (title, block_filter) in batch_filters.items()]
+    context["batch_querystring"] = "&".join(f"block={name}" for name in batch_filters)
+    html = render_block_to_string(template, "lane_reservations_batch", context)
+    return HttpResponse(html)
+
+
+def lane_reservations_calendar_data_view(request):
+    """
+    Returns the calendar data for one of the blocks in `get_lane_reservation_batch_filters()`
+        (e.g.: `?block=this_month`), sent straight to the response
+
+    The `format` parameter selects the encoding:
+
+    - `json` (default): the calendar JSON document, built entirely by Postgres
+    - `columns`: compact columnar JSON, with parallel arrays of ids, group ids, and epoch-second start/end values
+    - `binary`: the columnar data, packed by `encode_calendar_columns()`
+
+    The optional `start` and `end` parameters (in epoch seconds) limit the data to a calendar window. For the
+        `columns` and `binary` formats, windows wider than `CALENDAR_ITEMS_MAX_SPAN` return hourly or daily
+        occupancy buckets from `get_calendar_buckets()` instead of individual reservations.
+    """
+    batch_filters = get_lane_reservation_batch_filters()
+    block_name = request.GET.get("block")
+    if block_name not in batch_filters:
+        return HttpResponseBadRequest(f"Unknown block: {block_name}")
+
+    calendar_format = request.GET.get("format", CALENDAR_FORMAT_JSON)
+    if calendar_format not in (CALENDAR_FORMAT_JSON, CALENDAR_FORMAT_COLUMNS, CALENDAR_FORMAT_BINARY):
+        return HttpResponseBadRequest(f"Unknown format: {calendar_format}")
+
+    title, block_filter = batch_filters[block_name]
+    lane_reservation_queryset = get_lane_reservation_batch_queryset().filter(block_filter)
+
+    calendar_window = None
+    if "start" in request.GET or "end" in request.GET:
+        try:
+            calendar_window = get_calendar_window(request.GET.get("start", ""), request.GET.get("end", ""))
+        except ValueError:
+            return HttpResponseBadRequest("Invalid calendar window")
+        lane_reservation_queryset = lane_reservation_queryset.filter(period__overlap=calendar_window)
+
+    lanes, lane_reservations = get_lane_reservation_calendar_querysets(lane_reservation_queryset, calendar_format)
+
+    bucket_unit = get_calendar_bucket_unit(calendar_window) if calendar_window is not None else None
+    if bucket_unit is not None and calendar_format in (CALENDAR_FORMAT_COLUMNS, CALENDAR_FORMAT_BINARY):
+        lane_reservation_periods = lane_reservation_queryset.values("period", group=F("lane__id"))
+        calendar_buckets = get_calendar_buckets(lanes, lane_reservation_periods, calendar_window, bucket_unit)
+        if calendar_format == CALENDAR_FORMAT_COLUMNS:
+            return JsonResponse(calendar_buckets, json_dumps_params={"separators": (",", ":")})
+        return HttpResponse(encode_calendar_buckets(calendar_buckets), content_type="application/octet-stream")
+
+    if calendar_format == CALENDAR_FORMAT_COLUMNS:
+        return JsonResponse(
+            get_calendar_columns(lanes, lane_reservations), json_dumps_params={"separators": (",", ":")}
+        )
+
+    if calendar_format == CALENDAR_FORMAT_BINARY:
+        return HttpResponse(
+            encode_calendar_columns(get_calendar_columns(lanes, lane_reservations)),
+            content_type="application/octet-stream",
+        )
+
+    return HttpResponse(get_calendar_json(lanes, lane_reservations), content_type="application/json")
+
+
+def get_lane_requests_from_json(raw_lane_requests: list) -> list:
+    """
+    Converts a list of dictionaries with ISO 8601 `start` and `end` values, a `swimmers` count, and optional
+        `users` ids into LaneRequests. The swimmer count defaults to the number of users.
+
+    If a request is not properly formatted, or is invalid (see `validate_lane_request()`), raises a ValueError.
+    """
+    lane_requests = []
+    for raw_lane_request in raw_lane_requests:
+        lower = parse_datetime(str(raw_lane_request.get("start", "")))
+        upper = parse_datetime(str(raw_lane_request.get("end", "")))
+        if lower is None or upper is None or not lower < upper:
+            raise ValueError(f"Invalid request period: {raw_lane_request}")
+        if timezone.is_naive(lower):
+            lower = timezone.make_aware(lower)
+        if timezone.is_naive(upper):
+            upper = timezone.make_aware(upper)
+
+        # Each user is added to the Reservation once, however often they are listed
+        user_ids = tuple(dict.fromkeys(int(user_id) for user_id in raw_lane_request.get("users", [])))
+        swimmers = int(raw_lane_request.get("swimmers", len(user_ids)))
+        lane_request = LaneRequest(DateTimeTZRange(lower, upper), swimmers, user_ids)
+        try:
+            validate_lane_request(lane_request)
+        except ValidationError as e:
+            raise ValueError(f"Invalid request {raw_lane_request}: {' '.join(e.messages)}")
+        lane_requests.append(lane_request)
+    return lane_requests
+
+
+@require_POST
+def lane_reservations_batch_request_view(request):
+    """
+    Reserves Lanes for a batch of requests (e.g.: a club's sessions for the season) in one transaction, packing the
+        requests into as few of the Pool's Lanes as possible with `reserve_lane_requests()`
+
+    Expects a JSON body of the form `{"pool": 1, "requests": [{"start": ..., "end": ..., "swimmers": 4, "users":
+        [...]}]}`, and returns the Reservation created for each request, or null for requests that could not be
+        assigned.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"errors": {"__all__": ["Authentication required"]}}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        pool = Pool.objects.get(id=int(data["pool"]))
+        lane_requests = get_lane_requests_from_json(data["requests"])
+    except (ValueError, TypeError, KeyError, AttributeError, Pool.DoesNotExist) as e:
+        return JsonResponse({"errors": {"__all__": [f"Invalid batch request: {e}"]}}, status=400)
+
+    user_ids = {user_id for lane_request in lane_requests for user_id in lane_request.user_ids}
+    if User.objects.filter(id__in=user_ids).count() != len(user_ids):
+        return JsonResponse({"errors": {"__all__": ["Unknown user in batch request"]}}, status=400)
+
+    lane_reservations, unassigned = reserve_lane_requests(pool, lane_requests)
+    return JsonResponse(
+        {
+            "reservations": [
+                None if lane_reservation is None else {"id": lane_reservation.id, "lane": lane_reservation.lane_id}
+                for lane_reservation in lane_reservations
+            ],
+            "unassigned": unassigned,
+            "lanes_used": len({lane_reservation.lane_id for lane_reservation in lane_reservations if lane_reservation}),
+        },
+        status=201,
+    )
+
+
+@require_POST
+def lane_reservation_claim_view(request):
+    """
+    Reserves a Lane at a Pool for the current user by claiming free LaneSlots with `claim_lane_slots()`, which
+        never waits on concurrent claims for the same Lanes
+
+    Expects the `pool` and `period` fields of LaneSlotClaimForm, and returns the new Reservation as JSON. If no
+        Lane has all of the period's slots free, responds with 409 Conflict.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"errors": {"__all__": ["Authentication required"]}}, status=403)
+
+    form = LaneSlotClaimForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    try:
+        lane_reservation = claim_lane_slots(form.cleaned_data["pool"], form.cleaned_data["period"], [request.user])
+    except ValidationError as e:
+        return JsonResponse({"errors": {"__all__": e.messages}}, status=400)
+
+    if lane_reservation is None:
+        return JsonResponse({"errors": {"__all__": ["No Lane is free at this Pool for the period"]}}, status=409)
+
+    return JsonResponse(
+        {
+            "id": lane_reservation.id,
+            "lane": lane_reservation.lane.id,
+            "lane_name": lane_reservation.lane.name,
+            "start": lane_reservation.period.lower.isoformat(),
+            "end": lane_reservation.period.upper.isoformat(),
+            "url": reverse("main:lane_reservation_detail_view", args=[lane_reservation.id]),
+        },
+        status=201,
+    )
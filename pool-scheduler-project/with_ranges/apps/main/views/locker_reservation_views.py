@@ -1,5 +1,22 @@
+import json
 import logging
 
+from apps.main.allocation_utils import allocate_locker
+from apps.main.batch_utils import get_reservation_batch_context
+from apps.main.calendar_utils import (
+    CALENDAR_FORMAT_BINARY,
+    CALENDAR_FORMAT_COLUMNS,
+    CALENDAR_FORMAT_DICTS,
+    CALENDAR_FORMAT_JSON,
+    encode_calendar_buckets,
+    encode_calendar_columns,
+    get_calendar_bucket_unit,
+    get_calendar_buckets,
+    get_calendar_columns,
+    get_calendar_json,
+    get_calendar_window,
+    get_calendar_window_context,
+)
 from apps.main.date_utils import (
     get_date_from_string,
     get_date_range_from_string_list,
@@ -10,8 +27,13 @@ from apps.main.date_utils import (
     get_this_month_range,
     get_this_week_range,
 )
-from apps.main.forms import DateTimeRangeFieldForm, DateTimeRangeForm
+from apps.main.forms import (
+    DateTimeRangeFieldForm,
+    DateTimeRangeForm,
+    LockerAllocationForm,
+)
 from apps.main.models import Closure, Locker, LockerReservation, Pool
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
 from django.db.models import (
     Aggregate,
@@ -27,23 +49,33 @@ from django.db.models import (
     Value,
 )
 from django.db.models.functions import Cast, Concat
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 from psycopg2.extras import DateTimeTZRange
 from render_block import render_block_to_string
 
 logger = logging.getLogger("with_ranges.main")
 
+# The maximum number of rows listed in each block of `locker_reservations_batch_partial_view`
+LOCKER_RESERVATION_BATCH_ROW_LIMIT = 25
+
+# Locker Reservations usually span several days, so hourly buckets would outnumber the Reservations themselves
+LOCKER_CALENDAR_HOURLY_BUCKETS_MAX_SPAN = timezone.timedelta(0)
 
-def get_locker_reservation_calendar_context(locker_reservation_queryset: QuerySet) -> dict:
+
+def get_locker_reservation_calendar_querysets(
+    locker_reservation_queryset: QuerySet, calendar_format: str = CALENDAR_FORMAT_DICTS
+) -> tuple:
     """
-    Given a `LockerReservation` QuerySet, returns a context dictionary with the components needed
-        to display reservations on a calendar, grouped by Locker
+    Given a `LockerReservation` QuerySet, returns a tuple of `.values()` QuerySets for the calendar groups (one per
+        Locker) and the calendar reservations
 
-        This function allows us to inject a calendar into various views
+    For the columnar formats, the reservations keep their `start` and `end` datetimes, rather than the formatted
+        strings and `content` label used by the other formats
     """
     lockers = (
         Locker.objects.filter(locker_reservations__in=locker_reservation_queryset)
@@ -55,6 +87,14 @@ def get_locker_reservation_calendar_context(locker_reservation_queryset: QuerySe
         )
     )
 
+    if calendar_format in (CALENDAR_FORMAT_COLUMNS, CALENDAR_FORMAT_BINARY):
+        return lockers, locker_reservation_queryset.values(
+            "id",
+            group=F("locker__id"),
+            start=F("period__startswith"),
+            end=F("period__endswith"),
+        )
+
     locker_reservation_queryset = locker_reservation_queryset.annotate(
         formatted_start=Func(
             F("period__startswith"), Value("YYYY-MM-DD HH24:MI:SS TZ"), function="to_char", output_field=CharField()
@@ -71,7 +111,40 @@ def get_locker_reservation_calendar_context(locker_reservation_queryset: QuerySe
         start=F("formatted_start"),
         end=F("formatted_end"),
     )
+    return lockers, locker_reservation_queryset
+
+
+def get_locker_reservation_calendar_context(
+    locker_reservation_queryset: QuerySet, calendar_format: str = CALENDAR_FORMAT_DICTS
+) -> dict:
+    """
+    Given a `LockerReservation` QuerySet, returns a context dictionary with the components needed
+        to display reservations on a calendar, grouped by Locker
+
+        This function allows us to inject a calendar into various views
+
+    The `calendar_format` determines how the calendar data is provided to the template:
+
+    - `CALENDAR_FORMAT_DICTS`: lists of dictionaries in `calendar_groups` and `calendar_reservations`
+    - `CALENDAR_FORMAT_JSON`: the complete calendar JSON document built by Postgres in `calendar_json`, without
+        creating any Python-side row objects
+    - `CALENDAR_FORMAT_COLUMNS`: compact columnar JSON in `calendar_columns`, with the labels rendered client-side
+    """
+    lockers, locker_reservation_queryset = get_locker_reservation_calendar_querysets(
+        locker_reservation_queryset, calendar_format
+    )
+
     context = {}
+    context["calendar_item_kind"] = "Locker"
+    if calendar_format == CALENDAR_FORMAT_JSON:
+        context["calendar_json"] = get_calendar_json(lockers, locker_reservation_queryset).decode()
+        return context
+
+    if calendar_format == CALENDAR_FORMAT_COLUMNS:
+        calendar_columns = get_calendar_columns(lockers, locker_reservation_queryset)
+        context["calendar_columns"] = json.dumps(calendar_columns, separators=(",", ":")).replace("<", "\\u003c")
+        return context
+
     context["calendar_groups"] = list(lockers)
     context["calendar_reservations"] = list(locker_reservation_queryset)
     return context
@@ -204,7 +277,10 @@ def locker_reservations_this_month_partial_view(request):
     locker_page_number = request.GET.get("page")
     context["locker_reservations_this_month_page"] = locker_paginator.get_page(locker_page_number)
 
-    context = {**context, **get_locker_reservation_calendar_context(locker_reservations_this_month)}
+    context = {
+        **context,
+        **get_locker_reservation_calendar_context(locker_reservations_this_month, CALENDAR_FORMAT_JSON),
+    }
     html = render_block_to_string(template, "locker_reservations_this_month", context)
     return HttpResponse(html)
 
@@ -219,7 +295,10 @@ def locker_reservations_in_the_past_partial_view(request):
     locker_reservations_in_the_past = LockerReservation.objects.filter(period__endswith__lt=timezone.now())
     context["locker_reservations_in_the_past"] = locker_reservations_in_the_past
 
-    context = {**context, **get_locker_reservation_calendar_context(locker_reservations_in_the_past)}
+    context = {
+        **context,
+        **get_locker_reservation_calendar_context(locker_reservations_in_the_past, CALENDAR_FORMAT_COLUMNS),
+    }
     html = render_block_to_string(template, "locker_reservations_in_the_past", context)
     return HttpResponse(html)
 
@@ -232,12 +311,18 @@ def locker_reservations_year_to_date_partial_view(request):
     template = "main/locker_reservation_partials.html"
     context = {}
 
-    locker_reservations_year_to_date = LockerReservation.objects.filter(
-        period__overlap=DateTimeTZRange(get_start_datetime_of_this_year(), timezone.now())
-    )
+    calendar_window = DateTimeTZRange(get_start_datetime_of_this_year(), timezone.now())
+    locker_reservations_year_to_date = LockerReservation.objects.filter(period__overlap=calendar_window)
     context["locker_reservations_year_to_date"] = locker_reservations_year_to_date
 
-    context = {**context, **get_locker_reservation_calendar_context(locker_reservations_year_to_date)}
+    # The calendar data is fetched separately by `calendar.html`, using the compact binary format, and is
+    #   aggregated into occupancy buckets until the user zooms in
+    context["calendar_item_kind"] = "Locker"
+    calendar_data_url = reverse("main:locker_reservations_calendar_data")
+    context["calendar_binary_url"] = f"{calendar_data_url}?block=year_to_date&format={CALENDAR_FORMAT_BINARY}"
+    context["calendar_event_type"] = "locker_reservation"
+    context["calendar_events_url"] = f"{reverse('main:events_view')}?type=locker_reservation"
+    context.update(get_calendar_window_context(calendar_window))
     html = render_block_to_string(template, "locker_reservations_year_to_date", context)
     return HttpResponse(html)
 
@@ -250,12 +335,18 @@ def locker_reservations_til_end_of_year_partial_view(request):
     template = "main/locker_reservation_partials.html"
     context = {}
 
-    locker_reservations_til_end_of_year = LockerReservation.objects.filter(
-        period__overlap=DateTimeTZRange(timezone.now(), get_start_datetime_of_next_year())
-    )
+    calendar_window = DateTimeTZRange(timezone.now(), get_start_datetime_of_next_year())
+    locker_reservations_til_end_of_year = LockerReservation.objects.filter(period__overlap=calendar_window)
     context["locker_reservations_til_end_of_year"] = locker_reservations_til_end_of_year
 
-    context = {**context, **get_locker_reservation_calendar_context(locker_reservations_til_end_of_year)}
+    # The calendar data is fetched separately by `calendar.html`, using the compact binary format, and is
+    #   aggregated into occupancy buckets until the user zooms in
+    context["calendar_item_kind"] = "Locker"
+    calendar_data_url = reverse("main:locker_reservations_calendar_data")
+    context["calendar_binary_url"] = f"{calendar_data_url}?block=til_end_of_year&format={CALENDAR_FORMAT_BINARY}"
+    context["calendar_event_type"] = "locker_reservation"
+    context["calendar_events_url"] = f"{reverse('main:events_view')}?type=locker_reservation"
+    context.update(get_calendar_window_context(calendar_window))
     html = render_block_to_string(template, "locker_reservations_til_end_of_year", context)
     return HttpResponse(html)
 
@@ -466,3 +557,200 @@ def locker_reservations_overlapping_datetime_manual_partial_view(request):
 
     html = render_block_to_string(template, "locker_reservations_overlapping_datetime_manual", context)
     return HttpResponse(html)
+
+
+@require_POST
+def locker_reservation_allocate_view(request):
+    """
+    Reserves any free Locker at a Pool for the current user, using the best-fit strategy of `allocate_locker()`
+
+    Expects the `pool` and `period` fields of LockerAllocationForm, and returns the new Reservation as JSON. If no
+        Locker is free for the period, responds with 409 Conflict.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"errors": {"__all__": ["Authentication required"]}}, status=403)
+
+    form = LockerAllocationForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    try:
+        locker_reservation = allocate_locker(form.cleaned_data["pool"], request.user, form.cleaned_data["period"])
+    except ValidationError as e:
+        return JsonResponse({"errors": {"__all__": e.messages}}, status=400)
+
+    if locker_reservation is None:
+        return JsonResponse({"errors": {"__all__": ["No Locker is free at this Pool for the period"]}}, status=409)
+
+    return JsonResponse(
+        {
+            "id": locker_reservation.id,
+            "locker": locker_reservation.locker.id,
+            "locker_number": locker_reservation.locker.number,
+            "start": locker_reservation.period.lower.isoformat(),
+            "end": locker_reservation.period.upper.isoformat(),
+            "url": reverse("main:locker_reservation_detail_view", args=[locker_reservation.id]),
+        },
+        status=201,
+    )
+
+
+def get_locker_reservation_batch_filters() -> dict:
+    """
+    Returns a dictionary of the blocks available to `locker_reservations_batch_partial_view`, where each key is
+        the block name and each value is a tuple of (title, Q object) used to filter LockerReservations
+
+    The Q objects may refer to the `delta` annotation added in `get_locker_reservation_batch_context()`
+    """
+    now = timezone.now()
+    return {
+        "greater_than_thirty_days": (
+            "Reservations greater than 30 days in Length",
+            Q(delta__gt=timezone.timedelta(days=30)),
+        ),
+        "this_month": (
+            "Reservations This Month",
+            Q(period__overlap=get_this_month_range()),
+        ),
+        "in_the_past": (
+            "All Past Reservations",
+            Q(period__endswith__lt=now),
+        ),
+        "year_to_date": (
+            "Reservations Year-to-Date",
+            Q(period__overlap=DateTimeTZRange(get_start_datetime_of_this_year(), now)),
+        ),
+        "til_end_of_year": (
+            "Reservations now til End-of-Year",
+            Q(period__overlap=DateTimeTZRange(now, get_start_datetime_of_next_year())),
+        ),
+        "oct_or_dec_this_year": (
+            "Reservations ending October or December this year",
+            Q(period__endswith__month__in=[10, 12], period__endswith__year=now.year),
+        ),
+        "overdue_start": (
+            "Overdue Start",
+            Q(period__startswith__lt=now, actual__startswith__isnull=True),
+        ),
+        "overdue_end": (
+            "Overdue End",
+            Q(period__endswith__lt=now, actual__endswith__isnull=True),
+        ),
+    }
+
+
+def get_locker_reservation_batch_queryset() -> QuerySet:
+    """
+    Returns a `LockerReservation` QuerySet with the annotations needed by the filters in
+        `get_locker_reservation_batch_filters()`
+    """
+    return LockerReservation.objects.annotate(
+        delta=ExpressionWrapper(
+            F("period__endswith") - F("period__startswith"),
+            output_field=DurationField(),
+        )
+    )
+
+
+def get_locker_reservation_batch_context(
+    block_names: list, row_limit: int = LOCKER_RESERVATION_BATCH_ROW_LIMIT
+) -> dict:
+    """
+    Given a list of block names from `get_locker_reservation_batch_filters()`, returns a context dictionary containing
+        the count and first `row_limit` reservations for each block (see `get_reservation_batch_context()`)
+    """
+    return get_reservation_batch_context(
+        get_locker_reservation_batch_queryset(),
+        get_locker_reservation_batch_filters(),
+        block_names,
+        row_limit,
+        "locker",
+    )
+
+
+def locker_reservations_batch_partial_view(request):
+    """
+    Renders several locker reservation blocks in a single response
+
+    - GET request without any `block` parameters returns the overview skeleton, containing a placeholder for each
+        available block, which then requests its content from this same view
+    - GET request with one or more `block` parameters (e.g.: `?block=this_month&block=overdue_end`) returns the
+        requested blocks as htmx out-of-band swaps, each replacing its matching placeholder
+    """
+    template = "main/locker_reservation_partials.html"
+    context = {}
+
+    block_names = request.GET.getlist("block")
+    if block_names:
+        context = {**context, **get_locker_reservation_batch_context(block_names)}
+        html = render_block_to_string(template, "locker_reservations_batch_oob", context)
+        return HttpResponse(html)
+
+    batch_filters = get_locker_reservation_batch_filters()
+    context["batch_blocks"] = [{"name": name, "title": title} for name, (title, block_filter) in batch_filters.items()]
+    context["batch_querystring"] = "&".join(f"block={name}" for name in batch_filters)
+    html = render_block_to_string(template, "locker_reservations_batch", context)
+    return HttpResponse(html)
+
+
+def locker_reservations_calendar_data_view(request):
+    """
+    Returns the calendar data for one of the blocks in `get_locker_reservation_batch_filters()`
+        (e.g.: `?block=this_month`), sent straight to the response
+
+    The `format` parameter selects the encoding:
+
+    - `json` (default): the calendar JSON document, built entirely by Postgres
+    - `columns`: compact columnar JSON, with parallel arrays of ids, group ids, and epoch-second start/end values
+    - `binary`: the columnar data, packed by `encode_calendar_columns()`
+
+    The optional `start` and `end` parameters (in epoch seconds) limit the data to a calendar window. For the
+        `columns` and `binary` formats, windows wider than `CALENDAR_ITEMS_MAX_SPAN` return hourly or daily
+        occupancy buckets from `get_calendar_buckets()` instead of individual reservations.
+    """
+    batch_filters = get_locker_reservation_batch_filters()
+    block_name = request.GET.get("block")
+    if block_name not in batch_filters:
+        return HttpResponseBadRequest(f"Unknown block: {block_name}")
+
+    calendar_format = request.GET.get("format", CALENDAR_FORMAT_JSON)
+    if calendar_format not in (CALENDAR_FORMAT_JSON, CALENDAR_FORMAT_COLUMNS, CALENDAR_FORMAT_BINARY):
+        return HttpResponseBadRequest(f"Unknown format: {calendar_format}")
+
+    title, block_filter = batch_filters[block_name]
+    locker_reservation_queryset = get_locker_reservation_batch_queryset().filter(block_filter)
+
+    calendar_window = None
+    if "start" in request.GET or "end" in request.GET:
+        try:
+            calendar_window = get_calendar_window(request.GET.get("start", ""), request.GET.get("end", ""))
+        except ValueError:
+            return HttpResponseBadRequest("Invalid calendar window")
+        locker_reservation_queryset = locker_reservation_queryset.filter(period__overlap=calendar_window)
+
+    lockers, locker_reservations = get_locker_reservation_calendar_querysets(
+        locker_reservation_queryset, calendar_format
+    )
+
+    bucket_unit = None
+    if calendar_window is not None:
+        bucket_unit = get_calendar_bucket_unit(calendar_window, LOCKER_CALENDAR_HOURLY_BUCKETS_MAX_SPAN)
+    if bucket_unit is not None and calendar_format in (CALENDAR_FORMAT_COLUMNS, CALENDAR_FORMAT_BINARY):
+        locker_reservation_periods = locker_reservation_queryset.values("period", group=F("locker__id"))
+        calendar_buckets = get_calendar_buckets(lockers, locker_reservation_periods, calendar_window, bucket_unit)
+        if calendar_format == CALENDAR_FORMAT_COLUMNS:
+            return JsonResponse(calendar_buckets, json_dumps_params={"separators": (",", ":")})
+        return HttpResponse(encode_calendar_buckets(calendar_buckets), content_type="application/octet-stream")
+
+    if calendar_format == CALENDAR_FORMAT_COLUMNS:
+        return JsonResponse(
+            get_calendar_columns(lockers, locker_reservations), json_dumps_params={"separators": (",", ":")}
+        )
+
+    if calendar_format == CALENDAR_FORMAT_BINARY:
+        return HttpResponse(
+            encode_calendar_columns(get_calendar_columns(lockers, locker_reservations)),
+            content_type="application/octet-stream",
+        )
+
+    return HttpResponse(get_calendar_json(lockers, locker_reservations), content_type="application/json")
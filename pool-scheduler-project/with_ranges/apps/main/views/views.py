@@ -1,6 +1,20 @@
+import json
 import logging
 
+from apps.main.bitset_utils import get_time_mask, search_pool_free_periods
+from apps.main.change_feed_utils import (
+    CHANGE_FEED_MAX_PAGE_SIZE,
+    CHANGE_FEED_PAGE_SIZE,
+    CHANGE_FEED_QUERYSETS,
+    get_changes,
+)
 from apps.main.date_utils import get_this_month_range
+from apps.main.events_utils import (
+    EVENT_STREAM_REFUSED_RETRY_AFTER,
+    EventStream,
+    get_event_broker,
+    get_event_filters,
+)
 from apps.main.models import (
     Closure,
     Lane,
@@ -9,6 +23,19 @@ from apps.main.models import (
     LockerReservation,
     Pool,
 )
+from apps.main.occupancy_utils import (
+    get_live_occupancy,
+    get_pool_occupancy_heatmap,
+    get_week_start,
+)
+from apps.main.range_search_utils import (
+    get_id_list,
+    get_recurring_windows_from_json,
+    get_windows_from_json,
+    search_reservation_ranges,
+)
+from apps.main.snapshot_utils import get_reservation_snapshot
+from dateutil.relativedelta import relativedelta
 from django.core.paginator import Paginator
 from django.db.models import (
     Aggregate,
@@ -22,10 +49,17 @@ from django.db.models import (
     Value,
 )
 from django.db.models.functions import Concat
-from django.http import HttpResponse
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+from django.views.decorators.http import require_POST
 from render_block import render_block_to_string
 
 logger = logging.getLogger("with_ranges.main")
@@ -70,15 +104,210 @@ def pool_tools_view(request):
 
 def pool_detail_view(request, pool_id):
     """
-    Provides details about each Pool
+    Provides details about each Pool, including an occupancy heatmap of its Lanes for one week
+
+    The week defaults to the current one, and can be chosen with `?week=YYYY-MM-DD` (any date within the week).
     """
     template = "main/pool_detail.html"
     context = {}
     pool = get_object_or_404(Pool, id=pool_id)
     context["pool"] = pool
+
+    try:
+        week_day = timezone.datetime.strptime(request.GET["week"], "%Y-%m-%d").date()
+    except KeyError:
+        week_day = timezone.now().date()
+    except ValueError:
+        return HttpResponseBadRequest("Invalid week")
+    week_start = get_week_start(week_day)
+    context["occupancy_heatmap"] = get_pool_occupancy_heatmap(pool, week_start)
+    context["previous_week_start"] = week_start - timezone.timedelta(days=7)
+    context["next_week_start"] = week_start + timezone.timedelta(days=7)
     return TemplateResponse(request, template, context)
 
 
+def pool_live_occupancy_view(request, pool_id):
+    """
+    Provides who's in the water at a Pool right now as JSON, for lobby display boards that poll every few seconds
+
+    Reads the incrementally maintained occupancy counters (see `get_live_occupancy()`) rather than the Reservations.
+    """
+    pool = get_object_or_404(Pool.objects.only("id"), id=pool_id)
+    return JsonResponse(get_live_occupancy(pool))
+
+
+def pool_free_periods_view(request, pool_id):
+    """
+    Finds when several of a Pool's Lanes or Lockers are free together as JSON, from the day masks of their busy time
+        (see `search_pool_free_periods()`)
+
+    Expects `?type=lane&first_date=YYYY-MM-DD&last_date=YYYY-MM-DD&minutes=60`, optionally with the resources
+        (e.g.: `&lane=1&lane=2`) and the window of each day to search (e.g.: `&start_time=06:00&end_time=08:00`).
+        Only the dates are required; `minutes` must be a multiple of 30.
+    """
+    pool = get_object_or_404(Pool, id=pool_id)
+    try:
+        kind = request.GET.get("type", "lane")
+        first_date = parse_date(request.GET["first_date"])
+        last_date = parse_date(request.GET["last_date"])
+        minutes = int(request.GET.get("minutes", 60))
+        start_time = parse_time(request.GET.get("start_time", "00:00"))
+        end_time = parse_time(request.GET.get("end_time", "00:00"))
+        if None in (first_date, last_date, start_time, end_time) or minutes % 30:
+            raise ValueError("Invalid dates, times, or minutes")
+        results = search_pool_free_periods(
+            pool,
+            kind,
+            get_id_list(request.GET.getlist(kind)),
+            first_date,
+            last_date,
+            minutes // 30,
+            # A window ending at midnight runs until the end of the day
+            get_time_mask(start_time, end_time if end_time != timezone.datetime.min.time() else None),
+        )
+    except (KeyError, ValueError) as e:
+        return HttpResponseBadRequest(f"Invalid free period search: {e}")
+    return JsonResponse(results)
+
+
+def pool_analytics_view(request, pool_id):
+    """
+    Provides Reservation analytics for a Pool as JSON, computed over the in-memory columnar snapshots of its Lane
+        and Locker Reservations (see `snapshot_utils.py`)
+
+    Utilization covers one month, which defaults to the current one and can be chosen with `?month=YYYY-MM`.
+    """
+    pool = get_object_or_404(Pool, id=pool_id)
+    try:
+        month_start = timezone.datetime.strptime(request.GET["month"], "%Y-%m")
+    except KeyError:
+        month_start = timezone.datetime.combine(timezone.now().date().replace(day=1), timezone.datetime.min.time())
+    except ValueError:
+        return HttpResponseBadRequest("Invalid month")
+    month_start = timezone.make_aware(month_start)
+    month_end = month_start + relativedelta(months=1)
+
+    analytics = {"pool": pool.id, "month": f"{month_start:%Y-%m}"}
+    for kind, threshold in (("lane", timezone.timedelta(hours=8)), ("locker", timezone.timedelta(days=30))):
+        snapshot = get_reservation_snapshot(kind, pool.id)
+        average_length = snapshot.get_average_length()
+        average_actual_length = snapshot.get_average_actual_length()
+        analytics[kind] = {
+            "reservations": int(snapshot.get_active().sum()),
+            "cancelled": int(snapshot.cancelled.sum()),
+            "average_length_seconds": average_length and average_length.total_seconds(),
+            "average_actual_length_seconds": average_actual_length and average_actual_length.total_seconds(),
+            "longer_than_threshold": {
+                "threshold_seconds": threshold.total_seconds(),
+                "count": len(snapshot.get_ids_longer_than(threshold)),
+            },
+            "utilization": {
+                str(resource_id): round(utilization, 4)
+                for resource_id, utilization in snapshot.get_utilization(month_start, month_end).items()
+            },
+        }
+    return JsonResponse(analytics)
+
+
+def changes_view(request):
+    """
+    Provides the records of one type created, changed, or deleted since a client's cursor as JSON, so mobile apps,
+        billing, and kiosks can sync incrementally instead of downloading full listings
+
+    Expects the `type` (`lane_reservation`, `locker_reservation`, or `closure`) parameter, and the optional
+        `cursor` returned by the previous request and page size `limit`. Cancelled Reservations are included as
+        changes, and deleted records by id (see `get_changes()`). Clients should request again while `has_more` is
+        true.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"errors": {"__all__": ["Authentication required"]}}, status=403)
+
+    kind = request.GET.get("type")
+    if kind not in CHANGE_FEED_QUERYSETS:
+        return JsonResponse({"errors": {"type": [f"Unknown type: {kind}"]}}, status=400)
+
+    try:
+        limit = min(int(request.GET.get("limit", CHANGE_FEED_PAGE_SIZE)), CHANGE_FEED_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+        changes = get_changes(kind, request.GET.get("cursor", ""), limit)
+    except ValueError:
+        return JsonResponse({"errors": {"__all__": ["Invalid cursor or limit"]}}, status=400)
+    return JsonResponse(changes)
+
+
+def events_view(request):
+    """
+    Streams reservation and closure changes as Server-Sent Events, so calendars and display boards can patch
+        themselves instead of polling
+
+    Each event is named by its type (`lane_reservation`, `locker_reservation`, `closure`, or `reset` when the
+        client should reload), and its data describes the change (see migration 0006). The stream can be limited
+        with the `type`, `pool`, `lane`, and `locker` query parameters (e.g.: `?pool=3`).
+
+    Each open stream holds a request thread, so once the process streams to `EVENT_STREAM_MAX_CONNECTIONS` clients,
+        further streams are refused with a 503 until one closes.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"errors": {"__all__": ["Authentication required"]}}, status=403)
+
+    try:
+        filters = get_event_filters(request.GET)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid event filter")
+
+    broker = get_event_broker()
+    subscription = broker.subscribe(filters)
+    if subscription is None:
+        response = HttpResponse("Too many event streams", status=503)
+        response["Retry-After"] = EVENT_STREAM_REFUSED_RETRY_AFTER
+        return response
+
+    response = StreamingHttpResponse(EventStream(broker, subscription), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stops nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_POST
+def reservation_range_search_view(request):
+    """
+    Answers many range questions about Lane or Locker Reservations with one request and one query (see
+        `search_reservation_ranges()`), instead of a request per window
+
+    Expects a JSON body of the form `{"type": "lane", "relation": "overlaps", "windows": [{"start": ..., "end":
+        ...}], "pool": [1], "lane": [4], "user": [7], "cancelled": "active"}`. Repeating windows (e.g.: every Friday
+        evening this quarter) can be given as `"recurrence": {"first_date": ..., "last_date": ..., "weekdays": [4],
+        "start_time": "17:00", "end_time": "21:00"}`, instead of or as well as `windows`. Only `type` and at least
+        one window are required; `relation` is one of `overlaps`, `contains`, or `contained_by`, and `cancelled` one
+        of `active`, `cancelled`, or `any`.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"errors": {"__all__": ["Authentication required"]}}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        kind = data.get("type")
+        windows = get_windows_from_json(data.get("windows", []))
+        if "recurrence" in data:
+            windows += get_recurring_windows_from_json(data["recurrence"])
+        if kind == "lane" and "locker" in data or kind == "locker" and "lane" in data:
+            raise ValueError("Lane Reservations can only be filtered by lane, and Locker Reservations by locker")
+        results = search_reservation_ranges(
+            kind,
+            windows,
+            relation=data.get("relation", "overlaps"),
+            cancelled=data.get("cancelled", "active"),
+            pools=get_id_list(data.get("pool")),
+            resources=get_id_list(data.get(kind)),
+            users=get_id_list(data.get("user")),
+        )
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({"errors": {"__all__": [f"Invalid search: {e}"]}}, status=400)
+    return JsonResponse(results)
+
+
 def lane_tools_view(request):
     """
     The initial view for Lane Tools
@@ -3,6 +3,7 @@ from django.contrib.auth.admin import UserAdmin
 
 from .forms import CustomUserChangeForm, CustomUserCreationForm
 from .models import User
+from .search_utils import USER_SEARCH_MAX_LIMIT, search_users
 
 
 @admin.register(User)
@@ -33,5 +34,15 @@ class CustomUserAdmin(UserAdmin):
             },
         ),
     )
-    search_fields = ("email",)
+    search_fields = ("email", "first_name", "last_name")
     ordering = ("email",)
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Autocomplete widgets (e.g.: for the users of Lane Reservations) search with `search_users()`, which returns
+            only the best few matches, rather than counting and paginating every user containing the search
+        """
+        if request.resolver_match and request.resolver_match.url_name == "autocomplete" and search_term:
+            user_ids = [user["id"] for user in search_users(search_term, USER_SEARCH_MAX_LIMIT)]
+            return queryset.filter(id__in=user_ids), False
+        return super().get_search_results(request, queryset, search_term)
@@ -0,0 +1,102 @@
+from apps.main.models import Lane, LaneReservation, Locker, LockerReservation, Pool
+from django.db import connection
+
+# How many Reservations of each type are listed in each section (upcoming, past, cancelled) of a user's dashboard
+USER_DASHBOARD_ROW_LIMIT = 10
+
+USER_DASHBOARD_SECTIONS = ("upcoming", "past", "cancelled")
+
+USER_DASHBOARD_KINDS = ("lane", "locker")
+
+
+def get_user_dashboard_sql() -> str:
+    """
+    Returns the query behind `get_user_dashboard()`: the user's Lane and Locker Reservations in one UNION, each
+        sorted into a section, with each type's totals computed over all of them by window functions before only
+        the first rows of each section are kept
+    """
+    lane_users_table = LaneReservation.users.through._meta.db_table
+    return f"""
+        WITH reservation AS (
+            SELECT 'lane' AS kind, r.id, r.period, r.actual, r.cancelled, l.name AS resource, p.name AS pool
+            FROM {LaneReservation._meta.db_table} r
+            JOIN {lane_users_table} lu ON lu.lanereservation_id = r.id
+            JOIN {Lane._meta.db_table} l ON l.id = r.lane_id
+            JOIN {Pool._meta.db_table} p ON p.id = l.pool_id
+            WHERE lu.user_id = %(user_id)s
+            UNION ALL
+            SELECT 'locker' AS kind, r.id, r.period, r.actual, r.cancelled, 'Locker ' || l.number, p.name
+            FROM {LockerReservation._meta.db_table} r
+            JOIN {Locker._meta.db_table} l ON l.id = r.locker_id
+            JOIN {Pool._meta.db_table} p ON p.id = l.pool_id
+            WHERE r.user_id = %(user_id)s
+        ), sectioned AS (
+            SELECT
+                *,
+                CASE
+                    WHEN cancelled IS NOT NULL THEN 'cancelled'
+                    WHEN upper(period) > now() THEN 'upcoming'
+                    ELSE 'past'
+                END AS section
+            FROM reservation
+        ), ranked AS (
+            SELECT
+                *,
+                row_number() OVER (
+                    PARTITION BY kind, section
+                    ORDER BY CASE WHEN section = 'upcoming' THEN lower(period) END, lower(period) DESC
+                ) AS section_row,
+                count(*) FILTER (WHERE section = 'upcoming') OVER (PARTITION BY kind) AS upcoming_count,
+                count(*) FILTER (WHERE section = 'past') OVER (PARTITION BY kind) AS past_count,
+                count(*) FILTER (WHERE section = 'cancelled') OVER (PARTITION BY kind) AS cancelled_count,
+                coalesce(
+                    sum(extract(epoch FROM upper(period) - lower(period))) FILTER (WHERE section = 'past')
+                        OVER (PARTITION BY kind),
+                    0
+                ) / 3600 AS past_hours
+            FROM sectioned
+        )
+        SELECT
+            kind, id, period, actual, cancelled, resource, pool, section,
+            upcoming_count, past_count, cancelled_count, past_hours
+        FROM ranked
+        WHERE section_row <= %(row_limit)s
+        ORDER BY section_row
+    """
+
+
+def get_user_dashboard(user_id: int, row_limit: int = USER_DASHBOARD_ROW_LIMIT) -> dict:
+    """
+    Returns a user's upcoming, past, and cancelled Lane and Locker Reservations (the first `row_limit` of each type
+        in each section, soonest upcoming and latest past first), and the totals of each type, with a single query
+
+    The result maps each section to a list of Reservations (as dictionaries with their `kind`, `id`, `period`,
+        `actual`, `cancelled`, `resource`, and `pool`), and "totals" to a dictionary with the counts of each section
+        and the hours of past Reservations, for each type.
+    """
+    dashboard = {section: [] for section in USER_DASHBOARD_SECTIONS}
+    dashboard["totals"] = {
+        kind: {"upcoming": 0, "past": 0, "cancelled": 0, "total": 0, "past_hours": 0} for kind in USER_DASHBOARD_KINDS
+    }
+
+    with connection.cursor() as cursor:
+        cursor.execute(get_user_dashboard_sql(), {"user_id": user_id, "row_limit": row_limit})
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    for row in rows:
+        dashboard[row["section"]].append(
+            {name: row[name] for name in ("kind", "id", "period", "actual", "cancelled", "resource", "pool")}
+        )
+        dashboard["totals"][row["kind"]] = {
+            "upcoming": row["upcoming_count"],
+            "past": row["past_count"],
+            "cancelled": row["cancelled_count"],
+            "total": row["upcoming_count"] + row["past_count"] + row["cancelled_count"],
+            "past_hours": round(float(row["past_hours"]), 1),
+        }
+
+    dashboard["upcoming"].sort(key=lambda reservation: reservation["period"].lower)
+    for section in ("past", "cancelled"):
+        dashboard[section].sort(key=lambda reservation: reservation["period"].lower, reverse=True)
+    return dashboard
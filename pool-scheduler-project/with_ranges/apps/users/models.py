@@ -1,6 +1,8 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Cast, Upper
 from django.utils.translation import gettext_lazy as _
 
 
@@ -46,5 +48,16 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Trigram indexes on the same expressions as the `istartswith` and `icontains` lookups, so user searches
+            #   (see `search_users()`) never scan the whole table
+            GinIndex(
+                OpClass(Upper(Cast(field_name, models.TextField())), name="gin_trgm_ops"),
+                name=f"user_{field_name}_trgm_idx",
+            )
+            for field_name in ("email", "first_name", "last_name")
+        ]
+
     def __str__(self):
         return self.email
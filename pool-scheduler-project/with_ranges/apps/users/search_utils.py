@@ -0,0 +1,74 @@
+import hashlib
+from functools import reduce
+from operator import and_, or_
+
+from apps.users.models import User
+from django.core.cache import cache
+from django.db.models import Q
+
+# Searches shorter than this return nothing, as they would match too many users to be useful
+USER_SEARCH_MIN_LENGTH = 2
+
+# How many users a search returns by default, and at most
+USER_SEARCH_LIMIT = 10
+USER_SEARCH_MAX_LIMIT = 25
+
+# How long (in seconds) the results of each search are cached, so the prefixes typed by many users stay hot
+USER_SEARCH_CACHE_TIMEOUT = 30
+
+USER_SEARCH_FIELDS = ("email", "first_name", "last_name")
+
+
+def get_search_terms(query: str) -> list:
+    """Splits a search into lowercase terms (e.g.: "Ada  Love" into ["ada", "love"])"""
+    return query.lower().split()
+
+
+def get_terms_filter(terms: list, lookup: str) -> Q:
+    """Returns the filter for users with every term matching (with the lookup) at least one of the search fields"""
+    return reduce(
+        and_,
+        (reduce(or_, (Q(**{f"{field_name}__{lookup}": term}) for field_name in USER_SEARCH_FIELDS)) for term in terms),
+    )
+
+
+def get_user_search_cache_key(terms: list, limit: int) -> str:
+    digest = hashlib.sha1(" ".join(terms).encode()).hexdigest()
+    return f"user_search:{limit}:{digest}"
+
+
+def search_users(query: str, limit: int = USER_SEARCH_LIMIT) -> list:
+    """
+    Returns up to `limit` users whose email, first name, or last name match each term of the search, as
+        dictionaries with their `id`, `email`, and `name`, cached briefly per search
+
+    Users with a field starting with each term are returned first, in order of email. Only if there are not enough
+        of those, the remaining places are filled with users containing the terms anywhere, without sorting them
+        all first, so a common term (e.g.: "gmail") stops at the limit rather than reading every match. Both
+        lookups are served by the trigram indexes on the search fields.
+    """
+    terms = get_search_terms(query)
+    limit = max(1, min(limit, USER_SEARCH_MAX_LIMIT))
+    if len("".join(terms)) < USER_SEARCH_MIN_LENGTH:
+        return []
+
+    def compute_results():
+        fields = ("id", "email", "first_name", "last_name")
+        users = list(
+            User.objects.filter(get_terms_filter(terms, "istartswith")).order_by("email").values(*fields)[:limit]
+        )
+        if len(users) < limit:
+            found_ids = [user["id"] for user in users]
+            users += sorted(
+                User.objects.filter(get_terms_filter(terms, "icontains"))
+                .exclude(id__in=found_ids)
+                .order_by()
+                .values(*fields)[: limit - len(users)],
+                key=lambda user: user["email"],
+            )
+        return [
+            {"id": user["id"], "email": user["email"], "name": f"{user['first_name']} {user['last_name']}".strip()}
+            for user in users
+        ]
+
+    return cache.get_or_set(get_user_search_cache_key(terms, limit), compute_results, USER_SEARCH_CACHE_TIMEOUT)
@@ -0,0 +1,63 @@
+from decimal import Decimal
+from unittest import mock
+
+from apps.users.dashboard_utils import get_user_dashboard, get_user_dashboard_sql
+from django.test import SimpleTestCase
+from django.utils import timezone
+from psycopg2.extras import DateTimeTZRange
+
+COLUMNS = (
+    "kind",
+    "id",
+    "period",
+    "actual",
+    "cancelled",
+    "resource",
+    "pool",
+    "section",
+    "upcoming_count",
+    "past_count",
+    "cancelled_count",
+    "past_hours",
+)
+
+
+def get_period(days: int) -> DateTimeTZRange:
+    start = timezone.datetime(2023, 6, 1, 9, tzinfo=timezone.utc) + timezone.timedelta(days=days)
+    return DateTimeTZRange(start, start + timezone.timedelta(hours=9))
+
+
+class TestUserDashboard(SimpleTestCase):
+    def get_dashboard(self, rows):
+        cursor = mock.MagicMock()
+        cursor.description = [(column,) for column in COLUMNS]
+        cursor.fetchall.return_value = rows
+        with mock.patch("apps.users.dashboard_utils.connection") as connection:
+            connection.cursor.return_value.__enter__.return_value = cursor
+            return get_user_dashboard(7, 2)
+
+    def test_user_without_reservations(self):
+        dashboard = self.get_dashboard([])
+        self.assertEqual(dashboard["upcoming"], [])
+        self.assertEqual(dashboard["totals"]["locker"]["total"], 0)
+
+    def test_rows_are_sorted_into_sections_with_totals(self):
+        dashboard = self.get_dashboard(
+            [
+                ("lane", 1, get_period(3), None, None, "Lane 1", "North", "upcoming", 4, 1, 0, Decimal("9")),
+                ("locker", 2, get_period(1), None, None, "Locker 5", "North", "upcoming", 1, 0, 2, Decimal("0")),
+                ("lane", 3, get_period(-3), None, None, "Lane 2", "North", "past", 4, 1, 0, Decimal("9")),
+            ]
+        )
+        self.assertEqual([reservation["id"] for reservation in dashboard["upcoming"]], [2, 1])
+        self.assertEqual([reservation["id"] for reservation in dashboard["past"]], [3])
+        self.assertEqual(
+            dashboard["totals"]["lane"], {"upcoming": 4, "past": 1, "cancelled": 0, "total": 5, "past_hours": 9.0}
+        )
+        self.assertEqual(dashboard["totals"]["locker"]["total"], 3)
+
+    def test_query_covers_both_reservation_types(self):
+        sql = get_user_dashboard_sql()
+        self.assertIn("UNION ALL", sql)
+        self.assertIn("main_lanereservation_users", sql)
+        self.assertIn("main_lockerreservation", sql)
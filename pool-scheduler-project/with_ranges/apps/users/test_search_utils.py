@@ -0,0 +1,44 @@
+from unittest import mock
+
+from apps.users.search_utils import (
+    get_search_terms,
+    get_terms_filter,
+    get_user_search_cache_key,
+    search_users,
+)
+from django.db.models import Q
+from django.test import SimpleTestCase
+
+
+class TestSearchTerms(SimpleTestCase):
+    def test_terms_are_lowercase_and_split_on_whitespace(self):
+        self.assertEqual(get_search_terms("  Ada   LOVE "), ["ada", "love"])
+
+    def test_each_term_must_match_one_of_the_fields(self):
+        expected = (
+            Q(email__istartswith="ada") | Q(first_name__istartswith="ada") | Q(last_name__istartswith="ada")
+        ) & (Q(email__istartswith="lo") | Q(first_name__istartswith="lo") | Q(last_name__istartswith="lo"))
+        self.assertEqual(get_terms_filter(["ada", "lo"], "istartswith"), expected)
+
+
+class TestUserSearchCacheKey(SimpleTestCase):
+    def test_equivalent_searches_share_a_key(self):
+        self.assertEqual(
+            get_user_search_cache_key(get_search_terms("Ada  Love"), 10),
+            get_user_search_cache_key(get_search_terms("ada love"), 10),
+        )
+
+    def test_key_depends_on_limit(self):
+        self.assertNotEqual(get_user_search_cache_key(["ada"], 10), get_user_search_cache_key(["ada"], 5))
+
+
+class TestSearchUsers(SimpleTestCase):
+    def test_short_searches_return_nothing_without_querying(self):
+        with mock.patch("apps.users.search_utils.cache") as cache:
+            self.assertEqual(search_users(" a "), [])
+        cache.get_or_set.assert_not_called()
+
+    def test_limit_is_capped(self):
+        with mock.patch("apps.users.search_utils.cache") as cache:
+            search_users("ada", 1000)
+        self.assertEqual(cache.get_or_set.call_args[0][0], get_user_search_cache_key(["ada"], 25))
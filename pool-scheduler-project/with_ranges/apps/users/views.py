@@ -1,26 +1,90 @@
 import logging
 
+from apps.users.dashboard_utils import get_user_dashboard
 from apps.users.models import User
+from apps.users.search_utils import USER_SEARCH_LIMIT, search_users
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.template.response import TemplateResponse
+from render_block import render_block_to_string
 
 logger = logging.getLogger("with_ranges.users")
 
+# How many users are listed in each page of the user directory
+USER_DIRECTORY_PAGE_SIZE = 50
+
 # Create your views here.
 
 
+def get_user_directory_page(after: str = "", page_size: int = USER_DIRECTORY_PAGE_SIZE) -> tuple:
+    """
+    Returns the page of users (ordered by email) following the user whose email is `after`, and the email to
+        request the next page after, or None if this is the last page
+
+    Pages are found by seeking the unique index on email rather than with OFFSET, so every page costs the same
+        however far into the directory it is.
+    """
+    users = User.objects.order_by("email").only("id", "email", "first_name", "last_name", "is_staff")
+    if after:
+        users = users.filter(email__gt=after)
+    users = list(users[: page_size + 1])
+    if len(users) > page_size:
+        return users[:page_size], users[page_size - 1].email
+    return users, None
+
+
 def user_list_view(request):
+    """
+    The user directory, one page at a time (see `get_user_directory_page()`). With htmx, the following pages are
+        requested as the end of the list scrolls into view, and appended to it.
+    """
     template = "users/user_list.html"
     context = {}
-    context["users"] = User.objects.all().order_by("email")
+    users, next_after = get_user_directory_page(request.GET.get("after", ""))
+    context["users"] = users
+    context["next_after"] = next_after
+    if request.headers.get("HX-Request"):
+        html = render_block_to_string(template, "user_list_rows", context)
+        return HttpResponse(html)
     return TemplateResponse(request, template, context)
 
 
 def user_detail_view(request, user_id):
+    """
+    A user's dashboard: their upcoming, past, and cancelled Reservations, and totals (see `get_user_dashboard()`)
+    """
     template = "users/user_detail.html"
     context = {}
     user = get_object_or_404(User, id=user_id)
     context["user"] = user
-    context["lane_reservations_count"] = user.lane_reservations.count()
-    context["locker_reservations_count"] = user.locker_reservations.count()
+    context["dashboard"] = get_user_dashboard(user.id)
     return TemplateResponse(request, template, context)
+
+
+def user_search_view(request):
+    """
+    Typeahead search for users by email, first name, or last name (see `search_users()`)
+
+    Expects the search in `q`, and optionally how many users to return in `limit`. Returns the matching users as
+        JSON, or, for htmx requests, as a list of links to them, or (if a `lane_reservation` id is given) of
+        buttons adding them to that Lane Reservation.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({"errors": {"__all__": ["Authentication required"]}}, status=403)
+
+    try:
+        limit = int(request.GET.get("limit", USER_SEARCH_LIMIT))
+        lane_reservation_id = int(request.GET.get("lane_reservation") or 0)
+    except ValueError:
+        return JsonResponse(
+            {"errors": {"__all__": ["Enter whole numbers for limit and lane_reservation."]}}, status=400
+        )
+
+    users = search_users(request.GET.get("q", ""), limit)
+
+    if request.headers.get("HX-Request"):
+        context = {"users": users, "lane_reservation_id": lane_reservation_id}
+        html = render_block_to_string("users/user_partials.html", "user_search_results", context)
+        return HttpResponse(html)
+
+    return JsonResponse({"users": users})
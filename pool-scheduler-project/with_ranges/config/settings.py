@@ -146,6 +146,39 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Celery
 CELERY_BROKER_URL = os.environ.get("CELERY_BROKER", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("CELERY_BROKER", "redis://redis:6379/0")
+CELERY_BEAT_SCHEDULE = {
+    # Dispatches the domain events written to the outbox (see apps/main/outbox_utils.py)
+    "drain-outbox": {"task": "apps.main.tasks.drain_outbox_task", "schedule": 5.0},
+    "purge-outbox": {"task": "apps.main.tasks.purge_outbox_task", "schedule": 60.0 * 60},
+    # Rebuilds the shared Reservation snapshot (see `SHARED_SNAPSHOT_MAX_AGE` in apps/main/shared_snapshot_utils.py)
+    "build-shared-snapshot": {"task": "apps.main.tasks.build_shared_snapshot_task", "schedule": 60.0},
+    # Corrects any drift of the live occupancy counters (see `recompute_occupancy()` in apps/main/occupancy_utils.py)
+    "recompute-occupancy": {"task": "apps.main.tasks.recompute_occupancy_task", "schedule": 60.0 * 15},
+    # Keeps `LANE_SLOT_DAYS_AHEAD` days of Lane Slots generated (see apps/main/slot_utils.py)
+    "generate-lane-slots": {"task": "apps.main.tasks.generate_lane_slots_task", "schedule": 60.0 * 60 * 24},
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Shared by every web and celery worker process, so a cleared value (e.g.: a Pool's closure periods, when one of
+#   its Closures changes) is cleared for all of them, not only for the process that changed it
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("CACHE_URL", "redis://redis:6379/1"),
+    }
+}
+
+
+# Shared Reservation snapshot, memory-mapped by every worker process (see apps/main/shared_snapshot_utils.py)
+RESERVATION_SNAPSHOT_PATH = os.environ.get("RESERVATION_SNAPSHOT_PATH", BASE_DIR / "var" / "reservation_snapshot.bin")
+
+
+# The most Server-Sent Event streams each process serves at once (see `EventBroker` in apps/main/events_utils.py).
+#   Each open stream holds a request thread, so this must stay below the threads of each process (GUNICORN_THREADS),
+#   leaving the rest to serve ordinary requests.
+EVENT_STREAM_MAX_CONNECTIONS = int(os.environ.get("EVENT_STREAM_MAX_CONNECTIONS", 4))
 
 
 # django-debug-toolbar